@@ -2,7 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-from app.database import db
+from app.database import db, migrate_cli
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +13,44 @@ bcrypt = Bcrypt()
 jwt = JWTManager()
 
 
+def _engine_options_from_env():
+    """Connection pool settings; only options that are set in the environment are passed."""
+    options = {}
+    for env, key, cast in (
+        ('DB_POOL_SIZE', 'pool_size', int),
+        ('DB_MAX_OVERFLOW', 'max_overflow', int),
+        ('DB_POOL_TIMEOUT', 'pool_timeout', float),
+        ('DB_POOL_RECYCLE', 'pool_recycle', int),
+    ):
+        if os.getenv(env):
+            options[key] = cast(os.getenv(env))
+    if os.getenv('DB_POOL_PRE_PING'):
+        options['pool_pre_ping'] = os.getenv('DB_POOL_PRE_PING') == 'True'
+    return options
+
+
+def _uses_queue_pool(url):
+    # In-memory SQLite gets a SingletonThreadPool/StaticPool and rejects QueuePool options
+    return bool(url) and not (url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///') or ':memory:' in url))
+
+
+def _configure_replicas(app):
+    """Time pool checkouts and register DATABASE_REPLICA_URLS as replica binds."""
+    from app.database import REPLICA_BIND_PREFIX, TimedQueuePool
+
+    options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if _uses_queue_pool(app.config['SQLALCHEMY_DATABASE_URI']):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, 'poolclass': TimedQueuePool}
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, url in enumerate(app.config['DATABASE_REPLICA_URLS']):
+        bind = {'url': url, **options}
+        if _uses_queue_pool(url):
+            bind['poolclass'] = TimedQueuePool
+        binds[f'{REPLICA_BIND_PREFIX}{i}'] = bind
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
 def create_app(test_config=None):
     """Application factory to create and configure the Flask app.
 
@@ -27,21 +65,104 @@ def create_app(test_config=None):
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', '3600'))
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options_from_env()
+    app.config['DATABASE_REPLICA_URLS'] = [u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    app.config['ASYNC_DATABASE_URL'] = os.getenv('ASYNC_DATABASE_URL')
+    app.config['ASYNC_WSGI_THREADS'] = int(os.getenv('ASYNC_WSGI_THREADS', '32'))
+    app.config['DATABASE_REPLICA_STICKY_SECONDS'] = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '5'))
     app.config['DEBUG'] = os.getenv('DEBUG', 'False') == 'True'
     app.config['TESTING'] = os.getenv('TESTING', 'False') == 'True'
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+    app.config['BCRYPT_MAX_WORKERS'] = int(os.getenv('BCRYPT_MAX_WORKERS', str(os.cpu_count() or 2)))
+    app.config['BCRYPT_MAX_QUEUE'] = int(os.getenv('BCRYPT_MAX_QUEUE', '32'))
+    app.config['BCRYPT_QUEUE_TIMEOUT'] = float(os.getenv('BCRYPT_QUEUE_TIMEOUT', '5'))
+    app.config['BULK_MAX_ITEMS'] = int(os.getenv('BULK_MAX_ITEMS', '10000'))
+    app.config['BULK_CHUNK_SIZE'] = int(os.getenv('BULK_CHUNK_SIZE', '500'))
+    app.config['BATCH_MAX_TRACK_IDS'] = int(os.getenv('BATCH_MAX_TRACK_IDS', '500'))
+    app.config['EXPORT_YIELD_PER'] = int(os.getenv('EXPORT_YIELD_PER', '1000'))
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'True') == 'True'
+    app.config['METRICS_SLOW_REQUEST_MS'] = float(os.getenv('METRICS_SLOW_REQUEST_MS', '0'))
+    app.config['COUNT_CACHE_SIZE'] = int(os.getenv('COUNT_CACHE_SIZE', '1024'))
+    app.config['COUNT_ESTIMATE_MIN_ROWS'] = int(os.getenv('COUNT_ESTIMATE_MIN_ROWS', '0'))
+    app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER', 'auto')
+    app.config['RESPONSE_CACHE_TTL'] = float(os.getenv('RESPONSE_CACHE_TTL', '60'))
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    app.config['RESPONSE_CACHE_URL'] = os.getenv('RESPONSE_CACHE_URL')
+    app.config['HTTP_CACHE_MAX_AGE'] = int(os.getenv('HTTP_CACHE_MAX_AGE', '0'))
+    app.config['JWT_BLOCKLIST_CACHE_SIZE'] = int(os.getenv('JWT_BLOCKLIST_CACHE_SIZE', '10000'))
+    app.config['JWT_BLOCKLIST_BLOOM_BITS'] = int(os.getenv('JWT_BLOCKLIST_BLOOM_BITS', str(1 << 20)))
+    app.config['JWT_BLOCKLIST_SYNC_INTERVAL'] = float(os.getenv('JWT_BLOCKLIST_SYNC_INTERVAL', '5'))
+    app.config['JWT_BLOCKLIST_REFRESH_INTERVAL'] = float(os.getenv('JWT_BLOCKLIST_REFRESH_INTERVAL', '3600'))
+    app.config['JWT_BLOCKLIST_GAP_TIMEOUT'] = float(os.getenv('JWT_BLOCKLIST_GAP_TIMEOUT', '60'))
+    app.config['CHANGE_FEED_POLL_INTERVAL'] = float(os.getenv('CHANGE_FEED_POLL_INTERVAL', '1'))
+    app.config['CHANGE_FEED_HEARTBEAT'] = float(os.getenv('CHANGE_FEED_HEARTBEAT', '15'))
+    app.config['CHANGE_FEED_GAP_TIMEOUT'] = float(os.getenv('CHANGE_FEED_GAP_TIMEOUT', '5'))
+    app.config['CHANGE_FEED_QUEUE_SIZE'] = int(os.getenv('CHANGE_FEED_QUEUE_SIZE', '1000'))
+    app.config['CHANGE_FEED_WSGI_SECONDS'] = float(os.getenv('CHANGE_FEED_WSGI_SECONDS', '25'))
+    app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'True') == 'True'
+    app.config['RATE_LIMITS'] = os.getenv('RATE_LIMITS', '')
+    app.config['RATE_LIMIT_URL'] = os.getenv('RATE_LIMIT_URL')
+    app.config['RATE_LIMIT_MAX_KEYS'] = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+    app.config['RATE_LIMIT_PROXY_HOPS'] = int(os.getenv('RATE_LIMIT_PROXY_HOPS', '0'))
+    app.config['MAX_CONCURRENT_REQUESTS'] = int(os.getenv('MAX_CONCURRENT_REQUESTS', '0'))
+    app.config['ADMISSION_RETRY_AFTER'] = int(os.getenv('ADMISSION_RETRY_AFTER', '1'))
+    app.config['CHANGE_FEED_RETENTION'] = float(os.getenv('CHANGE_FEED_RETENTION', str(7 * 24 * 3600)))
+    app.config['JOBS_ENABLED'] = os.getenv('JOBS_ENABLED', 'False') == 'True'
+    app.config['JOBS_WORKER_PROCESSES'] = int(os.getenv('JOBS_WORKER_PROCESSES', '1'))
+    app.config['JOBS_POLL_INTERVAL'] = float(os.getenv('JOBS_POLL_INTERVAL', '1'))
+    app.config['JOBS_VISIBILITY_TIMEOUT'] = float(os.getenv('JOBS_VISIBILITY_TIMEOUT', '300'))
+    app.config['JOBS_MAX_ATTEMPTS'] = int(os.getenv('JOBS_MAX_ATTEMPTS', '5'))
+    app.config['JOBS_RETRY_BACKOFF'] = float(os.getenv('JOBS_RETRY_BACKOFF', '10'))
+    app.config['JOBS_RETENTION'] = float(os.getenv('JOBS_RETENTION', str(7 * 24 * 3600)))
+    app.config['LINK_METADATA_URL'] = os.getenv('LINK_METADATA_URL')
+    app.config['LINK_METADATA_TIMEOUT'] = float(os.getenv('LINK_METADATA_TIMEOUT', '5'))
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_MMAP_SIZE'] = os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))
+    app.config['SQLITE_CACHE_SIZE'] = os.getenv('SQLITE_CACHE_SIZE', '-65536')
+    app.config['SQLITE_SERIALIZE_WRITES'] = os.getenv('SQLITE_SERIALIZE_WRITES', 'True') == 'True'
 
     if test_config:
         app.config.update(test_config)
 
+    _configure_replicas(app)
+
     # Configure logging
     import logging
     logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
 
     # Initialize extensions with the app
     db.init_app(app)
+
+    from app import sqlite
+    sqlite.init_app(app)
+
+    app.cli.add_command(migrate_cli)
     bcrypt.init_app(app)
+
+    from app import passwords
+    passwords.init_app(app)
     jwt.init_app(app)
 
+    from app import blocklist
+    blocklist.init_app(app)
+
+    from app import counts
+    counts.init_app(app)
+
+    from app import response_cache
+    response_cache.init_app(app)
+
+    from app import json_provider
+    json_provider.init_app(app)
+
+    from app import metrics
+    metrics.init_app(app)
+
+    from app import ratelimit
+    ratelimit.init_app(app)
+
     # Configure CORS
     cors_origins = os.getenv('CORS_ORIGINS', 'http://localhost:5173').split(',')
     CORS(app, resources={r"/api/*": {"origins": cors_origins}})
@@ -50,18 +171,48 @@ def create_app(test_config=None):
     from app.api import api_bp
     from app.routes.tracks_route import tracks_bp
     from app.routes.track_links_routes import track_links_bp
+    from app.routes.export_routes import export_bp
+    from app.routes.metrics_routes import metrics_bp
+    from app.routes.stream_routes import stream_bp
+    from app.routes.stats_routes import stats_bp
     
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(tracks_bp, url_prefix='/api')
     app.register_blueprint(track_links_bp, url_prefix='/api')
+    app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(stream_bp, url_prefix='/api')
+    app.register_blueprint(stats_bp, url_prefix='/api')
+
+    if app.config['DATABASE_REPLICA_URLS']:
+        from app.database import set_primary_sticky_cookie
+        app.after_request(lambda response: set_primary_sticky_cookie(
+            response, app.config['DATABASE_REPLICA_STICKY_SECONDS']))
+
+    from app.search import search_cli
+    app.cli.add_command(search_cli)
+
+    from app.changes import changes_cli
+    app.cli.add_command(changes_cli)
+
+    from app.stats import stats_cli
+    app.cli.add_command(stats_cli)
+
+    from app.jobs import jobs_cli
+    app.cli.add_command(jobs_cli)
+
+    from app.loader import data_cli
+    app.cli.add_command(data_cli)
+
+    from app.perf import perf_cli
+    app.cli.add_command(perf_cli)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
-        # Check blocklist table for revoked tokens
-        from app.models import TokenBlocklist
+        # Served from the in-process blocklist cache; see app/blocklist.py
         jti = jwt_payload.get('jti')
         if jti is None:
             return False
-        return TokenBlocklist.query.filter_by(jti=jti).first() is not None
+        return blocklist.get_blocklist_cache().is_revoked(jti)
 
     return app
\ No newline at end of file
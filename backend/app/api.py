@@ -9,7 +9,9 @@ from flask_jwt_extended import (
     get_jwt,
     unset_jwt_cookies,
 )
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+from app.blocklist import LEGACY_RETENTION, get_blocklist_cache
+from app.ratelimit import rate_limit
 
 api_bp = Blueprint('api', __name__)
 
@@ -20,6 +22,7 @@ def health():
 
 
 @api_bp.route('/register', methods=['POST'])
+@rate_limit('register', by='ip')
 def register():
     data = request.get_json()
     if not data or not data.get('username') or not data.get('email') or not data.get('password'):
@@ -37,6 +40,7 @@ def register():
 
 
 @api_bp.route('/login', methods=['POST'])
+@rate_limit('login', by='ip')
 def login():
     data = request.get_json()
     if not data or not data.get('email') or not data.get('password'):
@@ -46,6 +50,11 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
 
+    # Transparently move the hash to the configured bcrypt cost
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+        db.session.commit()
+
     access_token = create_access_token(identity=user.id, expires_delta=timedelta(minutes=30))
     refresh_token = create_refresh_token(identity=user.id, expires_delta=timedelta(days=14))
     return jsonify({'access_token': access_token, 'refresh_token': refresh_token}), 200
@@ -62,12 +71,15 @@ def refresh():
 @api_bp.route('/logout', methods=['POST'])
 @jwt_required(verify_type=False)
 def logout():
-    jti = get_jwt().get('jti')
+    claims = get_jwt()
+    jti = claims.get('jti')
     if jti:
-        # add to blocklist
-        tb = TokenBlocklist(jti=jti)
+        # add to blocklist; the row (and cache entry) is only needed until the token expires
+        expires_at = datetime.fromtimestamp(claims['exp'], tz=timezone.utc) if 'exp' in claims else None
+        tb = TokenBlocklist(jti=jti, expires_at=expires_at)
         db.session.add(tb)
         db.session.commit()
+        get_blocklist_cache().revoke(jti, expires_at or datetime.now(timezone.utc) + LEGACY_RETENTION)
     resp = jsonify({'logout': True})
     unset_jwt_cookies(resp)
     return resp, 200
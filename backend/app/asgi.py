@@ -0,0 +1,470 @@
+"""ASGI deployment mode (`uvicorn asgi:app`).
+
+The hot public reads (track and link listings, a single track and a
+track's links) run as coroutines on an async SQLAlchemy engine: aiosqlite
+for SQLite, asyncpg for Postgres. One worker can therefore keep many
+requests waiting on the database at once. Each coroutine runs inside a
+regular Flask request context, so these behave exactly as on the sync path,
+with byte-identical responses:
+
+* before/after-request hooks (metrics, CORS, replica routing, cookies),
+* `jsonify` and error pages,
+* conditional GET and the count cache.
+
+The change feed (``/api/stream/changes``) is served here as well, from one
+`ChangeHub` per worker, so idle subscribers cost a coroutine, not a thread.
+
+Every other request, including writes, search, export and the
+bcrypt-bound auth endpoints, is handed to the WSGI app on a pool of
+`ASYNC_WSGI_THREADS` threads, which keeps the event loop free. `wsgi.py`
+is unchanged.
+
+`ASYNC_DATABASE_URL` overrides the async URL, which is otherwise derived
+from `SQLALCHEMY_DATABASE_URI` (and each replica URL) by swapping in the
+async driver.
+"""
+import asyncio
+import io
+import math
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from flask import Response, abort, g, jsonify, make_response, request
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException, ServiceUnavailable
+
+from app import changes
+from app.counts import (
+    ESTIMATE_SQL, accept_estimate, current_versions, estimate_target, get_count_cache, statement_key,
+)
+from app.database import REPLICA_BIND_PREFIX, reads_from_replica
+from app.models import Track, Track_Link
+from app.ratelimit import ADMITTED_ENVIRON_KEY, get_concurrency_limiter, is_exempt
+from app.routes.stream_routes import STREAM_HEADERS
+from app.sqlite import apply_pragmas, pragma_statements
+from app.utils.bulk import get_batch_track_ids, group_by_track_id
+from app.utils.pagination import cursor_page, cursor_seek, get_per_page, wants_total
+from app.utils.serializers import (
+    LINK_COLUMNS, TRACK_COLUMNS, group_links, links_statement, parse_fields, serialize_links,
+    serialize_tracks, wants_links,
+)
+from app.versioning import etag_for, is_not_modified, set_validators, versions_from_rows, versions_statement
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'postgres': 'asyncpg'}
+
+
+def async_url(url):
+    """The async-driver equivalent of a sync SQLAlchemy URL."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r} databases")
+    dialect = 'postgresql' if backend == 'postgres' else backend
+    return url.set(drivername=f'{dialect}+{ASYNC_DRIVERS[backend]}')
+
+
+def _async_engine(url, options):
+    # The sync engine's poolclass (TimedQueuePool) cannot serve async connections
+    options = {key: value for key, value in options.items() if key != 'poolclass'}
+    return create_async_engine(async_url(url), **options)
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ for an ASGI HTTP `scope` whose request body is the file `body`."""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        ADMITTED_ENVIRON_KEY: scope.get(ADMITTED_ENVIRON_KEY, False),
+    }
+    if scope.get('client') is not None:
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name in ('content-length', 'content-type'):
+            key = name.upper().replace('-', '_')
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _run_wsgi(wsgi_app, environ, send):
+    """Run `wsgi_app` in this (pool) thread, handing each part of the response to the blocking `send`."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response.get('started'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response['start'] = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+        }
+
+    iterable = wsgi_app(environ, start_response)
+    try:
+        for chunk in iterable:
+            if not response.get('started'):
+                response['started'] = True
+                send(response['start'])
+            if chunk:
+                send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+    if not response.get('started'):
+        send(response['start'])
+    send({'type': 'http.response.body'})
+
+
+class AsyncAPI:
+    """ASGI application serving `VIEWS` natively and everything else through WSGI."""
+
+    VIEWS = {
+        'track_bp.get_tracks': 'list_tracks',
+        'track_bp.get_track': 'get_track',
+        'track_bp.get_links_for_track': 'links_for_track',
+        'track_links.get_track_links': 'list_links',
+        'track_links.get_track_links_by_track': 'links_by_track_id',
+        'stream.stream_changes': 'stream_changes',
+    }
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        options = config['SQLALCHEMY_ENGINE_OPTIONS']
+        self.engine = _async_engine(config['ASYNC_DATABASE_URL'] or config['SQLALCHEMY_DATABASE_URI'], options)
+        self.replicas = [
+            _async_engine(bind['url'], options)
+            for key, bind in config['SQLALCHEMY_BINDS'].items()
+            if key.startswith(REPLICA_BIND_PREFIX)
+        ]
+        for engine in (self.engine, *self.replicas):
+            if engine.dialect.name == 'sqlite':
+                apply_pragmas(engine.sync_engine, pragma_statements(config))
+        self.executor = ThreadPoolExecutor(max_workers=config['ASYNC_WSGI_THREADS'], thread_name_prefix='wsgi')
+        self.changes = changes.ChangeHub(self.engine, config)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        # Admission control happens here, before a request can queue for a WSGI thread
+        limiter = get_concurrency_limiter(self.flask_app)
+        if scope['type'] != 'http' or limiter is None or is_exempt(scope['path']):
+            return await self._handle(scope, receive, send)
+        scope = {**scope, ADMITTED_ENVIRON_KEY: True}
+        if not limiter.try_enter():
+            return await self._shed(scope, receive, send)
+        try:
+            await self._handle(scope, receive, send)
+        finally:
+            limiter.leave()
+
+    async def _handle(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            environ = wsgi_environ(scope, io.BytesIO())
+            try:
+                endpoint, view_args = self.flask_app.url_map.bind_to_environ(environ).match()
+            except HTTPException:
+                endpoint = None
+            if endpoint in self.VIEWS:
+                view = getattr(self, self.VIEWS[endpoint])
+                return await self._dispatch(environ, view, view_args, receive, send)
+        await self._wsgi(scope, receive, send)
+
+    async def _wsgi(self, scope, receive, send):
+        """Hand the request to the Flask WSGI app on the `ASYNC_WSGI_THREADS` pool."""
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+        loop = asyncio.get_running_loop()
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] != 'http.request':
+                    return  # the client went away before sending the whole body
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            environ = wsgi_environ(scope, body)
+
+            def blocking_send(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            await loop.run_in_executor(self.executor, _run_wsgi, self.flask_app.wsgi_app, environ, blocking_send)
+
+    async def _shed(self, scope, receive, send):
+        """Answer a request over MAX_CONCURRENT_REQUESTS with a 503 (CORS and metrics hooks still run)."""
+        async def overloaded():
+            raise ServiceUnavailable(description="Server is busy, retry shortly",
+                                     retry_after=self.flask_app.config['ADMISSION_RETRY_AFTER'])
+
+        await self._dispatch(wsgi_environ(scope, io.BytesIO()), overloaded, {}, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def aclose(self):
+        await self.changes.close()
+        for engine in [self.engine, *self.replicas]:
+            await engine.dispose()
+        self.executor.shutdown(wait=False)
+
+    async def _dispatch(self, environ, view, view_args, receive, send):
+        """Run an async view through Flask's request lifecycle, like `Flask.full_dispatch_request`."""
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                response = app.handle_exception(e)
+
+            headers = response.get_wsgi_headers(environ)
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers.items()],
+            })
+            body = getattr(response, 'async_body', None)
+            if body is not None:
+                if request.method == 'HEAD':
+                    await body.aclose()
+                else:
+                    await _stream(body, receive, send)
+            else:
+                for chunk in response.get_app_iter(environ):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+    def _read_engine(self):
+        if self.replicas and reads_from_replica():
+            return random.choice(self.replicas)
+        return self.engine
+
+    # --- Views --------------------------------------------------------------
+
+    async def list_tracks(self):
+        fields = _track_projection()
+        async with self._read_engine().connect() as conn:
+            return await _conditional(conn, lambda: _paginate(
+                conn, select(*TRACK_COLUMNS), lambda rows: _track_dicts(conn, rows, fields)))
+
+    async def get_track(self, id):
+        fields = _track_projection()
+        async with self._read_engine().connect() as conn:
+            async def view():
+                row = (await conn.execute(select(*TRACK_COLUMNS).where(Track.id == id))).first()
+                if row is None:
+                    abort(404)
+                return jsonify((await _track_dicts(conn, [row], fields))[0]), 200
+            return await _conditional(conn, view)
+
+    async def links_for_track(self, track_id):
+        async with self._read_engine().connect() as conn:
+            async def view():
+                result = await _paginate(conn, select(*LINK_COLUMNS).where(Track_Link.track_id == track_id), _link_dicts)
+                # An empty page is the only case where the track might not exist
+                if not result['data'] and await conn.scalar(select(Track.id).where(Track.id == track_id)) is None:
+                    abort(404)
+                return result
+            return await _conditional(conn, view)
+
+    async def list_links(self):
+        async with self._read_engine().connect() as conn:
+            if 'track_ids' in request.args:
+                track_ids = get_batch_track_ids()
+                async def view():
+                    links = group_links(await conn.execute(links_statement(track_ids)))
+                    return group_by_track_id(track_ids, links)
+                return await _conditional(conn, view)
+            return await _conditional(conn, lambda: _paginate(conn, select(*LINK_COLUMNS), _link_dicts))
+
+    async def links_by_track_id(self, track_id):
+        async with self._read_engine().connect() as conn:
+            return await _conditional(conn, lambda: _paginate(
+                conn, select(*LINK_COLUMNS).where(Track_Link.track_id == track_id), _link_dicts))
+
+    async def stream_changes(self):
+        start = changes.requested_position()
+        # An empty iterator so no Content-Length is set; `_dispatch` sends `async_body`
+        response = Response(iter(()), mimetype='text/event-stream', headers=STREAM_HEADERS)
+        response.async_body = self._change_stream(start)
+        return response
+
+    async def _change_stream(self, start):
+        """Async counterpart of `app.changes.stream`, fed by the worker's `ChangeHub`."""
+        hub = self.changes
+        subscription, live_from = await hub.subscribe()
+        try:
+            yield changes.retry_field()
+            if start is not None and start != live_from:
+                async with self.engine.connect() as conn:
+                    first, _ = (await conn.execute(changes.bounds_statement())).one()
+                    plan = changes.resume_plan(start, first, live_from)
+                    if plan == changes.RESET:
+                        yield changes.reset_event(live_from)
+                    elif plan == changes.REPLAY:
+                        while start < live_from:
+                            rows = (await conn.execute(changes.events_after(start, until=live_from))).all()
+                            if not rows:
+                                break
+                            for row in rows:
+                                yield changes.format_event(row.id, row.payload)
+                            start = rows[-1].id
+
+            heartbeat = self.flask_app.config['CHANGE_FEED_HEARTBEAT']
+            queue = subscription.queue
+            while not (subscription.overflowed and queue.empty()):
+                try:
+                    _, chunk = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    chunk = changes.HEARTBEAT
+                yield chunk
+        finally:
+            hub.unsubscribe(subscription)
+
+
+async def _stream(body, receive, send):
+    """Send the chunks of an async generator until it ends or the client disconnects."""
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        while True:
+            chunk = asyncio.ensure_future(body.__anext__())
+            await asyncio.wait({chunk, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not chunk.done():
+                chunk.cancel()
+                await asyncio.wait({chunk})
+                break
+            try:
+                data = chunk.result()
+            except StopAsyncIteration:
+                break
+            await send({'type': 'http.response.body', 'body': data.encode('utf-8'), 'more_body': True})
+    finally:
+        watcher.cancel()
+        await body.aclose()
+
+
+def _track_projection():
+    try:
+        return parse_fields(request.args.get('fields', ''), request.args.get('include', ''))
+    except ValueError as e:
+        abort(400, description=str(e))
+
+
+async def _track_dicts(conn, rows, fields):
+    links = None
+    if wants_links(fields):
+        links = group_links(await conn.execute(links_statement([row.id for row in rows]))) if rows else {}
+    return serialize_tracks(rows, fields, links=links)
+
+
+async def _link_dicts(rows):
+    return serialize_links(rows)
+
+
+async def _conditional(conn, view):
+    """Async counterpart of `app.versioning.conditional_get`."""
+    versions, last_modified = versions_from_rows((await conn.execute(versions_statement())).all())
+    g.table_versions = versions
+    etag = etag_for(versions)
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+
+    if is_not_modified(etag, last_modified):
+        response = make_response('', 304)
+    else:
+        rv = await view()
+        response = make_response(jsonify(rv) if isinstance(rv, dict) else rv)
+        if response.status_code != 200:
+            return response
+    return set_validators(response, etag, last_modified)
+
+
+async def _count(conn, statement):
+    """Async counterpart of `app.counts.count_query`."""
+    table = estimate_target(statement, conn.dialect)
+    if table is not None:
+        total = accept_estimate(await conn.scalar(ESTIMATE_SQL, {'name': table}))
+        if total is not None:
+            return total, False
+
+    count = select(func.count()).select_from(statement.order_by(None).subquery())
+    cache = get_count_cache()
+    if cache.maxsize <= 0:
+        return await conn.scalar(count), True
+    key = statement_key(statement, conn.dialect)
+    versions = current_versions()
+    total = cache.get(key, versions)
+    if total is None:
+        total = await conn.scalar(count)
+        cache.set(key, versions, total)
+    return total, True
+
+
+async def _paginate(conn, statement, serialize):
+    """Async counterpart of `app.utils.pagination.paginate_query` for a select of one model."""
+    per_page = get_per_page()
+
+    if 'after' in request.args:
+        seek = cursor_seek(statement, per_page)
+        result = {}
+        if wants_total():
+            result['total'], result['total_exact'] = await _count(conn, statement)
+        items, result['next_cursor'] = cursor_page((await conn.execute(seek)).all(), per_page)
+        result['data'] = await serialize(items)
+        return result
+
+    # Same normalisation as Flask-SQLAlchemy's paginate(error_out=False)
+    page = max(request.args.get('page', 1, type=int), 1)
+    if per_page < 1:
+        per_page = 20
+    rows = (await conn.execute(statement.limit(per_page).offset((page - 1) * per_page))).all()
+    total, exact = await _count(conn, statement)
+    return {
+        'data': await serialize(rows),
+        'page': page,
+        'total': total,
+        'total_exact': exact,
+        'pages': math.ceil(total / per_page) if total else 0,
+    }
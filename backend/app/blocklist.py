@@ -0,0 +1,272 @@
+"""In-process cache for the JWT token blocklist.
+
+`token_in_blocklist_loader` runs on every `@jwt_required` request, so the
+revoked JTIs are kept in memory instead of being looked up in
+`token_blocklist` each time:
+
+* a bounded TTL set holds revoked JTIs until their token's `exp` passes;
+* a Bloom filter over every live revoked JTI answers "definitely not
+  revoked" without touching the database. Only a Bloom hit that is missing
+  from the TTL set (false positive or evicted entry) falls back to a query.
+
+Each worker loads the live rows on first use, so boot does not need the
+schema to exist, and then pulls rows added by other workers at most every
+`JWT_BLOCKLIST_SYNC_INTERVAL` seconds; a logout handled by this worker is visible immediately. Ids are
+assigned when a logout inserts its row but only become visible when it
+commits, so on Postgres a higher id can appear before a lower one. A sync
+reads the rows past the highest id seen and, for `JWT_BLOCKLIST_GAP_TIMEOUT`
+seconds, the ids skipped below it. Every `JWT_BLOCKLIST_REFRESH_INTERVAL`
+seconds the cache is rebuilt from the live rows, so expired JTIs leave the
+Bloom filter.
+
+Checking a token never writes. Expired rows are deleted by
+``flask blocklist purge`` or the ``blocklist.purge`` job, e.g. from cron.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, or_
+
+from app.database import db
+from app.jobs import task
+from app.models import TokenBlocklist
+
+# Rows written before expires_at existed are kept for the longest token
+# lifetime issued by /api/login (the refresh token).
+LEGACY_RETENTION = timedelta(days=14)
+
+# At most this many missing ids below a row (or below the newest row, when
+# the cache is first loaded) are tracked as gaps
+MAX_GAPS = 1000
+
+ROW_COLUMNS = (TokenBlocklist.id, TokenBlocklist.jti, TokenBlocklist.expires_at, TokenBlocklist.created_at)
+
+
+def _timestamp(dt):
+    """Convert a datetime (naive values are UTC, as SQLite returns them) to epoch seconds."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _expired(now):
+    return or_(
+        TokenBlocklist.expires_at < now,
+        and_(TokenBlocklist.expires_at.is_(None), TokenBlocklist.created_at < now - LEGACY_RETENTION),
+    )
+
+
+def _live(now):
+    return or_(
+        TokenBlocklist.expires_at >= now,
+        and_(TokenBlocklist.expires_at.is_(None), or_(
+            TokenBlocklist.created_at.is_(None), TokenBlocklist.created_at >= now - LEGACY_RETENTION,
+        )),
+    )
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing."""
+
+    def __init__(self, num_bits=1 << 20, num_hashes=7):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self._bits = bytearray((num_bits + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class TTLSet:
+    """Bounded set whose members expire at a per-entry epoch timestamp.
+
+    When full, the oldest inserted entry is evicted.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def add(self, value, expires_at):
+        self._entries[value] = expires_at
+        self._entries.move_to_end(value)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, value):
+        expires_at = self._entries.get(value)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._entries[value]
+            return False
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class BlocklistCache:
+    """Per-app cache of revoked JTIs backed by the `token_blocklist` table."""
+
+    def __init__(self, maxsize=10000, bloom_bits=1 << 20, sync_interval=5, refresh_interval=3600, gap_timeout=60):
+        self.maxsize = maxsize
+        self.bloom_bits = bloom_bits
+        self.sync_interval = sync_interval
+        self.refresh_interval = refresh_interval
+        self.gap_timeout = gap_timeout
+        self._lock = threading.Lock()
+        self._revoked = TTLSet(maxsize)
+        self._bloom = BloomFilter(bloom_bits)
+        self._last_id = None  # highest id synced; None until the first load
+        self._gaps = {}  # missing id below `_last_id` -> when it was first missed
+        self._last_sync = None
+        self._last_refresh = time.monotonic()
+
+    def _remember(self, jti, expires_at):
+        self._revoked.add(jti, expires_at)
+        self._bloom.add(jti)
+
+    @staticmethod
+    def _expiry_for(row_expires_at, row_created_at):
+        if row_expires_at is not None:
+            return _timestamp(row_expires_at)
+        if row_created_at is not None:
+            return _timestamp(row_created_at + LEGACY_RETENTION)
+        return time.time() + LEGACY_RETENTION.total_seconds()
+
+    def _initial_position(self):
+        # Ids missing among the newest rows may belong to logouts that have not committed yet
+        last_id = db.session.query(func.max(TokenBlocklist.id)).scalar() or 0
+        recent = {id for id, in db.session.query(TokenBlocklist.id).filter(TokenBlocklist.id > last_id - MAX_GAPS)}
+        now = time.monotonic()
+        return last_id, {id: now for id in range(max(last_id - MAX_GAPS, 0) + 1, last_id + 1) if id not in recent}
+
+    def refresh(self):
+        """Rebuild the cache from the live rows (the first load, or to drop expired JTIs). Read-only."""
+        self._last_refresh = time.monotonic()
+        if self._last_id is None:
+            position = self._initial_position()
+        else:
+            with self._lock:
+                position = (self._last_id, dict(self._gaps))
+        revoked = TTLSet(self.maxsize)
+        bloom = BloomFilter(self.bloom_bits)
+        rows = db.session.query(*ROW_COLUMNS).filter(_live(datetime.now(timezone.utc))).all()
+        for _, jti, expires_at, created_at in rows:
+            revoked.add(jti, self._expiry_for(expires_at, created_at))
+            bloom.add(jti)
+        with self._lock:
+            self._revoked, self._bloom = revoked, bloom
+            # Rows remembered while the live rows were read are all past this position, so they are read again
+            self._last_id, self._gaps = position
+        self.sync(force=True)
+
+    def sync(self, force=False):
+        """Pull rows committed since the last sync, including late commits below it (all live rows on first use)."""
+        if self._last_id is None:
+            self.refresh()
+            return
+        now = time.monotonic()
+        if not force and self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        with self._lock:
+            last_id = self._last_id
+            # An id whose insert was rolled back is never filled; give up on it after the timeout
+            self._gaps = {id: missed for id, missed in self._gaps.items() if now - missed < self.gap_timeout}
+            gaps = list(self._gaps)
+        condition = TokenBlocklist.id > last_id
+        if gaps:
+            condition = or_(condition, TokenBlocklist.id.in_(gaps))
+        rows = db.session.query(*ROW_COLUMNS).filter(condition).order_by(TokenBlocklist.id).all()
+        with self._lock:
+            expected = last_id + 1
+            for row_id, jti, expires_at, created_at in rows:
+                self._remember(jti, self._expiry_for(expires_at, created_at))
+                self._gaps.pop(row_id, None)
+                if row_id >= expected:
+                    for missing in range(max(expected, row_id - MAX_GAPS), row_id):
+                        self._gaps.setdefault(missing, now)
+                    expected = row_id + 1
+            self._last_id = max(self._last_id, expected - 1)
+            self._last_sync = now
+
+    def is_revoked(self, jti):
+        if self.refresh_interval and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+        self.sync()
+        with self._lock:
+            if jti in self._revoked:
+                return True
+            if jti not in self._bloom:
+                return False
+        # Bloom hit without a live cache entry: evicted or a false positive
+        row = db.session.query(
+            TokenBlocklist.expires_at, TokenBlocklist.created_at
+        ).filter_by(jti=jti).first()
+        if row is None:
+            return False
+        expires_at = self._expiry_for(row.expires_at, row.created_at)
+        with self._lock:
+            self._revoked.add(jti, expires_at)
+        return expires_at > time.time()
+
+    def revoke(self, jti, expires_at):
+        """Record a revocation made by this worker. `expires_at` is a datetime."""
+        with self._lock:
+            self._remember(jti, _timestamp(expires_at))
+
+
+def delete_expired() -> int:
+    """Delete blocklist rows whose tokens have expired, in the current transaction; returns the count."""
+    return TokenBlocklist.query.filter(_expired(datetime.now(timezone.utc))).delete(synchronize_session=False)
+
+
+def get_blocklist_cache():
+    return current_app.extensions['blocklist_cache']
+
+
+def init_app(app):
+    app.extensions['blocklist_cache'] = BlocklistCache(
+        maxsize=app.config['JWT_BLOCKLIST_CACHE_SIZE'],
+        bloom_bits=app.config['JWT_BLOCKLIST_BLOOM_BITS'],
+        sync_interval=app.config['JWT_BLOCKLIST_SYNC_INTERVAL'],
+        refresh_interval=app.config['JWT_BLOCKLIST_REFRESH_INTERVAL'],
+        gap_timeout=app.config['JWT_BLOCKLIST_GAP_TIMEOUT'],
+    )
+    app.cli.add_command(blocklist_cli)
+
+
+@task('blocklist.purge')
+def purge_task():
+    delete_expired()
+
+
+blocklist_cli = AppGroup('blocklist', help='Manage the JWT token blocklist.')
+
+
+@blocklist_cli.command('purge')
+def purge_command():
+    """Delete blocklist rows whose tokens have expired."""
+    deleted = delete_expired()
+    db.session.commit()
+    click.echo(f"Purged {deleted} expired blocklist entries")
@@ -0,0 +1,295 @@
+"""Change feed: track and link changes as Server-Sent Events.
+
+Write handlers call `publish` before committing. It adds rows to the
+`change_events` outbox in the same transaction, so an event exists exactly
+when its change was committed. ``GET /api/stream/changes`` streams the outbox:
+
+    id: 42
+    data: {"type":"track","op":"updated","data":{...}}
+
+``type`` is ``track`` or ``track_link``, ``op`` is ``created``, ``updated``
+or ``deleted`` and ``data`` is the row as the REST API serializes it
+(tracks without their links). Ids increase with every change. A client
+resumes after the id in ``Last-Event-ID`` (which `EventSource` sends on
+reconnect) or ``?last_event_id=``; without either the stream starts at the
+current end. If the events after that id have been purged, a ``reset``
+event tells the client to reload instead. A comment line is sent after
+`CHANGE_FEED_HEARTBEAT` seconds of silence so idle connections are not
+dropped by proxies.
+
+Under ASGI (`app.asgi`) one `ChangeHub` per worker polls the outbox every
+`CHANGE_FEED_POLL_INTERVAL` seconds, however many clients are connected,
+and fans new events out to a queue per connection, so an idle subscriber
+is only a waiting coroutine. The WSGI view is a fallback that holds a
+worker thread per connection, polls on its own and ends the stream after
+`CHANGE_FEED_WSGI_SECONDS` so the client reconnects.
+
+``flask changes purge`` deletes events older than `CHANGE_FEED_RETENTION`
+seconds.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import abort, current_app, request
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select
+
+from app.database import db
+from app.models import ChangeEvent, Track
+
+logger = logging.getLogger(__name__)
+
+TRACK = 'track'
+TRACK_LINK = 'track_link'
+
+# Events carry a track without its links; link changes have their own events
+TRACK_FIELDS = frozenset(Track.FIELDS) - {'links'}
+
+RETRY_MS = 3000
+HEARTBEAT = ': keep-alive\n\n'
+REPLAY_BATCH = 500
+
+REPLAY = 'replay'
+RESET = 'reset'
+
+
+def publish(entity: str, op: str, items: list):
+    """
+    Adds change events to the current transaction; call before committing.
+
+    Args:
+        entity (str): `TRACK` or `TRACK_LINK`.
+        op (str): ``created``, ``updated`` or ``deleted``.
+        items (list): Serialized rows, as returned by the API.
+    """
+    if not items:
+        return
+    now = datetime.now(timezone.utc)
+    db.session.execute(insert(ChangeEvent), [
+        {
+            'entity': entity,
+            'op': op,
+            'entity_id': item['id'],
+            'payload': json.dumps({'type': entity, 'op': op, 'data': item}, separators=(',', ':')),
+            'created_at': now,
+        }
+        for item in items
+    ])
+
+
+def format_event(id: int, payload: str) -> str:
+    return f'id: {id}\ndata: {payload}\n\n'
+
+
+def reset_event(position) -> str:
+    return f'id: {position or 0}\nevent: reset\ndata: {{}}\n\n'
+
+
+def retry_field() -> str:
+    return f'retry: {RETRY_MS}\n\n'
+
+
+def requested_position():
+    """The last event id the client has seen (``Last-Event-ID`` or ``?last_event_id=``), or None."""
+    raw = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if not raw:
+        return None
+    try:
+        position = int(raw)
+    except ValueError:
+        abort(400, description="Last-Event-ID must be an integer")
+    if position < 0:
+        abort(400, description="Last-Event-ID must not be negative")
+    return position
+
+
+def bounds_statement():
+    return select(func.min(ChangeEvent.id), func.max(ChangeEvent.id))
+
+
+def events_after(position, until=None, limit=REPLAY_BATCH):
+    """Select (id, payload) of the events after `position`, oldest first."""
+    statement = (
+        select(ChangeEvent.id, ChangeEvent.payload)
+        .where(ChangeEvent.id > (position or 0))
+        .order_by(ChangeEvent.id)
+        .limit(limit)
+    )
+    if until is not None:
+        statement = statement.where(ChangeEvent.id <= until)
+    return statement
+
+
+def resume_plan(start, first, last):
+    """
+    Decides how to bring a client at event `start` up to event `last`.
+
+    Args:
+        start (int): The client's last event id, or None for a new client.
+        first (int): The oldest event still in the outbox (None if empty).
+        last (int): The newest event (None if empty).
+
+    Returns:
+        str | None: `REPLAY` the events in between, `RESET` if some were
+        purged (or `start` is unknown), or None if there is nothing to send.
+    """
+    if start is None or start == last:
+        return None
+    if last is None:
+        return RESET if start else None
+    if start > last or start < first - 1:
+        return RESET
+    return REPLAY
+
+
+class FeedPosition:
+    """The last delivered event id, holding back events that follow a gap.
+
+    Ids are assigned when a transaction inserts its events but only become
+    visible when it commits, so on Postgres a higher id can appear before
+    a lower one. Events after a missing id wait until it shows up or
+    `gap_timeout` seconds pass (a rolled-back transaction leaves a gap
+    for good).
+    """
+
+    def __init__(self, position, gap_timeout: float):
+        self.position = position
+        self.gap_timeout = gap_timeout
+        self._gap_since = None
+
+    def advance(self, rows: list, now: float) -> list:
+        """Return the deliverable prefix of `rows`, which follow `position` in id order."""
+        delivered = []
+        for row in rows:
+            if self.position is not None and row.id != self.position + 1:
+                if self._gap_since is None:
+                    self._gap_since = now
+                if now - self._gap_since < self.gap_timeout:
+                    break
+            delivered.append(row)
+            self.position = row.id
+            self._gap_since = None
+        return delivered
+
+
+def stream(start):
+    """Yield the SSE stream for a WSGI worker; see the module docstring."""
+    config = current_app.config
+    yield retry_field()
+
+    first, last = db.session.execute(bounds_statement()).one()
+    plan = resume_plan(start, first, last)
+    if plan == RESET:
+        yield reset_event(last)
+    elif plan == REPLAY:
+        while start < last:
+            rows = db.session.execute(events_after(start, until=last)).all()
+            if not rows:
+                break
+            for row in rows:
+                yield format_event(row.id, row.payload)
+            start = rows[-1].id
+    db.session.close()  # don't hold a connection between polls
+
+    feed = FeedPosition(last, config['CHANGE_FEED_GAP_TIMEOUT'])
+    deadline = time.monotonic() + config['CHANGE_FEED_WSGI_SECONDS']
+    quiet_since = time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(config['CHANGE_FEED_POLL_INTERVAL'])
+        rows = db.session.execute(events_after(feed.position)).all()
+        db.session.close()
+        now = time.monotonic()
+        for row in feed.advance(rows, now):
+            yield format_event(row.id, row.payload)
+            quiet_since = now
+        if now - quiet_since >= config['CHANGE_FEED_HEARTBEAT']:
+            yield HEARTBEAT
+            quiet_since = now
+
+
+class Subscription:
+    def __init__(self, size: int):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+
+class ChangeHub:
+    """Polls the outbox for one ASGI worker and fans events out to its subscribers."""
+
+    def __init__(self, engine, config):
+        self.engine = engine
+        self.poll_interval = config['CHANGE_FEED_POLL_INTERVAL']
+        self.gap_timeout = config['CHANGE_FEED_GAP_TIMEOUT']
+        self.queue_size = config['CHANGE_FEED_QUEUE_SIZE']
+        self.subscribers = set()
+        self.feed = None
+        self._task = None
+
+    async def subscribe(self):
+        """Register a subscriber; returns it and the event id its queue starts after."""
+        if self._task is None:
+            async with self.engine.connect() as conn:
+                _, last = (await conn.execute(bounds_statement())).one()
+            # Another subscriber may have started polling while this one waited
+            if self._task is None:
+                self.feed = FeedPosition(last, self.gap_timeout)
+                self._task = asyncio.ensure_future(self._poll())
+        subscription = Subscription(self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription, self.feed.position
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    async def _poll(self):
+        try:
+            while self.subscribers:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    async with self.engine.connect() as conn:
+                        rows = (await conn.execute(events_after(self.feed.position))).all()
+                except Exception:
+                    logger.exception("Change feed poll failed")
+                    continue
+                for row in self.feed.advance(rows, time.monotonic()):
+                    self._fan_out(row.id, format_event(row.id, row.payload))
+        finally:
+            self._task = None
+
+    def _fan_out(self, id, chunk):
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait((id, chunk))
+            except asyncio.QueueFull:
+                # A client this far behind reconnects and replays from the outbox
+                subscription.overflowed = True
+                self.subscribers.discard(subscription)
+
+    async def close(self):
+        self.subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+
+changes_cli = AppGroup('changes', help='Manage the change feed outbox.')
+
+
+@changes_cli.command('purge')
+@click.option('--older-than', type=float, default=None,
+              help='Age in seconds (default: CHANGE_FEED_RETENTION).')
+def purge_command(older_than):
+    """Delete change events older than the retention period."""
+    if older_than is None:
+        older_than = current_app.config['CHANGE_FEED_RETENTION']
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+    newest = select(func.max(ChangeEvent.id)).scalar_subquery()
+    # The newest event is kept so resuming clients can tell what was purged
+    result = db.session.execute(
+        delete(ChangeEvent).where(ChangeEvent.created_at < cutoff, ChangeEvent.id < newest)
+    )
+    db.session.commit()
+    click.echo(f"Deleted {result.rowcount} change events")
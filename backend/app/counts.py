@@ -0,0 +1,127 @@
+"""Cached row counts for paginated listings.
+
+`paginate_query` needs a total on every offset page, and `SELECT count(*)`
+over a large table costs far more than fetching the page itself. Counts
+are cached per process, keyed by the compiled count statement and its
+parameters, so different filters never share an entry.
+
+Each entry remembers the `table_versions` counters (see
+`app.versioning`) it was computed under. Any write to tracks or
+track_links bumps those counters right after it commits, so an entry is
+only reused while nothing has changed, in this worker or any other.
+`COUNT_CACHE_SIZE` bounds the number of entries (0 disables the cache).
+
+On Postgres, unfiltered listings of tables whose planner estimate
+(`pg_class.reltuples`) is at least `COUNT_ESTIMATE_MIN_ROWS` use that
+estimate instead of counting (0, the default, always counts exactly).
+"""
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g
+from sqlalchemy import text
+
+from app.database import db
+
+ESTIMATE_SQL = text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)")
+
+
+class CountCache:
+    """Bounded LRU of (versions, total) keyed by count statement."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != versions:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, versions, total):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (versions, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def get_count_cache():
+    return current_app.extensions['count_cache']
+
+
+def current_versions():
+    """The table version counters this request's counts are valid for."""
+    # conditional_get has already read the counters for this request
+    versions = g.get('table_versions')
+    if versions is None:
+        from app.versioning import get_versions
+        versions, _ = get_versions()
+    return tuple(sorted(versions.items()))
+
+
+def statement_key(statement, dialect):
+    """Cache key for counting `statement`: its SQL and bound parameters."""
+    compiled = statement.order_by(None).compile(dialect=dialect)
+    return str(compiled), repr(sorted(compiled.params.items()))
+
+
+def estimate_target(statement, dialect):
+    """Table name to estimate for an unfiltered single-table query on Postgres, else None."""
+    if not current_app.config['COUNT_ESTIMATE_MIN_ROWS'] or dialect.name != 'postgresql':
+        return None
+    froms = statement.get_final_froms()
+    if statement.whereclause is not None or len(froms) != 1 or not hasattr(froms[0], 'name'):
+        return None
+    return froms[0].name
+
+
+def accept_estimate(estimate):
+    """The planner estimate as a total, or None if counting exactly is required."""
+    # reltuples is -1 (or 0 on old servers) until the table has been analyzed
+    if estimate is None or estimate < current_app.config['COUNT_ESTIMATE_MIN_ROWS']:
+        return None
+    return int(estimate)
+
+
+def count_query(query):
+    """
+    Counts the rows of a listing query, from the cache when nothing has changed.
+
+    Args:
+        query (Query): The listing query (its ordering is ignored).
+
+    Returns:
+        tuple: (total, exact) where `exact` is False for a planner estimate.
+    """
+    dialect = db.session.get_bind().dialect
+    table = estimate_target(query.statement, dialect)
+    if table is not None:
+        total = accept_estimate(db.session.execute(ESTIMATE_SQL, {'name': table}).scalar())
+        if total is not None:
+            return total, False
+
+    cache = get_count_cache()
+    if cache.maxsize <= 0:
+        return query.order_by(None).count(), True
+    key = statement_key(query.statement, dialect)
+    versions = current_versions()
+    total = cache.get(key, versions)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, versions, total)
+    return total, True
+
+
+def init_app(app):
+    app.extensions['count_cache'] = CountCache(app.config['COUNT_CACHE_SIZE'])
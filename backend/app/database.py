@@ -1,5 +1,147 @@
+import logging
+import random
+import threading
+import time
+
+import click
+from flask import g, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Replica engines are registered as SQLALCHEMY_BINDS under this prefix
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Cookie that pins a client to the primary for a short while after it writes
+PRIMARY_STICKY_COOKIE = 'db_primary'
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkout_stats = {'count': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                stats = self._checkout_stats
+                stats['count'] += 1
+                stats['wait_seconds_total'] += waited
+                stats['wait_seconds_max'] = max(stats['wait_seconds_max'], waited)
+
+    def checkout_stats(self) -> dict:
+        """Checkouts so far and the time spent waiting for a connection."""
+        with self._stats_lock:
+            return dict(self._checkout_stats)
+
+
+# SQLAlchemy names a pool's logger after its class, which puts this one under
+# `app.database` instead of `sqlalchemy.pool`. Keep it as quiet as SQLAlchemy's
+# own pool logger, so LOG_LEVEL=DEBUG does not log every checkout.
+logging.getLogger(f'{__name__}.{TimedQueuePool.__name__}').setLevel(
+    logging.getLogger('sqlalchemy.pool').getEffectiveLevel()
+)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica when the request allows it.
+
+    A request opts in with `use_replica_for_reads` (GET/HEAD only). Once the
+    session has flushed a write, or the client wrote recently (see
+    `PRIMARY_STICKY_COOKIE`), every statement goes to the primary so the
+    client reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica():
+            replicas = [engine for key, engine in self._db.engines.items()
+                        if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)]
+            if replicas:
+                return random.choice(replicas)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        return reads_from_replica()
+
+
+def reads_from_replica():
+    """True if this request's statements may go to a replica (see `RoutingSession`)."""
+    if not has_request_context() or g.get('db_wrote'):
+        return False
+    return g.get('db_use_replica', False) and PRIMARY_STICKY_COOKIE not in request.cookies
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def use_replica_for_reads():
+    """Blueprint `before_request` hook routing GET/HEAD queries to a replica."""
+    if request.method in ('GET', 'HEAD'):
+        g.db_use_replica = True
+
+
+def mark_write():
+    """Pin the rest of this request (and the sticky window) to the primary.
+
+    Flushes are detected automatically; call this after Core-level writes
+    that bypass the session's flush.
+    """
+    g.db_wrote = True
+
+
+def set_primary_sticky_cookie(response, max_age):
+    """`after_request` helper: keep a client that just wrote on the primary for `max_age` seconds."""
+    if g.get('db_wrote'):
+        response.set_cookie(PRIMARY_STICKY_COOKIE, '1', max_age=max_age, httponly=True, samesite='Lax')
+    return response
+
+
+def pool_checkout_stats():
+    """Checkout wait statistics for every engine using `TimedQueuePool`, keyed by bind."""
+    return {
+        key or 'primary': engine.pool.checkout_stats()
+        for key, engine in db.engines.items()
+        if isinstance(engine.pool, TimedQueuePool)
+    }
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def init_migrate(app):
+    """
+    Sets up Flask-Migrate on `app`, once, and returns it.
+
+    create_app leaves this out because importing alembic takes about as long as
+    importing the rest of the app. Call it before running migrations from a script;
+    the ``flask db`` commands call it themselves.
+    """
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    return app.extensions['migrate'].migrate
+
+
+class MigrateCommands(click.Group):
+    """``flask db``: Flask-Migrate's command group, imported only when it is run."""
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask.cli import ScriptInfo
+        from flask_migrate.cli import db as db_cli
+
+        init_migrate(parent.ensure_object(ScriptInfo).load_app())
+        return db_cli.make_context(info_name, args, parent=parent, **extra)
+
 
-db = SQLAlchemy()
-migrate = Migrate()
\ No newline at end of file
+migrate_cli = MigrateCommands('db', help='Perform database migrations.')
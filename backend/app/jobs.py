@@ -0,0 +1,305 @@
+"""Background jobs on a database-backed queue.
+
+Code that can finish after the response registers a task and queues it:
+
+    @task('links.normalize')
+    def normalize_links(ids): ...
+
+    enqueue('links.normalize', {'ids': [1, 2]})
+
+`enqueue` adds a row to the `jobs` table in the current transaction, so
+a job exists exactly when the write that queued it was committed. Work a
+response depends on, such as password hashes and token revocation, stays
+in the request.
+
+``flask jobs worker`` runs the queue. It can run next to the web server
+(``gunicorn wsgi:app``) or on another host. ``--processes`` (default
+`JOBS_WORKER_PROCESSES`) starts a pool of worker processes; a process that
+crashes is restarted. A worker claims the oldest due job with one UPDATE
+(``FOR UPDATE SKIP LOCKED`` on Postgres). The claim hides the job from
+other workers for `JOBS_VISIBILITY_TIMEOUT` seconds. A job whose worker
+dies is picked up again once the claim expires, so tasks must be
+idempotent. A task runs in an app context and does not commit: its
+writes are committed together with the job's completion. Work that must
+only happen once they are, such as invalidating cached responses, is
+registered with `after_commit`. A task that raises is retried after
+`JOBS_RETRY_BACKOFF` seconds, doubling each time, and is marked
+``failed`` after `JOBS_MAX_ATTEMPTS` attempts.
+
+``flask jobs enqueue <name>`` queues a task by hand. ``flask jobs status``
+counts the jobs in each state. ``flask jobs purge`` deletes finished jobs
+older than `JOBS_RETENTION` seconds.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select, update
+
+from app.database import db
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# name -> function, filled by `task`
+TASKS = {}
+
+
+def task(name: str):
+    """Register a function as the task `name`; it is called with the job's payload as keyword arguments."""
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+def after_commit(fn):
+    """Call `fn` once the running job's writes are committed; it is dropped if the task fails."""
+    g.setdefault('job_after_commit', []).append(fn)
+
+
+def enqueue(name: str, payload=None, delay: float = 0, max_attempts: int = None):
+    """
+    Queues a job in the current transaction; call before committing.
+
+    Args:
+        name (str): A registered task.
+        payload (dict): JSON-serializable keyword arguments for the task.
+        delay (float): Seconds before the job is due.
+        max_attempts (int): Attempts before it is marked failed (default: `JOBS_MAX_ATTEMPTS`).
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task {name!r}")
+    now = datetime.now(timezone.utc)
+    db.session.execute(insert(Job).values(
+        name=name,
+        payload=json.dumps(payload or {}, separators=(',', ':')),
+        status=QUEUED,
+        attempts=0,
+        max_attempts=max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+        run_at=now + timedelta(seconds=delay),
+        created_at=now,
+    ))
+
+
+def retry_delay(attempts: int, backoff: float) -> float:
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    return backoff * 2 ** (attempts - 1)
+
+
+class Worker:
+    """Claims and runs jobs one at a time for the app it is created with."""
+
+    def __init__(self, app, name=None):
+        self.app = app
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        """Finish the current job, then return from `run`."""
+        self._stop.set()
+
+    def claim(self):
+        """Claim the oldest due job (or one whose claim expired) and commit; None if there is none."""
+        config = self.app.config
+        now = datetime.now(timezone.utc)
+        due = (
+            select(Job.id)
+            .where(Job.status.in_((QUEUED, RUNNING)), Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        row = db.session.execute(
+            update(Job)
+            .where(Job.id == due)
+            .values(
+                status=RUNNING,
+                attempts=Job.attempts + 1,
+                locked_by=self.name,
+                run_at=now + timedelta(seconds=config['JOBS_VISIBILITY_TIMEOUT']),
+            )
+            .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+        ).first()
+        db.session.commit()
+        return row
+
+    def _finish(self, job, **values):
+        # A worker whose claim expired and was taken over must not overwrite the new claim
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.locked_by == self.name, Job.attempts == job.attempts)
+            .values(locked_by=None, **values)
+        )
+        db.session.commit()
+
+    def _fail(self, job, error: str, retry: bool = True):
+        now = datetime.now(timezone.utc)
+        if retry and job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts, self.app.config['JOBS_RETRY_BACKOFF'])
+            logger.warning("Job %s (%s) failed, retrying in %ss: %s", job.id, job.name, delay, error)
+            self._finish(job, status=QUEUED, run_at=now + timedelta(seconds=delay), last_error=error)
+        else:
+            logger.error("Job %s (%s) failed: %s", job.id, job.name, error)
+            self._finish(job, status=FAILED, finished_at=now, last_error=error)
+
+    def run_once(self) -> bool:
+        """Run one due job; returns False if there was none."""
+        with self.app.app_context():
+            job = self.claim()
+            if job is None:
+                return False
+            fn = TASKS.get(job.name)
+            if fn is None:
+                self._fail(job, f"Unknown task {job.name!r}", retry=False)
+            elif job.attempts > job.max_attempts:
+                # The last attempt's worker died without finishing it
+                self._fail(job, "Claim expired on the last attempt", retry=False)
+            else:
+                started = time.perf_counter()
+                try:
+                    fn(**json.loads(job.payload))
+                except Exception as e:
+                    db.session.rollback()
+                    self._fail(job, f"{type(e).__name__}: {e}")
+                else:
+                    self._finish(job, status=DONE, finished_at=datetime.now(timezone.utc), last_error=None)
+                    logger.info("Job %s (%s) done in %.3fs", job.id, job.name, time.perf_counter() - started)
+                    for callback in g.pop('job_after_commit', ()):
+                        try:
+                            callback()
+                        except Exception:
+                            logger.exception("Job %s (%s) after-commit callback failed", job.id, job.name)
+            return True
+
+    def run(self, burst: bool = False):
+        """Run jobs until stopped; with `burst`, return once no job is due."""
+        poll_interval = self.app.config['JOBS_POLL_INTERVAL']
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception:
+                logger.exception("Job worker %s could not reach the queue", self.name)
+                ran = False
+            if not ran:
+                if burst:
+                    return
+                self._stop.wait(poll_interval)
+
+
+def _install_stop_handlers(handler):
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+
+def _worker_process(burst):
+    # Runs in a fresh interpreter (spawn), so the app is built from the environment again
+    from app import create_app
+
+    worker = Worker(create_app())
+    _install_stop_handlers(worker.stop)
+    worker.run(burst)
+
+
+def run_pool(processes: int, burst: bool = False):
+    """Run `processes` worker processes until SIGTERM/SIGINT, restarting any that crash."""
+    context = multiprocessing.get_context('spawn')
+    stopping = threading.Event()
+
+    def start(index):
+        process = context.Process(target=_worker_process, args=(burst,), name=f'jobs-worker-{index}')
+        process.start()
+        return process
+
+    def stop(*args):
+        stopping.set()
+        for process in pool:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: the worker finishes its current job
+
+    pool = [start(index) for index in range(processes)]
+    _install_stop_handlers(stop)
+    while any(process.is_alive() for process in pool) or not (stopping.is_set() or burst):
+        for index, process in enumerate(pool):
+            if not process.is_alive() and process.exitcode != 0 and not stopping.is_set():
+                logger.error("Job worker %s exited with %s, restarting", process.name, process.exitcode)
+                pool[index] = start(index)
+        stopping.wait(1)
+    for process in pool:
+        process.join()
+
+
+jobs_cli = AppGroup('jobs', help='Run and manage background jobs.')
+
+
+@jobs_cli.command('worker')
+@click.option('--processes', type=int, default=None,
+              help='Worker processes (default: JOBS_WORKER_PROCESSES).')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def worker_command(processes, burst):
+    """Run queued jobs."""
+    if processes is None:
+        processes = current_app.config['JOBS_WORKER_PROCESSES']
+    if processes <= 1:
+        worker = Worker(current_app._get_current_object())
+        _install_stop_handlers(worker.stop)
+        worker.run(burst)
+    else:
+        run_pool(processes, burst)
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--payload', default='{}', help='Task keyword arguments as a JSON object.')
+@click.option('--delay', type=float, default=0, help='Seconds before the job is due.')
+def enqueue_command(name, payload, delay):
+    """Queue the task NAME."""
+    try:
+        payload = json.loads(payload)
+    except ValueError as e:
+        raise click.BadParameter(f"Invalid JSON: {e}", param_hint='--payload')
+    if not isinstance(payload, dict):
+        raise click.BadParameter("Must be a JSON object", param_hint='--payload')
+    if name not in TASKS:
+        raise click.BadParameter(f"Unknown task; one of {', '.join(sorted(TASKS))}", param_hint='NAME')
+    enqueue(name, payload, delay=delay)
+    db.session.commit()
+    click.echo(f"Queued {name}")
+
+
+@jobs_cli.command('status')
+def status_command():
+    """Count jobs by status."""
+    counts = dict(db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+    for status in (QUEUED, RUNNING, DONE, FAILED):
+        click.echo(f"{status:8} {counts.get(status, 0)}")
+
+
+@jobs_cli.command('purge')
+@click.option('--older-than', type=float, default=None,
+              help='Age in seconds (default: JOBS_RETENTION).')
+def purge_command(older_than):
+    """Delete finished jobs older than the retention period."""
+    if older_than is None:
+        older_than = current_app.config['JOBS_RETENTION']
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+    result = db.session.execute(
+        delete(Job).where(Job.status.in_((DONE, FAILED)), Job.finished_at < cutoff)
+    )
+    db.session.commit()
+    click.echo(f"Deleted {result.rowcount} jobs")
@@ -0,0 +1,77 @@
+"""JSON provider backed by orjson, falling back to Flask's stdlib provider.
+
+`ORJSONProvider` produces the same bytes as Flask's `DefaultJSONProvider`
+(sorted keys, ASCII-escaped strings, compact or 2-space indented output)
+so clients see no difference. Anything orjson cannot reproduce exactly is
+handed to the stdlib encoder instead:
+
+* output containing non-ASCII characters or DEL while `ensure_ascii` is on
+  (orjson always writes UTF-8),
+* objects orjson rejects (non-string dict keys, integers over 64 bits),
+* `dumps` keyword arguments other than the ones Flask itself passes.
+
+Dates, dataclasses and other non-native values go through the provider's
+`default` just like they do with the stdlib encoder. NaN and infinite floats
+are encoded as `null` by orjson; the API never returns them.
+
+`JSON_PROVIDER` selects the provider: `auto` (orjson when it is installed),
+`orjson` or `stdlib`.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    def _options(self, kwargs):
+        """orjson option flags for these `dumps` kwargs, or None if only the stdlib can honour them."""
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.pop('sort_keys', self.sort_keys):
+            options |= orjson.OPT_SORT_KEYS
+        indent = kwargs.pop('indent', None)
+        if indent == 2:
+            options |= orjson.OPT_INDENT_2
+        elif indent is not None or kwargs.pop('separators', (',', ':')) != (',', ':'):
+            return None
+        if kwargs:
+            return None
+        return options
+
+    def dumpb(self, obj, **kwargs) -> bytes:
+        """Serialize `obj` to UTF-8 JSON bytes."""
+        options = self._options(dict(kwargs))
+        if options is not None:
+            try:
+                data = orjson.dumps(obj, default=self.default, option=options)
+            except TypeError:
+                pass
+            else:
+                if not self.ensure_ascii or (data.isascii() and b'\x7f' not in data):
+                    return data
+        return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs) -> str:
+        return self.dumpb(obj, **kwargs).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args['indent'] = 2
+        else:
+            dump_args['separators'] = (',', ':')
+        return self._app.response_class(self.dumpb(obj, **dump_args) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install the provider selected by `JSON_PROVIDER`."""
+    choice = app.config['JSON_PROVIDER']
+    if choice not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError("JSON_PROVIDER must be 'auto', 'orjson' or 'stdlib'")
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+    if choice != 'stdlib' and orjson is not None:
+        app.json = ORJSONProvider(app)
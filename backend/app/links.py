@@ -0,0 +1,128 @@
+"""Deferred link URL normalization.
+
+With `JOBS_ENABLED`, every write that sets a link's URL queues the
+``links.normalize`` job in the same transaction. The job rewrites the
+URL into a canonical form:
+
+* the scheme and host are lowercased and a default port is dropped;
+* share-tracking query parameters (``utm_*``, ``si``, ``fbclid``, ...) are removed.
+
+It then asks the metadata service at `LINK_METADATA_URL`, if one is set,
+for the link's canonical URL. The service is sent
+``GET <LINK_METADATA_URL>?url=<link_url>`` and answers
+``{"url": "<canonical url>"}`` (see ``bench/metadata_stub.py``). A failing
+service makes the job fail, and it is retried later.
+
+A URL is only replaced if it has not changed since the job read it, so a
+newer edit always wins. Each replacement is published to the change feed
+as an update.
+"""
+import json
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from urllib.request import urlopen
+
+from flask import current_app
+from sqlalchemy import bindparam, select, update
+
+from app.changes import TRACK_LINK, publish
+from app.database import db
+from app.jobs import after_commit, enqueue, task
+from app.models import Track_Link
+from app.response_cache import ALL_TRACKS, invalidate
+from app.utils.serializers import LINK_COLUMNS, serialize_links
+from app.versioning import mark_changed
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'igshid', 'si', 'feature'})
+TRACKING_PREFIXES = ('utm_',)
+
+MAX_URL_LENGTH = Track_Link.link_url.type.length
+
+
+def normalize_url(url: str) -> str:
+    """
+    Returns the canonical form of a link URL; anything not parseable as http(s) is only stripped.
+
+    Args:
+        url (str): The URL as submitted.
+
+    Returns:
+        str: The normalized URL.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname  # lowercased by urlsplit
+    if ':' in host:
+        host = f'[{host}]'  # IPv6 literal
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f'{host}:{port}'
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f'{parts.username}:{parts.password}'
+        host = f'{userinfo}@{host}'
+
+    query = parts.query
+    params = parse_qsl(query, keep_blank_values=True)
+    kept = [(key, value) for key, value in params
+            if key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES)]
+    if len(kept) < len(params):
+        query = urlencode(kept)  # otherwise the query keeps its original encoding
+    return urlunsplit((scheme, host, parts.path or '/', query, parts.fragment))
+
+
+def fetch_canonical_url(url: str):
+    """Ask the `LINK_METADATA_URL` service for the canonical URL of `url` (None if it has none)."""
+    service = current_app.config['LINK_METADATA_URL']
+    if not service:
+        return None
+    separator = '&' if '?' in service else '?'
+    with urlopen(f'{service}{separator}{urlencode({"url": url})}',
+                 timeout=current_app.config['LINK_METADATA_TIMEOUT']) as response:
+        canonical = json.load(response).get('url')
+    return canonical if isinstance(canonical, str) and canonical.strip() else None
+
+
+def defer_normalization(ids):
+    """Queue ``links.normalize`` for the links `ids` in the current transaction, if `JOBS_ENABLED`."""
+    ids = sorted(set(ids))
+    if ids and current_app.config['JOBS_ENABLED']:
+        enqueue('links.normalize', {'ids': ids})
+
+
+@task('links.normalize')
+def normalize_links(ids):
+    rows = db.session.execute(select(Track_Link.id, Track_Link.link_url).where(Track_Link.id.in_(ids))).all()
+    changes = []
+    for id, url in rows:
+        normalized = normalize_url(url)
+        canonical = fetch_canonical_url(normalized)
+        if canonical is not None:
+            normalized = normalize_url(canonical)
+        if normalized != url and len(normalized) <= MAX_URL_LENGTH:
+            changes.append({'b_id': id, 'b_old': url, 'b_new': normalized})
+    if not changes:
+        return
+
+    table = Track_Link.__table__
+    # Compare-and-set: a URL edited since it was read above is left alone
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam('b_id'), table.c.link_url == bindparam('b_old'))
+        .values(link_url=bindparam('b_new'), updated_at=datetime.now(timezone.utc)),
+        changes,
+    )
+    expected = {change['b_id']: change['b_new'] for change in changes}
+    rows = db.session.execute(select(*LINK_COLUMNS).where(Track_Link.id.in_(expected))).all()
+    updated = [row for row in rows if row.link_url == expected[row.id]]
+    if updated:
+        publish(TRACK_LINK, 'updated', serialize_links(updated))
+        mark_changed(db.session, {'track_links'})
+        after_commit(lambda: invalidate('tracks', 'track_links', ALL_TRACKS))
@@ -0,0 +1,497 @@
+"""Bulk loading of users, tracks and links from CSV or NDJSON files.
+
+    flask data load --users users.csv --tracks tracks.ndjson --links links.csv --user josh@example.com
+
+Each file is read as a stream: ``.csv`` with a header row, or ``.ndjson``
+or ``.jsonl`` with one object per line. Rows are written `--chunk-size` at a
+time with Core executemany inserts, one transaction per chunk, so memory
+use does not depend on the file size. Postgres chunks go through
+``COPY ... FROM STDIN`` instead (psycopg2 only). SQLite runs the load on one
+connection with ``synchronous=OFF`` and a larger page cache. Each chunk is
+added to the full-text index with one INSERT ... SELECT rather than by the
+per-row trigger. The trigger is dropped and recreated inside the chunk's
+transaction, so no committed state lacks it.
+
+Columns (the same names as the API):
+
+* users: ``id``, ``username``, ``email``, ``password`` or ``password_hash``;
+* tracks: ``id``, ``title``, ``artist``, ``genre``, ``user_id``, and
+  optionally ``links`` (NDJSON only);
+* links: ``link_type``, ``link_url``, ``track_id``, ``user_id``.
+
+``created_at`` and ``updated_at`` (ISO 8601) are optional everywhere.
+
+Ids in the files belong to the source. The ``id`` of each loaded user
+and track is mapped in memory to the id it gets here. A ``user_id`` or
+``track_id`` is resolved through that map first, and then against rows
+already in the database. A user whose email already exists is mapped to
+the existing account. A track without a ``user_id`` is owned by
+``--user``, and a link without one by its track's owner. A track's
+``links`` are loaded with it, as ``GET /api/export/tracks`` writes them,
+so an NDJSON export loads back as is. Rows that fail validation or point
+at unknown rows are skipped and reported.
+
+New rows take ids above the current maximum, so load into a
+database nothing else is writing to. Afterwards the stats counters are
+rebuilt and the table versions bumped. The change feed does not get
+events for loaded rows.
+"""
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select, text
+
+from app import bcrypt
+from app.database import db
+from app.models import Track, Track_Link, User
+from app.response_cache import ALL_TRACKS, invalidate
+from app.search import sqlite_index_range, sqlite_insert_trigger
+from app.stats import rebuild
+from app.utils.validation import validate_link, validate_track
+from app.versioning import bump_versions
+
+CSV_SUFFIXES = ('.csv',)
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+USER_COLUMNS = ('id', 'username', 'email', 'password_hash', 'created_at', 'updated_at')
+TRACK_COLUMNS = ('id', 'title', 'artist', 'genre', 'user_id', 'created_at', 'updated_at')
+LINK_COLUMNS = ('id', 'link_type', 'link_url', 'track_id', 'user_id', 'created_at', 'updated_at')
+
+# Skipped rows reported individually; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class LoadError(Exception):
+    """A row that cannot be loaded; the message is reported with its file and line."""
+
+
+def read_records(path: str):
+    """
+    Streams the records of a CSV or NDJSON file.
+
+    Args:
+        path (str): File path; the format is chosen by its suffix.
+
+    Yields:
+        tuple: (line number, dict), or (line number, LoadError) for an unreadable line.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in CSV_SUFFIXES:
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                # Empty cells are missing values, as in the NDJSON `null`
+                yield reader.line_num, {key: value for key, value in record.items() if key and value != ''}
+    elif suffix in NDJSON_SUFFIXES:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield number, LoadError(f"invalid JSON: {e}")
+                    continue
+                yield number, record if isinstance(record, dict) else LoadError("expected a JSON object")
+    else:
+        raise click.BadParameter(f"{path}: expected a {', '.join(CSV_SUFFIXES + NDJSON_SUFFIXES)} file")
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _int(record, field):
+    value = record.get(field)
+    if value is None:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    raise LoadError(f"{field} must be an integer")
+
+
+def _timestamp(record, field, default):
+    value = record.get(field)
+    if value is None:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise LoadError(f"{field} must be an ISO 8601 timestamp")
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)  # the API writes naive UTC
+    return parsed.astimezone(timezone.utc)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class Loader:
+    """Writes users, tracks and links on one connection, keeping the source-to-new id maps."""
+
+    def __init__(self, connection, chunk_size=5000, default_user=None):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.default_user = default_user
+        self.copy = connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+        self.user_ids = {}    # source user id -> id
+        self.track_ids = {}   # source track id -> (id, owner id)
+        self._existing_users = {}   # id -> bool
+        self._existing_tracks = {}  # id -> owner id, or None if missing
+        self._next_id = {
+            model: (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+            for model in (User, Track, Track_Link)
+        }
+        # tablename -> (trigger name, CREATE TRIGGER, range statement) for SQLite FTS5 indexes
+        self._fts = {}
+        if connection.dialect.name == 'sqlite':
+            for model in (Track, Track_Link):
+                name, create = sqlite_insert_trigger(model.__tablename__)
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"), {'name': name}
+                ).first()
+                if exists:
+                    self._fts[model.__tablename__] = (name, create, sqlite_index_range(model.__tablename__))
+        self._hashes = {}
+        self.stats = {name: {'rows': 0, 'skipped': 0, 'seconds': 0.0} for name in ('users', 'tracks', 'track_links')}
+        self.errors = []
+
+    # --- writing ---------------------------------------------------------
+
+    def _write(self, name, model, columns, rows):
+        started = time.perf_counter()
+        if rows:
+            if self.copy:
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write('\t'.join(_copy_value(row[column]) for column in columns) + '\n')
+                buffer.seek(0)
+                cursor = self.connection.connection.driver_connection.cursor()
+                cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN", buffer)
+            elif model.__tablename__ in self._fts:
+                trigger, create_trigger, index_range = self._fts[model.__tablename__]
+                self.connection.exec_driver_sql(f'DROP TRIGGER {trigger}')
+                self.connection.execute(insert(model.__table__), rows)
+                self.connection.execute(index_range, {'first': rows[0]['id'], 'last': rows[-1]['id']})
+                self.connection.exec_driver_sql(create_trigger)
+            else:
+                self.connection.execute(insert(model.__table__), rows)
+            self.connection.commit()
+        self.stats[name]['rows'] += len(rows)
+        self.stats[name]['seconds'] += time.perf_counter() - started
+
+    def _skip(self, name, where, error):
+        self.stats[name]['skipped'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{where}: {error}")
+
+    def _take_ids(self, model, count):
+        start = self._next_id[model]
+        self._next_id[model] += count
+        return range(start, start + count)
+
+    # --- resolving references ---------------------------------------------
+
+    def _lookup_users(self, ids):
+        unknown = [id for id in ids if id is not None and id not in self._existing_users]
+        if unknown:
+            found = set(self.connection.execute(select(User.id).where(User.id.in_(unknown))).scalars())
+            self._existing_users.update((id, id in found) for id in unknown)
+
+    def _lookup_tracks(self, ids):
+        unknown = [id for id in ids if id is not None and id not in self._existing_tracks]
+        if unknown:
+            found = dict(self.connection.execute(
+                select(Track.id, Track.user_id).where(Track.id.in_(unknown))
+            ).all())
+            self._existing_tracks.update((id, found.get(id)) for id in unknown)
+
+    def _user(self, source_id, fallback=None):
+        if source_id is None:
+            if fallback is None:
+                raise LoadError("user_id is required (or pass --user)")
+            return fallback
+        if source_id in self.user_ids:
+            return self.user_ids[source_id]
+        if self._existing_users.get(source_id):
+            return source_id
+        raise LoadError(f"unknown user_id {source_id}")
+
+    def _track(self, source_id):
+        if source_id is None:
+            raise LoadError("track_id is required")
+        if source_id in self.track_ids:
+            return self.track_ids[source_id]
+        owner = self._existing_tracks.get(source_id)
+        if owner is None:
+            raise LoadError(f"unknown track_id {source_id}")
+        return source_id, owner
+
+    # --- users --------------------------------------------------------------
+
+    def _password_hash(self, record):
+        if record.get('password_hash'):
+            return record['password_hash']
+        password = record.get('password')
+        if not isinstance(password, str) or not password:
+            raise LoadError("password or password_hash is required")
+        if password not in self._hashes:  # fixtures often share a password; bcrypt it once
+            rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+            self._hashes[password] = bcrypt.generate_password_hash(password, rounds).decode('utf-8')
+        return self._hashes[password]
+
+    def load_users(self, path):
+        now = datetime.now(timezone.utc)
+        taken_usernames, taken_emails = set(), set()
+        for chunk in _chunks(read_records(path), self.chunk_size):
+            records = [record for record in chunk if isinstance(record[1], dict)]
+            emails = [r.get('email') for _, r in records if isinstance(r.get('email'), str)]
+            usernames = [r.get('username') for _, r in records if isinstance(r.get('username'), str)]
+            existing_emails = dict(self.connection.execute(
+                select(User.email, User.id).where(User.email.in_(emails))
+            ).all())
+            taken_usernames.update(self.connection.execute(
+                select(User.username).where(User.username.in_(usernames))
+            ).scalars())
+
+            rows = []
+            for number, record in chunk:
+                where = f"{path}:{number}"
+                try:
+                    if isinstance(record, LoadError):
+                        raise record
+                    source_id = _int(record, 'id')
+                    username, email = record.get('username'), record.get('email')
+                    if not isinstance(username, str) or not username.strip():
+                        raise LoadError("username must be a non-empty string")
+                    if not isinstance(email, str) or not email.strip():
+                        raise LoadError("email must be a non-empty string")
+                    if email in existing_emails:
+                        # Already here (e.g. a second load of the same file): reuse the account
+                        if source_id is not None:
+                            self.user_ids[source_id] = existing_emails[email]
+                        self._skip('users', where, f"email {email} exists; mapped to user {existing_emails[email]}")
+                        continue
+                    if username in taken_usernames or email in taken_emails:
+                        raise LoadError(f"username {username} or email {email} is taken")
+                    created_at = _timestamp(record, 'created_at', now)
+                    row = {
+                        'username': username,
+                        'email': email,
+                        'password_hash': self._password_hash(record),
+                        'created_at': created_at,
+                        'updated_at': _timestamp(record, 'updated_at', created_at),
+                    }
+                except LoadError as e:
+                    self._skip('users', where, e)
+                    continue
+                taken_usernames.add(username)
+                taken_emails.add(email)
+                rows.append((source_id, row))
+
+            for (source_id, row), id in zip(rows, self._take_ids(User, len(rows))):
+                row['id'] = id
+                if source_id is not None:
+                    self.user_ids[source_id] = id
+            self._write('users', User, USER_COLUMNS, [row for _, row in rows])
+
+    # --- tracks and links -------------------------------------------------------
+
+    def _link_row(self, record, track, now):
+        error = validate_link({key: record[key] for key in ('link_type', 'link_url') if key in record})
+        if error:
+            raise LoadError(error)
+        track_id, owner = track
+        created_at = _timestamp(record, 'created_at', now)
+        return {
+            'link_type': record['link_type'],
+            'link_url': record['link_url'],
+            'track_id': track_id,
+            'user_id': self._user(_int(record, 'user_id'), fallback=owner),
+            'created_at': created_at,
+            'updated_at': _timestamp(record, 'updated_at', created_at),
+        }
+
+    def _write_links(self, rows):
+        for chunk in _chunks(rows, self.chunk_size):
+            for row, id in zip(chunk, self._take_ids(Track_Link, len(chunk))):
+                row['id'] = id
+            self._write('track_links', Track_Link, LINK_COLUMNS, chunk)
+
+    def load_tracks(self, path):
+        now = datetime.now(timezone.utc)
+        for chunk in _chunks(read_records(path), self.chunk_size):
+            records = [record for _, record in chunk if isinstance(record, dict)]
+            self._lookup_users(self._source_ids(records, 'user_id'))
+            self._lookup_users(self._source_ids(
+                [link for record in records for link in self._nested_links(record)], 'user_id'
+            ))
+
+            rows = []
+            for number, record in chunk:
+                where = f"{path}:{number}"
+                try:
+                    if isinstance(record, LoadError):
+                        raise record
+                    error = validate_track({key: record[key] for key in ('title', 'artist', 'genre') if key in record})
+                    if error:
+                        raise LoadError(error)
+                    created_at = _timestamp(record, 'created_at', now)
+                    row = {
+                        'title': record['title'],
+                        'artist': record.get('artist'),
+                        'genre': record.get('genre'),
+                        'user_id': self._user(_int(record, 'user_id'), fallback=self.default_user),
+                        'created_at': created_at,
+                        'updated_at': _timestamp(record, 'updated_at', created_at),
+                    }
+                    source_id = _int(record, 'id')
+                except LoadError as e:
+                    self._skip('tracks', where, e)
+                    continue
+                rows.append((where, source_id, row, self._nested_links(record)))
+
+            links = []
+            for (where, source_id, row, nested), id in zip(rows, self._take_ids(Track, len(rows))):
+                row['id'] = id
+                if source_id is not None:
+                    self.track_ids[source_id] = (id, row['user_id'])
+                for link in nested:
+                    try:
+                        links.append(self._link_row(link, (id, row['user_id']), now))
+                    except LoadError as e:
+                        self._skip('track_links', f"{where} (link)", e)
+            self._write('tracks', Track, TRACK_COLUMNS, [row for _, _, row, _ in rows])
+            self._write_links(links)
+
+    def load_links(self, path):
+        now = datetime.now(timezone.utc)
+        for chunk in _chunks(read_records(path), self.chunk_size):
+            records = [record for _, record in chunk if isinstance(record, dict)]
+            self._lookup_tracks(self._source_ids(records, 'track_id'))
+            self._lookup_users(self._source_ids(records, 'user_id'))
+
+            rows = []
+            for number, record in chunk:
+                try:
+                    if isinstance(record, LoadError):
+                        raise record
+                    rows.append(self._link_row(record, self._track(_int(record, 'track_id')), now))
+                except LoadError as e:
+                    self._skip('track_links', f"{path}:{number}", e)
+            self._write_links(rows)
+
+    @staticmethod
+    def _nested_links(record):
+        links = record.get('links')
+        return [link for link in links if isinstance(link, dict)] if isinstance(links, list) else []
+
+    @staticmethod
+    def _source_ids(records, field):
+        ids = set()
+        for record in records:
+            try:
+                ids.add(_int(record, field))
+            except LoadError:
+                pass  # reported when the row itself is processed
+        ids.discard(None)
+        return ids
+
+    # --- before and after ------------------------------------------------------
+
+    def __enter__(self):
+        if self.connection.dialect.name == 'sqlite':
+            self._synchronous = self.connection.execute(text('PRAGMA synchronous')).scalar()
+            self.connection.execute(text('PRAGMA synchronous=OFF'))
+            self.connection.execute(text('PRAGMA cache_size=-262144'))  # 256 MiB
+            self.connection.execute(text('PRAGMA temp_store=MEMORY'))
+        elif self.connection.dialect.name == 'postgresql':
+            self.connection.execute(text('SET synchronous_commit TO off'))
+        self.connection.commit()
+        return self
+
+    def finish(self):
+        """Point id sequences past the loaded rows, rebuild the stats counters and bump table versions."""
+        if self.connection.dialect.name == 'postgresql':
+            for model in (User, Track, Track_Link):
+                table = model.__tablename__
+                self.connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+                ))
+        rebuild(self.connection)
+        self.connection.commit()
+        # Bumped in a transaction of its own, as sessions do (see app.versioning)
+        bump_versions(self.connection, {'tracks', 'track_links'})
+        self.connection.commit()
+        invalidate('tracks', 'track_links', ALL_TRACKS)
+
+    def __exit__(self, *exc_info):
+        self.connection.rollback()
+        if self.connection.dialect.name == 'sqlite':
+            self.connection.execute(text(f'PRAGMA synchronous={self._synchronous}'))
+        elif self.connection.dialect.name == 'postgresql':
+            self.connection.execute(text('RESET synchronous_commit'))
+        self.connection.commit()
+
+
+data_cli = AppGroup('data', help='Load users, tracks and links from files.')
+
+
+@data_cli.command('load')
+@click.option('--users', 'users_path', type=click.Path(exists=True, dir_okay=False), help='Users file.')
+@click.option('--tracks', 'tracks_path', type=click.Path(exists=True, dir_okay=False), help='Tracks file.')
+@click.option('--links', 'links_path', type=click.Path(exists=True, dir_okay=False), help='Track links file.')
+@click.option('--user', 'default_user', default=None,
+              help='Email of the owner of tracks without a user_id.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=5000, show_default=True,
+              help='Rows per insert and transaction.')
+def load_command(users_path, tracks_path, links_path, default_user, chunk_size):
+    """Load users, tracks and links from CSV or NDJSON files, in that order."""
+    if not (users_path or tracks_path or links_path):
+        raise click.UsageError("Pass at least one of --users, --tracks and --links")
+
+    with db.engine.connect() as connection:
+        owner = None
+        if default_user is not None:
+            owner = connection.execute(select(User.id).where(User.email == default_user)).scalar()
+            if owner is None:
+                raise click.BadParameter(f"No user with email {default_user}", param_hint='--user')
+
+        started = time.perf_counter()
+        with Loader(connection, chunk_size, default_user=owner) as loader:
+            if users_path:
+                loader.load_users(users_path)
+            if tracks_path:
+                loader.load_tracks(tracks_path)
+            if links_path:
+                loader.load_links(links_path)
+            loader.finish()
+        elapsed = time.perf_counter() - started
+
+    for name, stats in loader.stats.items():
+        if stats['rows'] or stats['skipped']:
+            rate = stats['rows'] / max(stats['seconds'], 1e-9)
+            click.echo(f"  {name}: {stats['rows']} rows in {stats['seconds']:.1f}s ({rate:,.0f} rows/s), "
+                       f"{stats['skipped']} skipped")
+    for error in loader.errors:
+        click.echo(f"  skipped {error}", err=True)
+    total = sum(stats['rows'] for stats in loader.stats.values())
+    click.echo(f"Loaded {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
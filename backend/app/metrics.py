@@ -0,0 +1,256 @@
+"""Per-request performance instrumentation.
+
+Every request records its latency, SQL query count and time (through
+SQLAlchemy cursor events), response size and JSON serialization time,
+grouped by endpoint. `render()` formats them, together with the
+connection pool, bcrypt pool and admission control statistics, in the
+Prometheus text exposition format served at `/api/metrics`.
+
+Requests slower than `METRICS_SLOW_REQUEST_MS` are logged with the SQL
+statements they ran. Nothing is installed when `METRICS_ENABLED` is off,
+so the cursor events cost nothing then. Metrics are kept per process; with several gunicorn
+workers each worker reports its own.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Summary:
+    def __init__(self):
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe store of labelled metrics, keyed by metric name then label tuple."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.summaries = {}
+        self.help = {}
+
+    def inc(self, name, labels, value=1, help=''):
+        with self._lock:
+            self.help.setdefault(name, help)
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value, buckets=None, help=''):
+        with self._lock:
+            self.help.setdefault(name, help)
+            if buckets is None:
+                metric = self.summaries.setdefault(name, {}).setdefault(labels, Summary())
+            else:
+                metric = self.histograms.setdefault(name, {}).setdefault(labels, Histogram(buckets))
+            metric.observe(value)
+
+
+registry = Registry()
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _gauges():
+    """Point-in-time values gathered from the pool, the SQLite write queue and the password hasher."""
+    from app.database import pool_checkout_stats
+
+    gauges = []
+    for bind, stats in pool_checkout_stats().items():
+        labels = (('bind', bind),)
+        gauges.append(('db_pool_checkouts_total', 'counter', 'Connection pool checkouts', labels, stats['count']))
+        gauges.append(('db_pool_checkout_wait_seconds_total', 'counter',
+                       'Time spent waiting for a pooled connection', labels, stats['wait_seconds_total']))
+        gauges.append(('db_pool_checkout_wait_seconds_max', 'gauge',
+                       'Longest wait for a pooled connection', labels, stats['wait_seconds_max']))
+
+    for bind, queue in current_app.extensions.get('sqlite_write_queues', {}).items():
+        stats = queue.metrics()
+        labels = (('bind', bind),)
+        gauges.append(('sqlite_write_lock_acquisitions_total', 'counter',
+                       'Write transactions admitted by SQLITE_SERIALIZE_WRITES', labels, stats['count']))
+        gauges.append(('sqlite_write_lock_wait_seconds_total', 'counter',
+                       'Time spent waiting for the SQLite write lock', labels, stats['wait_seconds_total']))
+        gauges.append(('sqlite_write_lock_wait_seconds_max', 'gauge',
+                       'Longest wait for the SQLite write lock', labels, stats['wait_seconds_max']))
+
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is not None:
+        for key, value in hasher.metrics().items():
+            help = f'bcrypt hasher {key.replace("_", " ")}'
+            if key in ('in_flight', 'queued'):
+                gauges.append((f'bcrypt_{key}', 'gauge', help, (), value))
+            else:
+                name = f'bcrypt_{key}' if key.endswith('_total') else f'bcrypt_{key}_total'
+                gauges.append((name, 'counter', help, (), value))
+
+    limiter = current_app.extensions.get('concurrency_limiter')
+    if limiter is not None:
+        stats = limiter.metrics()
+        gauges.append(('http_requests_in_flight', 'gauge', 'Requests being handled by this worker', (),
+                       stats['in_flight']))
+        gauges.append(('http_requests_shed_total', 'counter', 'Requests shed by MAX_CONCURRENT_REQUESTS', (),
+                       stats['shed_total']))
+    return gauges
+
+
+def render():
+    """Render all metrics in the Prometheus text format."""
+    lines = []
+    with registry._lock:
+        for name, series in sorted(registry.counters.items()):
+            lines.append(f'# HELP {name} {registry.help[name]}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(series.items()):
+                lines.append(f'{name}{_fmt_labels(labels)} {value}')
+        for name, series in sorted(registry.histograms.items()):
+            lines.append(f'# HELP {name} {registry.help[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, hist in sorted(series.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{_fmt_labels(labels, [("le", bound)])} {count}')
+                lines.append(f'{name}_bucket{_fmt_labels(labels, [("le", "+Inf")])} {hist.count}')
+                lines.append(f'{name}_sum{_fmt_labels(labels)} {hist.sum}')
+                lines.append(f'{name}_count{_fmt_labels(labels)} {hist.count}')
+        for name, series in sorted(registry.summaries.items()):
+            lines.append(f'# HELP {name} {registry.help[name]}')
+            lines.append(f'# TYPE {name} summary')
+            for labels, summary in sorted(series.items()):
+                lines.append(f'{name}_sum{_fmt_labels(labels)} {summary.sum}')
+                lines.append(f'{name}_count{_fmt_labels(labels)} {summary.count}')
+
+    seen = set()
+    for name, kind, help, labels, value in _gauges():
+        if name not in seen:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            seen.add(name)
+        lines.append(f'{name}{_fmt_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- SQL instrumentation -----------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with the statement
+    # whether it succeeds or fails
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or 'metrics_start' not in g:
+        return
+    elapsed = time.perf_counter() - context._query_start
+    g.sql_count += 1
+    g.sql_seconds += elapsed
+    if g.sql_statements is not None:
+        g.sql_statements.append((elapsed, statement))
+
+
+# --- Request hooks -----------------------------------------------------------
+
+def _before_request():
+    g.metrics_slow_ms = current_app.config['METRICS_SLOW_REQUEST_MS']
+    g.metrics_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+    g.serialize_seconds = 0.0
+    g.sql_statements = [] if g.metrics_slow_ms else None
+
+
+def _after_request(response):
+    if 'metrics_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (('method', request.method), ('endpoint', endpoint))
+
+    registry.inc('http_requests_total', labels + (('status', response.status_code),),
+                 help='HTTP requests handled')
+    registry.observe('http_request_duration_seconds', labels, elapsed, LATENCY_BUCKETS,
+                     help='Time from request start to response')
+    registry.observe('http_request_sql_queries', labels, g.sql_count, QUERY_COUNT_BUCKETS,
+                     help='SQL statements executed per request')
+    registry.observe('http_request_sql_seconds', labels, g.sql_seconds,
+                     help='Time spent executing SQL per request')
+    registry.observe('http_request_serialization_seconds', labels, g.serialize_seconds,
+                     help='Time spent encoding JSON per request')
+    if response.content_length is not None:
+        registry.observe('http_response_size_bytes', labels, response.content_length,
+                         help='Response body size')
+
+    if g.metrics_slow_ms and elapsed * 1000 >= g.metrics_slow_ms:
+        statements = '\n'.join(f'  {seconds * 1000:.1f}ms  {sql}' for seconds, sql in g.sql_statements)
+        logger.warning(
+            "Slow request %s %s took %.1fms (%d queries, %.1fms SQL)\n%s",
+            request.method, request.full_path, elapsed * 1000,
+            g.sql_count, g.sql_seconds * 1000, statements,
+        )
+    return response
+
+
+def _timed(encode):
+    @wraps(encode)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return encode(*args, **kwargs)
+        finally:
+            if has_request_context() and 'serialize_seconds' in g:
+                g.serialize_seconds += time.perf_counter() - started
+    return wrapper
+
+
+def init_app(app):
+    """Install the request hooks, time the app's SQL and JSON provider; a no-op unless `METRICS_ENABLED`."""
+    if not app.config['METRICS_ENABLED']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.json.response = _timed(app.json.response)
@@ -1,5 +1,4 @@
 from app.database import db
-from app import bcrypt 
 from datetime import datetime, timezone
 
 class User(db.Model):
@@ -16,10 +15,17 @@ class User(db.Model):
     track_links = db.relationship('Track_Link', back_populates='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        from app.passwords import get_password_hasher
+        self.password_hash = get_password_hasher().hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        from app.passwords import get_password_hasher
+        return get_password_hasher().check(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True if the stored hash was made with a different BCRYPT_LOG_ROUNDS."""
+        from app.passwords import get_password_hasher
+        return get_password_hasher().needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {
@@ -32,20 +38,27 @@ class User(db.Model):
     
 class Track(db.Model):
     __tablename__ = 'tracks'
+    __table_args__ = (
+        db.Index('ix_tracks_created_at_id', 'created_at', 'id'),  # keyset pagination
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
-    artist = db.Column(db.String(100), nullable=True)
-    genre = db.Column(db.String(50), nullable=True)
+    title = db.Column(db.String(100), nullable=False, index=True)
+    artist = db.Column(db.String(100), nullable=True, index=True)
+    genre = db.Column(db.String(50), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     user = db.relationship('User', back_populates='tracks', lazy=True)
-    links = db.relationship('Track_Link', back_populates='track', lazy=True)
+    links = db.relationship('Track_Link', back_populates='track', lazy=True, order_by='Track_Link.id')
     
-    def to_dict(self):
-        return {
+    FIELDS = ('id', 'title', 'artist', 'genre', 'created_at', 'updated_at', 'user_id', 'links')
+
+    def to_dict(self, fields=None):
+        """Serialize the track. `fields` optionally limits the output keys;
+        `links` is only touched when it is requested."""
+        data = {
             'id': self.id,
             'title': self.title,
             'artist': self.artist or '',
@@ -53,11 +66,20 @@ class Track(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'user_id': self.user_id,
-            'links': [link.to_dict() for link in self.links]
         }
+        if fields is None or 'links' in fields:
+            data['links'] = [link.to_dict() for link in self.links]
+        if fields is not None:
+            data = {key: data[key] for key in self.FIELDS if key in fields}
+        return data
 
 class Track_Link(db.Model):
     __tablename__ = 'track_links'
+    __table_args__ = (
+        # links of one track (filter, selectin IN loads, keyset pagination within a track)
+        db.Index('ix_track_links_track_id_created_at_id', 'track_id', 'created_at', 'id'),
+        db.Index('ix_track_links_created_at_id', 'created_at', 'id'),  # keyset pagination
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     link_type = db.Column(db.String(50), nullable=False)
@@ -67,7 +89,7 @@ class Track_Link(db.Model):
 
     track_id = db.Column(db.Integer, db.ForeignKey('tracks.id'), nullable=False)
     track = db.relationship('Track', back_populates='links', lazy=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False) 
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     user = db.relationship('User', back_populates='track_links', lazy=True)  
     
     def to_dict(self):
@@ -85,5 +107,52 @@ class Track_Link(db.Model):
 class TokenBlocklist(db.Model):
     __tablename__ = 'token_blocklist'
     id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String(36), nullable=False, index=True)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    jti = db.Column(db.String(36), nullable=False, unique=True, index=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # the revoked token's own exp
+
+class TableVersion(db.Model):
+    """Per-table change counter, bumped right after each commit that writes to that table."""
+    __tablename__ = 'table_versions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class ChangeEvent(db.Model):
+    """Outbox of track and link changes, written in the same transaction as the change."""
+    __tablename__ = 'change_events'
+    __table_args__ = {'sqlite_autoincrement': True}  # ids must never be reused once purged
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # the JSON sent to subscribers
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+class StatCounter(db.Model):
+    """Precomputed count for one key of a stats dimension; see app/stats.py."""
+    __tablename__ = 'stat_counters'
+    __table_args__ = (
+        db.Index('ix_stat_counters_dimension_count', 'dimension', 'count'),  # largest keys first
+    )
+    dimension = db.Column(db.String(32), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    """Background job queued by `app.jobs.enqueue`; see app/jobs.py."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),  # next due job
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON keyword arguments of the task
+    status = db.Column(db.String(16), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)  # due time; while running, when the claim expires
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,112 @@
+"""Bounded, off-thread bcrypt hashing.
+
+bcrypt releases the GIL, so hashes run on a small thread pool
+(`BCRYPT_MAX_WORKERS`) instead of in whatever request thread asked for
+them. At most `BCRYPT_MAX_QUEUE` hashes may wait behind the running ones;
+beyond that, or when a hash waits longer than `BCRYPT_QUEUE_TIMEOUT`
+seconds, the request is shed with a 503 so a login storm cannot tie up
+every worker that also serves the track read endpoints.
+
+The cost factor (`BCRYPT_LOG_ROUNDS`) is stored in every bcrypt hash, so
+hashes made at a different cost are detected with `needs_rehash` and
+upgraded on the next successful login.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+
+from app import bcrypt
+
+
+def hash_rounds(password_hash):
+    """Return the cost factor encoded in a bcrypt hash (`$2b$<rounds>$...`)."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool and records queueing metrics."""
+
+    def __init__(self, rounds=12, max_workers=2, max_queue=32, queue_timeout=5.0):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {
+            'completed': 0,
+            'rejected': 0,
+            'timed_out': 0,
+            'queue_wait_seconds_total': 0.0,
+            'hash_seconds_total': 0.0,
+        }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.stats['rejected'] += 1
+                raise ServiceUnavailable(description="Authentication is busy, retry shortly", retry_after=1)
+            self._pending += 1
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self.stats['completed'] += 1
+                    self.stats['queue_wait_seconds_total'] += started - submitted
+                    self.stats['hash_seconds_total'] += finished - started
+
+        future = self._executor.submit(task)
+        try:
+            return future.result(timeout=self.queue_timeout)
+        except FutureTimeoutError:
+            # Drop it if it has not started yet; a running hash just finishes unobserved
+            if future.cancel():
+                with self._lock:
+                    self._pending -= 1
+            with self._lock:
+                self.stats['timed_out'] += 1
+            raise ServiceUnavailable(description="Authentication is busy, retry shortly", retry_after=1)
+
+    def hash(self, password):
+        return self._run(bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def check(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def metrics(self):
+        """Snapshot of the hasher's counters plus the current queue depth."""
+        with self._lock:
+            snapshot = dict(self.stats)
+            snapshot['in_flight'] = min(self._pending, self.max_workers)
+            snapshot['queued'] = max(self._pending - self.max_workers, 0)
+        return snapshot
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def init_app(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        rounds=app.config['BCRYPT_LOG_ROUNDS'],
+        max_workers=app.config['BCRYPT_MAX_WORKERS'],
+        max_queue=app.config['BCRYPT_MAX_QUEUE'],
+        queue_timeout=app.config['BCRYPT_QUEUE_TIMEOUT'],
+    )
@@ -0,0 +1,129 @@
+"""Startup measurements.
+
+    flask perf startup [--runs 5] [--path /api/tracks] [--imports 10] [--budget 1500]
+
+Each run starts a fresh interpreter, as a new gunicorn worker does, which
+imports the app package, calls `create_app` and serves one GET request
+through the test client. The command reports the median, min and max of:
+
+* import: importing ``app`` (Flask, SQLAlchemy and the models);
+* create_app: configuring the app, its extensions and blueprints;
+* first request: the first GET of `--path`, including the first database connection;
+* process: the whole interpreter run, as measured from outside.
+
+``--imports`` adds the top-level packages with the highest import cost,
+from one extra run under ``python -X importtime``. With ``--budget``, the
+command exits with status 1 when the median time to first request
+(import + create_app + first request) exceeds that many milliseconds, so
+CI can catch a startup regression. ``tests/test_startup.py`` runs the same
+check under pytest, against `STARTUP_BUDGET_MS` (default 1500).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+PHASES = ('import', 'create_app', 'first_request')
+
+# Runs in the child interpreter; prints one JSON object with times in seconds
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'status': response.status_code,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def _run(args, cwd):
+    result = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise click.ClickException(f"Startup probe failed:\n{result.stderr[-2000:]}")
+    return result
+
+
+def measure_startup(path: str, cwd: str) -> dict:
+    """
+    Starts one interpreter that imports and creates the app and serves `path`.
+
+    Args:
+        path (str): The URL of the first request.
+        cwd (str): Directory the ``app`` package is imported from.
+
+    Returns:
+        dict: Seconds per phase and for the whole process, the response status and the module count.
+    """
+    started = time.perf_counter()
+    result = _run(['-c', PROBE, path], cwd)
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['process'] = time.perf_counter() - started
+    return sample
+
+
+def import_costs(cwd: str) -> dict:
+    """Seconds spent importing each top-level package (its own modules only) while importing ``app``."""
+    result = _run(['-X', 'importtime', '-c', 'import app'], cwd)
+    costs = defaultdict(float)
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented module>", after a header row
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            costs[module.strip().split('.')[0]] += int(self_us) / 1e6
+    return dict(costs)
+
+
+perf_cli = AppGroup('perf', help='Measure application performance.')
+
+
+@perf_cli.command('startup')
+@click.option('--runs', type=click.IntRange(min=1), default=5, show_default=True, help='Fresh interpreters to start.')
+@click.option('--path', default='/api/tracks', show_default=True, help='URL of the first request.')
+@click.option('--imports', type=click.IntRange(min=0), default=10, show_default=True,
+              help='Top-level packages to list by import time (0 to skip).')
+@click.option('--budget', type=float, default=None,
+              help='Fail if the median time to first request exceeds this many milliseconds.')
+def startup_command(runs, path, imports, budget):
+    """Measure import time and time to first request in fresh processes."""
+    cwd = os.path.dirname(current_app.root_path)
+    samples = [measure_startup(path, cwd) for _ in range(runs)]
+    for sample in samples:
+        sample['total'] = sum(sample[phase] for phase in PHASES)
+
+    click.echo(f"{runs} runs, first request GET {path} -> {samples[0]['status']}, "
+               f"{samples[0]['modules']} modules loaded")
+    for name in (*PHASES, 'total', 'process'):
+        values = [sample[name] * 1000 for sample in samples]
+        label = 'to first request' if name == 'total' else name.replace('_', ' ')
+        click.echo(f"  {label:17} median {statistics.median(values):7.1f}ms  "
+                   f"min {min(values):7.1f}ms  max {max(values):7.1f}ms")
+
+    if imports:
+        click.echo("Import time by package:")
+        costs = sorted(import_costs(cwd).items(), key=lambda item: item[1], reverse=True)
+        for package, seconds in costs[:imports]:
+            click.echo(f"  {package:24} {seconds * 1000:7.1f}ms")
+
+    if budget is not None:
+        median = statistics.median(sample['total'] for sample in samples) * 1000
+        if median > budget:
+            raise click.ClickException(f"Time to first request {median:.1f}ms is over the {budget:g}ms budget")
+        click.echo(f"Time to first request {median:.1f}ms is within the {budget:g}ms budget")
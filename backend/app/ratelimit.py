@@ -0,0 +1,259 @@
+"""Rate limiting and admission control.
+
+Rate limits are token buckets. A view decorated with `rate_limit(name)` takes
+one token from its client's bucket per request. The bucket holds at most
+``count`` tokens and refills at ``count`` per ``period``, where
+``RATE_LIMITS[name]`` is ``"<count>/<period>"`` (``second``, ``minute``,
+``hour`` or ``day``). Authenticated clients are keyed by their JWT identity,
+and everyone else by IP address. An empty bucket gets a 429 with
+``Retry-After`` set to when the next token is due. Limits are set in the
+environment as ``RATE_LIMITS=login=10/minute,search=120/minute``; names
+that are not listed keep their defaults.
+
+Buckets are kept in process, bounded by `RATE_LIMIT_MAX_KEYS`, so each
+worker enforces its own limit. Setting `RATE_LIMIT_URL` to a ``redis://``
+URL shares the buckets between workers instead (requires `redis`).
+
+Behind a reverse proxy, set `RATE_LIMIT_PROXY_HOPS` to the number of proxies
+that append to ``X-Forwarded-For`` so clients are told apart.
+
+`MAX_CONCURRENT_REQUESTS` caps the requests a worker process handles at
+once. Requests over the cap are shed immediately with a 503 and
+``Retry-After``, instead of queueing behind work that is already slow.
+Under ASGI the cap is applied before a request is handed to the WSGI
+thread pool. Health checks, metrics and the change feed are exempt.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+DEFAULT_LIMITS = {
+    'login': '10/minute',
+    'register': '5/minute',
+    'search': '120/minute',
+}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Paths that never count towards (or are shed by) MAX_CONCURRENT_REQUESTS
+ADMISSION_EXEMPT_PATHS = ('/api/health', '/api/metrics', '/api/stream/')
+
+# Set in the WSGI environ by `app.asgi`, which has already admitted the request
+ADMITTED_ENVIRON_KEY = 'racer_x.admitted'
+
+
+def parse_limit(value: str) -> tuple:
+    """
+    Parses a ``"<count>/<period>"`` limit.
+
+    Args:
+        value (str): e.g. ``"10/minute"``.
+
+    Returns:
+        tuple: (capacity, tokens per second).
+
+    Raises:
+        ValueError: If the limit is malformed.
+    """
+    count, _, period = value.strip().partition('/')
+    if period not in PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f"Invalid rate limit {value!r}; expected <count>/<second|minute|hour|day>")
+    return int(count), int(count) / PERIODS[period]
+
+
+def parse_limits(value: str) -> dict:
+    """Parse ``RATE_LIMITS`` (``name=limit,...``) over `DEFAULT_LIMITS`."""
+    limits = dict(DEFAULT_LIMITS)
+    for item in value.split(','):
+        if item.strip():
+            name, _, limit = item.partition('=')
+            limits[name.strip()] = limit.strip()
+    return limits
+
+
+class MemoryBuckets:
+    """In-process token buckets, least recently used evicted beyond `max_keys`."""
+
+    shared = False
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take a token; returns the seconds until one is available (0 if taken)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# KEYS[1] bucket; ARGV capacity, rate, now. Returns {taken, tokens}.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local taken = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {taken, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared between workers, updated atomically by a Lua script."""
+
+    shared = True
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_URL needs the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        taken, tokens = self._take(keys=[self.prefix + key], args=[capacity, rate, time.time()])
+        return 0.0 if taken else (1 - float(tokens)) / rate
+
+
+class ConcurrencyLimiter:
+    """Counts in-flight requests and refuses new ones beyond `limit`."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def metrics(self) -> dict:
+        return {'in_flight': self.in_flight, 'shed_total': self.shed}
+
+
+def get_buckets():
+    return current_app.extensions.get('rate_limit_buckets')
+
+
+def get_concurrency_limiter(app=None):
+    return (app or current_app).extensions.get('concurrency_limiter')
+
+
+def is_exempt(path: str) -> bool:
+    return path.startswith(ADMISSION_EXEMPT_PATHS)
+
+
+def client_ip() -> str:
+    """The client's address, skipping `RATE_LIMIT_PROXY_HOPS` trusted proxies."""
+    hops = current_app.config['RATE_LIMIT_PROXY_HOPS']
+    forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+    if hops and forwarded:
+        return forwarded[-min(hops, len(forwarded))]
+    return request.remote_addr or 'unknown'
+
+
+def _client_key(by):
+    if by == 'client':
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:  # an invalid token is rejected by the view itself, if it needs one
+            identity = None
+        if identity is not None:
+            return f'user:{identity}'
+    return f'ip:{client_ip()}'
+
+
+def rate_limit(name, by='client'):
+    """
+    Limits a view to the `RATE_LIMITS[name]` rate per client.
+
+    Args:
+        name (str): Key into `RATE_LIMITS`; views sharing a name share buckets.
+        by (str): ``client`` (JWT identity, else IP address) or ``ip``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            buckets = get_buckets()
+            if buckets is not None:
+                capacity, rate = current_app.extensions['rate_limits'][name]
+                wait = buckets.take(f'{name}:{_client_key(by)}', capacity, rate)
+                if wait > 0:
+                    raise TooManyRequests(description="Rate limit exceeded, retry later",
+                                          retry_after=max(1, math.ceil(wait)))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _admit():
+    limiter = get_concurrency_limiter()
+    if limiter is None or request.environ.get(ADMITTED_ENVIRON_KEY) or is_exempt(request.path):
+        return
+    if not limiter.try_enter():
+        raise ServiceUnavailable(description="Server is busy, retry shortly",
+                                 retry_after=current_app.config['ADMISSION_RETRY_AFTER'])
+    g.admitted = True
+
+
+def _release(exc):
+    if g.pop('admitted', False):
+        get_concurrency_limiter().leave()
+
+
+def init_app(app):
+    if app.config['RATE_LIMIT_ENABLED']:
+        app.extensions['rate_limits'] = {
+            name: parse_limit(limit) for name, limit in parse_limits(app.config['RATE_LIMITS']).items()
+        }
+        url = app.config['RATE_LIMIT_URL']
+        if url:
+            app.extensions['rate_limit_buckets'] = RedisBuckets(url)
+        else:
+            app.extensions['rate_limit_buckets'] = MemoryBuckets(app.config['RATE_LIMIT_MAX_KEYS'])
+
+    if app.config['MAX_CONCURRENT_REQUESTS'] > 0:
+        app.extensions['concurrency_limiter'] = ConcurrencyLimiter(app.config['MAX_CONCURRENT_REQUESTS'])
+        app.before_request(_admit)
+        app.teardown_request(_release)
@@ -0,0 +1,211 @@
+"""Server-side cache of public read responses.
+
+`cached_response` stores the body of a successful GET under the request
+path plus its sorted query arguments, so `?a=1&b=2` and `?b=2&a=1` share
+an entry. Entries expire after `RESPONSE_CACHE_TTL` seconds and carry
+tags naming the data they show:
+
+* ``tracks``: track listings and search (which embed links),
+* ``track_links``: link listings and search,
+* ``track:<id>``: one track and its links; ``track:*`` covers every
+  ``track:<id>`` entry when a bulk write cannot name the tracks it touched.
+
+Write handlers call `invalidate` with the tags they affect after
+committing. Every tag has a generation counter; an entry records the
+generations it was rendered under (read *before* the database), and is
+only served while they are unchanged. A write that commits while a
+response is being rendered therefore never leaves a stale entry behind.
+
+The default backend is an in-process LRU bounded by `RESPONSE_CACHE_MAX_BYTES`.
+Its tag counters are per worker, so its entries are also bound to the
+`table_versions` counters and are dropped by writes made in other
+workers. Setting `RESPONSE_CACHE_URL` to a ``redis://`` URL shares
+entries and tag counters between workers instead (requires `redis`).
+
+Conditional GET runs before the cache, so ETag/304 handling is unchanged.
+The async views in `app.asgi` read the database directly.
+
+Known limit: a hit still costs one query. Every cached view is also a
+conditional GET, which reads the `table_versions` rows before the cache
+is consulted (the memory backend reuses them through `g`). A hit saves
+the view's own queries and serialization but not that round trip, so
+hits are slow or fail while the database is. Serving hits without SQL
+would need the versions kept in the backend, which the per-worker memory
+backend cannot share.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, g, request
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+ALL_TRACKS = 'track:*'
+
+
+def track_tag(track_id):
+    return f'track:{track_id}'
+
+
+class MemoryBackend:
+    """In-process LRU of entries bounded by total body size."""
+
+    shared = False
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        size = len(entry['body'])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {**entry, 'expires': time.monotonic() + ttl}
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self.size -= len(self._entries.pop(key)['body'])
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class RedisBackend:
+    """Entries and tag counters shared between workers through Redis."""
+
+    shared = True
+
+    def __init__(self, url, prefix='response_cache:'):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_URL needs the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + 'entry:' + key)
+        if raw is None:
+            return None
+        meta, _, body = raw.partition(b'\n')
+        return {**json.loads(meta), 'body': body}
+
+    def set(self, key, entry, ttl):
+        meta = {k: v for k, v in entry.items() if k != 'body'}
+        raw = json.dumps(meta).encode('utf-8') + b'\n' + entry['body']
+        self.client.set(self.prefix + 'entry:' + key, raw, ex=max(1, int(ttl)))
+
+    def generations(self, tags):
+        values = self.client.mget([self.prefix + 'tag:' + tag for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self.prefix + 'tag:' + tag)
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + 'entry:*'):
+            self.client.delete(key)
+
+
+def get_response_cache():
+    return current_app.extensions.get('response_cache')
+
+
+def _cache_key():
+    args = sorted(request.args.items(multi=True))
+    return request.path + ('?' + urlencode(args) if args else '')
+
+
+def _versions():
+    # Read by conditional_get already on every cached view, so this adds no query
+    from app.versioning import get_versions
+    versions = g.get('table_versions')
+    if versions is None:
+        versions, _ = get_versions()
+    return [[name, version] for name, version in sorted(versions.items())]
+
+
+def cached_response(tags):
+    """Cache a public GET view's 200 responses under `tags(**view_args)`."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = get_response_cache()
+            if backend is None:
+                return view(*args, **kwargs)
+
+            entry_tags = sorted(tags(**kwargs))
+            stamp = {'generations': backend.generations(entry_tags)}
+            if not backend.shared:
+                stamp['versions'] = _versions()
+
+            key = _cache_key()
+            entry = backend.get(key)
+            if entry is not None and entry['stamp'] == stamp:
+                return current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                backend.set(key, {
+                    'stamp': stamp,
+                    'mimetype': response.mimetype,
+                    'body': response.get_data(),
+                }, current_app.config['RESPONSE_CACHE_TTL'])
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Drop cached responses carrying any of `tags`; call after the write commits."""
+    backend = get_response_cache()
+    if backend is not None and tags:
+        backend.bump(sorted(set(tags)))
+
+
+def init_app(app):
+    if app.config['RESPONSE_CACHE_TTL'] <= 0:
+        return
+    url = app.config['RESPONSE_CACHE_URL']
+    if url:
+        app.extensions['response_cache'] = RedisBackend(url)
+    else:
+        app.extensions['response_cache'] = MemoryBackend(app.config['RESPONSE_CACHE_MAX_BYTES'])
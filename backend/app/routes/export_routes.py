@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from itertools import groupby
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from sqlalchemy import select
+from app.database import db
+from app.models import Track, Track_Link
+
+export_bp = Blueprint('export', __name__)
+
+TRACK_COLUMNS = ('id', 'title', 'artist', 'genre', 'created_at', 'updated_at', 'user_id')
+LINK_COLUMNS = ('id', 'link_type', 'link_url', 'created_at', 'updated_at', 'track_id', 'user_id')
+
+
+def _link_label(column):
+    return column if column.startswith('link_') else f'link_{column}'
+
+
+CSV_HEADER = [f'track_{c}' for c in TRACK_COLUMNS] + [_link_label(c) for c in LINK_COLUMNS]
+
+
+def _catalog_statement():
+    """Tracks left-joined to their links, ordered so each track's rows are contiguous."""
+    tracks = Track.__table__
+    links = Track_Link.__table__
+    return (
+        select(
+            *[tracks.c[c].label(f'track_{c}') for c in TRACK_COLUMNS],
+            *[links.c[c].label(_link_label(c)) for c in LINK_COLUMNS],
+        )
+        .select_from(tracks.outerjoin(links, links.c.track_id == tracks.c.id))
+        .order_by(tracks.c.id, links.c.id)
+    )
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _stream_rows():
+    """Yield catalog rows from a server-side cursor, `EXPORT_YIELD_PER` at a time."""
+    with db.engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=current_app.config['EXPORT_YIELD_PER']
+        ).execute(_catalog_statement())
+        yield from result.mappings()
+
+
+def _track_dicts():
+    """Group the joined rows into the same shape as `Track.to_dict()`."""
+    for _, rows in groupby(_stream_rows(), key=lambda row: row['track_id']):
+        rows = list(rows)
+        first = rows[0]
+        yield {
+            'id': first['track_id'],
+            'title': first['track_title'],
+            'artist': first['track_artist'] or '',
+            'genre': first['track_genre'] or '',
+            'created_at': _iso(first['track_created_at']),
+            'updated_at': _iso(first['track_updated_at']),
+            'user_id': first['track_user_id'],
+            'links': [
+                {
+                    'id': row['link_id'],
+                    'link_type': row['link_type'],
+                    'link_url': row['link_url'],
+                    'created_at': _iso(row['link_created_at']),
+                    'updated_at': _iso(row['link_updated_at']),
+                    'track_id': row['link_track_id'],
+                    'user_id': row['link_user_id'],
+                }
+                for row in rows if row['link_id'] is not None
+            ],
+        }
+
+
+def _ndjson():
+    for track in _track_dicts():
+        yield json.dumps(track, separators=(',', ':')) + '\n'
+
+
+def _csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for row in _stream_rows():
+        writer.writerow([
+            _iso(row[col]) if col.endswith(('_created_at', '_updated_at')) else row[col]
+            for col in CSV_HEADER
+        ])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@export_bp.route('/export/tracks', methods=['GET'])
+def export_tracks():
+    """Stream the full catalog of tracks with their links.
+    Query Param: format ("ndjson" (default) or "csv")
+    Returns: NDJSON with one track per line, or CSV with one row per link
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt == 'ndjson':
+        return Response(stream_with_context(_ndjson()), mimetype='application/x-ndjson')
+    if fmt == 'csv':
+        response = Response(stream_with_context(_csv()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=tracks.csv'
+        return response
+    abort(400, description="format must be 'ndjson' or 'csv'")
@@ -0,0 +1,11 @@
+from flask import Blueprint, Response, abort, current_app
+from app import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Return request, SQL, pool and bcrypt metrics in the Prometheus text format."""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
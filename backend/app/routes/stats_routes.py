@@ -0,0 +1,36 @@
+from flask import Blueprint, abort, jsonify, request
+from app.database import use_replica_for_reads
+from app.response_cache import cached_response
+from app.stats import DIMENSIONS, get_dimension, get_totals
+from app.versioning import conditional_get
+
+stats_bp = Blueprint('stats', __name__)
+stats_bp.before_request(use_replica_for_reads)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+@stats_bp.route('/stats', methods=['GET'])
+@conditional_get
+@cached_response(lambda: {'tracks', 'track_links'})
+def get_stats():
+    """Retrieve the total number of tracks and track links.
+    Returns: { "tracks": int, "track_links": int } (200)
+    """
+    return jsonify(get_totals()), 200
+
+@stats_bp.route('/stats/<dimension>', methods=['GET'])
+@conditional_get
+@cached_response(lambda dimension: {'tracks', 'track_links'})
+def get_stats_dimension(dimension):
+    """Retrieve the counts of one dimension, largest first.
+    Dimensions: tracks_by_user, tracks_by_genre, links_by_type
+    Query Param: limit (int, optional) at most 1000, default 100
+    Returns: { "data": [{ "key": str, "count": int }, ...] } (200)
+    """
+    if dimension not in DIMENSIONS:
+        abort(404, description=f"Unknown stats dimension: {dimension}")
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        abort(400, description=f"limit must be an integer between 1 and {MAX_LIMIT}")
+    return jsonify({'data': get_dimension(dimension, limit)}), 200
@@ -0,0 +1,17 @@
+from flask import Blueprint, Response, stream_with_context
+from app import changes
+
+stream_bp = Blueprint('stream', __name__)
+
+# Keep proxies (nginx) from buffering or caching the stream
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+@stream_bp.route('/stream/changes', methods=['GET'])
+def stream_changes():
+    """Stream track and link changes as Server-Sent Events.
+    Headers: Last-Event-ID (optional) resume after this event id
+    Query Param: last_event_id (int, optional) same, for the first connection
+    Returns: text/event-stream; see app/changes.py for the event format
+    """
+    start = changes.requested_position()
+    return Response(stream_with_context(changes.stream(start)), mimetype='text/event-stream', headers=STREAM_HEADERS)
@@ -1,10 +1,25 @@
 from flask import Blueprint, jsonify, request, abort
+from werkzeug.exceptions import HTTPException
+from sqlalchemy import delete, insert, update
 from sqlalchemy.exc import IntegrityError
-from app.database import db
+from datetime import datetime, timezone
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.database import db, mark_write, use_replica_for_reads
 from app.models import Track, Track_Link
+from app.search import search_track_links
+from app.versioning import conditional_get, mark_changed
+from app.response_cache import ALL_TRACKS, cached_response, invalidate, track_tag
+from app.changes import TRACK_LINK, publish
+from app.links import defer_normalization
+from app.ratelimit import rate_limit
+from app.stats import count_changes, update_returning_previous
+from app.utils.validation import validate_link
+from app.utils.bulk import BulkResult, get_batch_track_ids, get_bulk_items, group_by_track_id, write_in_chunks
+from app.utils.serializers import LINK_COLUMNS, link_rows_query, links_by_track, serialize_link_row, serialize_links
 from app.utils.pagination import paginate_query  # Import the pagination utility
 
 track_links_bp = Blueprint('track_links', __name__)
+track_links_bp.before_request(use_replica_for_reads)
 
 @track_links_bp.route('/health', methods=['GET'])
 def health():
@@ -12,16 +27,35 @@ def health():
     return jsonify({'status': 'healthy', 'message': 'Flask Racer X is running'}), 200
 
 @track_links_bp.route('/track_links', methods=['GET'])
+@conditional_get
+@cached_response(lambda: {'track_links'})
 def get_track_links():
-    """Retrieve paginated list of all track links."""
-    query = Track_Link.query
-    return jsonify(paginate_query(query)), 200
+    """Retrieve paginated list of all track links.
+    Query Param: track_ids (str, optional) comma-separated track IDs; returns
+                 those tracks' links grouped by track ID instead of a page
+    """
+    if 'track_ids' in request.args:
+        track_ids = get_batch_track_ids()
+        return jsonify(group_by_track_id(track_ids, links_by_track(track_ids))), 200
+    query = link_rows_query()
+    return jsonify(paginate_query(query, serialize=serialize_links)), 200
+
+@track_links_bp.route('/track_links/lookup', methods=['POST'])
+def lookup_track_links():
+    """Retrieve the links of many tracks in one call.
+    Request Body: { "track_ids": [int, ...] }
+    Returns: { "data": { "<track_id>": [link, ...], ... } } (200)
+    """
+    track_ids = get_batch_track_ids()
+    return jsonify(group_by_track_id(track_ids, links_by_track(track_ids))), 200
 
 @track_links_bp.route('/track_links/<int:track_id>', methods=['GET'])
+@conditional_get
+@cached_response(lambda track_id: {track_tag(track_id), ALL_TRACKS})
 def get_track_links_by_track(track_id):
     """Retrieve track links for a specific track ID."""
-    query = Track_Link.query.filter_by(track_id=track_id)
-    return jsonify(paginate_query(query)), 200
+    query = link_rows_query().filter(Track_Link.track_id == track_id)
+    return jsonify(paginate_query(query, serialize=serialize_links)), 200
 
 @track_links_bp.route('/track_links', methods=['POST'])
 def create_track_link():
@@ -33,16 +67,9 @@ def create_track_link():
     if not data:
         abort(400, description="No JSON data provided")
     
-    required_fields = ['link_type', 'link_url']
-    if not all(field in data for field in required_fields):
-        abort(400, description="Missing required fields: link_type, link_url")
-    
-    if not isinstance(data['link_type'], str) or not data['link_type'].strip():
-        abort(400, description="link_type must be a non-empty string")
-    if not isinstance(data['link_url'], str) or not data['link_url'].strip():
-        abort(400, description="link_url must be a non-empty string")
-    if 'track_id' in data and not isinstance(data['track_id'], (int, type(None))):
-        abort(400, description="track_id must be an integer or null")
+    error = validate_link(data)
+    if error:
+        abort(400, description=error)
     
     try:
         track_link = Track_Link(
@@ -51,7 +78,14 @@ def create_track_link():
             track_id=data.get('track_id')
         )
         db.session.add(track_link)
+        db.session.flush()
+        db.session.refresh(track_link)  # column values as the database stores them
+        created = track_link.to_dict()
+        publish(TRACK_LINK, 'created', [created])
+        count_changes(TRACK_LINK, added=[created])
+        defer_normalization([track_link.id])
         db.session.commit()
+        invalidate('tracks', 'track_links', track_tag(track_link.track_id))
         return jsonify(track_link.to_dict()), 201
     except IntegrityError:
         db.session.rollback()
@@ -67,40 +101,81 @@ def delete_track_link(id):
     try:
         data = track_link.to_dict()  # Capture data before deletion
         db.session.delete(track_link)
+        publish(TRACK_LINK, 'deleted', [data])
+        count_changes(TRACK_LINK, removed=[data])
         db.session.commit()
+        invalidate('tracks', 'track_links', track_tag(data['track_id']))
         return jsonify({'message': 'Track link deleted', 'data': data}), 200
     except Exception as e:
         db.session.rollback()
         abort(500, description=f"Server error: {str(e)}")
 
 
+def _abort_unless_link(id):
+    # Only used on error paths: a missing link still wins over a bad request body
+    if db.session.scalar(db.select(Track_Link.id).where(Track_Link.id == id)) is None:
+        abort(404)
+
 @track_links_bp.route('/track_links/<int:id>', methods=['PUT', 'PATCH'])
 def update_track_link(id):
     """Update a track link by ID."""
-    track_link = Track_Link.query.get_or_404(id)
-    data = request.get_json()
+    try:
+        data = request.get_json()
+    except HTTPException:
+        _abort_unless_link(id)
+        raise
     if not data:
+        _abort_unless_link(id)
         abort(400, description="No JSON data provided")
     
-    if 'link_type' in data:
-        if not isinstance(data['link_type'], str) or not data['link_type'].strip():
-            abort(400, description="link_type must be a non-empty string")
-        track_link.link_type = data['link_type']
-    if 'link_url' in data:
-        if not isinstance(data['link_url'], str) or not data['link_url'].strip():
-            abort(400, description="link_url must be a non-empty string")
-        track_link.link_url = data['link_url']
-    if 'track_id' in data:
-        if data['track_id'] is not None:
-            Track.query.get_or_404(data['track_id'], description="Track with this ID not found")
-        
-        if not isinstance(data['track_id'], (int, type(None))):
-            abort(400, description="track_id must be an integer or null")
-        track_link.track_id = data['track_id']
-    
+    error = validate_link({k: data[k] for k in ('link_type', 'link_url') if k in data}, partial=True)
+    if not error and 'track_id' in data and not isinstance(data['track_id'], (int, type(None))):
+        error = "track_id must be an integer or null"
+    if error:
+        _abort_unless_link(id)
+        abort(400, description=error)
+
+    values = {field: data[field] for field in ('link_type', 'link_url', 'track_id') if field in data}
     try:
+        if not values:
+            # Nothing to change; the link is returned as is
+            row = db.session.execute(db.select(*LINK_COLUMNS).where(Track_Link.id == id)).first()
+            if row is None:
+                abort(404)
+            return jsonify(serialize_link_row(row)), 200
+
+        # One statement: the row is only updated (and returned) if the link and the new track exist
+        statement = update(Track_Link).where(Track_Link.id == id)
+        if values.get('track_id') is not None:
+            statement = statement.where(db.exists().where(Track.id == values['track_id']))
+        values['updated_at'] = datetime.now(timezone.utc)
+        statement = statement.values(**values)
+        previous_type = None
+        if 'link_type' in values:
+            # The stats counters need the type being replaced
+            row, previous_type = update_returning_previous(
+                statement, LINK_COLUMNS, Track_Link.link_type, Track_Link.id == id
+            )
+        else:
+            row = db.session.execute(statement.returning(*LINK_COLUMNS)).first()
+        if row is None:
+            db.session.rollback()
+            _abort_unless_link(id)
+            abort(404, description="Track with this ID not found")
+        link = serialize_link_row(row)
+        publish(TRACK_LINK, 'updated', [link])
+        if previous_type is not None:
+            count_changes(TRACK_LINK, added=[link], removed=[{**link, 'link_type': previous_type}])
+        if 'link_url' in values:
+            defer_normalization([id])
+        mark_changed(db.session, {'track_links'})
+        mark_write()
         db.session.commit()
-        return jsonify(track_link.to_dict()), 200
+        # A moved link's previous track is not known here
+        invalidate('tracks', 'track_links', ALL_TRACKS if 'track_id' in data else track_tag(row.track_id))
+        return jsonify(serialize_link_row(row)), 200
+    except HTTPException:
+        raise
     except IntegrityError: # This now serves as a fallback, not primary validation
         db.session.rollback()
         abort(400, description="Duplicate entry detected")
@@ -109,8 +184,12 @@ def update_track_link(id):
         abort(500, description=f"Server error: {str(e)}")
 
 @track_links_bp.route('/track_links/search', methods=['GET'])
+@rate_limit('search')
+@conditional_get
+@cached_response(lambda: {'track_links'})
 def search_track_links_route():
     """Search track links by link_type or link_url.
+    Uses the full-text index (ranked, prefix-matched) when one is present.
     Query Param: q (string, max length 100)
     Returns: Paginated list of matching track links
     """
@@ -118,8 +197,159 @@ def search_track_links_route():
     if len(query_str) > 100:
         abort(400, description="Query too long")
     
-    query = Track_Link.query.filter(
-        (Track_Link.link_type.ilike(f'%{query_str}%')) |
-        (Track_Link.link_url.ilike(f'%{query_str}%'))
+    query = search_track_links(link_rows_query(), query_str)
+    return jsonify(paginate_query(query, serialize=serialize_links)), 200
+
+def _insert_links(rows):
+    created = db.session.execute(
+        insert(Track_Link).returning(*LINK_COLUMNS, sort_by_parameter_order=True), rows
+    ).all()
+    created_items = serialize_links(created)
+    publish(TRACK_LINK, 'created', created_items)
+    count_changes(TRACK_LINK, added=created_items)
+    defer_normalization([row.id for row in created])
+    mark_changed(db.session, {'track_links'})
+    return [row.id for row in created]
+
+def _update_links(rows):
+    ids = [row['id'] for row in rows]
+    # Only a new link_type moves a link between stats counters
+    retyped = {row['id'] for row in rows if 'link_type' in row}
+    previous = []
+    if retyped:
+        previous = db.session.execute(
+            db.select(*LINK_COLUMNS).where(Track_Link.id.in_(retyped)).with_for_update()
+        ).all()
+    db.session.execute(update(Track_Link), rows)
+    updated = db.session.execute(db.select(*LINK_COLUMNS).where(Track_Link.id.in_(ids))).all()
+    updated_items = serialize_links(updated)
+    publish(TRACK_LINK, 'updated', updated_items)
+    count_changes(
+        TRACK_LINK,
+        added=[item for item in updated_items if item['id'] in retyped],
+        removed=serialize_links(previous),
     )
-    return jsonify(paginate_query(query)), 200
\ No newline at end of file
+    defer_normalization([row['id'] for row in rows if 'link_url' in row])
+    mark_changed(db.session, {'track_links'})
+    return ids
+
+def _delete_links(ids):
+    deleted = db.session.execute(delete(Track_Link).where(Track_Link.id.in_(ids)).returning(*LINK_COLUMNS)).all()
+    deleted_items = serialize_links(deleted)
+    publish(TRACK_LINK, 'deleted', deleted_items)
+    count_changes(TRACK_LINK, removed=deleted_items)
+    mark_changed(db.session, {'track_links'})
+    return ids
+
+def _existing_ids(model, ids):
+    ids = [id for id in ids if id is not None]
+    if not ids:
+        return set()
+    return set(db.session.scalars(db.select(model.id).where(model.id.in_(ids))))
+
+@track_links_bp.route('/track_links/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_track_links():
+    """Create many track links in chunked transactions.
+    Request Body: [{ "link_type": str, "link_url": str, "track_id": int }, ...]
+    Returns: Per-item results (200); created items have status 201 and their id
+    """
+    items = get_bulk_items()
+    user_id = get_jwt_identity()
+    result = BulkResult(len(items))
+
+    valid = []
+    for index, data in enumerate(items):
+        error = validate_link(data) if isinstance(data, dict) and data else "No JSON data provided"
+        if error:
+            result.error(index, 400, error)
+        else:
+            valid.append((index, data))
+
+    tracks = _existing_ids(Track, [data.get('track_id') for _, data in valid])
+    pending = []
+    for index, data in valid:
+        if data.get('track_id') is not None and data['track_id'] not in tracks:
+            result.error(index, 404, "Track with this ID not found")
+            continue
+        pending.append((index, {
+            'link_type': data['link_type'],
+            'link_url': data['link_url'],
+            'track_id': data.get('track_id'),
+            'user_id': user_id if user_id is not None else data.get('user_id'),
+        }))
+
+    write_in_chunks(pending, _insert_links, result, 201, "Invalid track_id or duplicate entry")
+    invalidate('tracks', 'track_links', *(track_tag(row['track_id']) for _, row in pending))
+    return jsonify(result.to_dict()), 200
+
+@track_links_bp.route('/track_links/bulk', methods=['PUT', 'PATCH'])
+@jwt_required()
+def bulk_update_track_links():
+    """Update many track links in chunked transactions.
+    Request Body: [{ "id": int, "link_type": str (optional), "link_url": str (optional), "track_id": int (optional) }, ...]
+    Returns: Per-item results (200)
+    """
+    items = get_bulk_items()
+    result = BulkResult(len(items))
+
+    valid = []
+    for index, data in enumerate(items):
+        if not isinstance(data, dict) or not data:
+            result.error(index, 400, "No JSON data provided")
+        elif not isinstance(data.get('id'), int):
+            result.error(index, 400, "id must be an integer")
+        else:
+            error = validate_link(data, partial=True)
+            if error:
+                result.error(index, 400, error)
+            else:
+                valid.append((index, data))
+
+    links = _existing_ids(Track_Link, [data['id'] for _, data in valid])
+    tracks = _existing_ids(Track, [data.get('track_id') for _, data in valid])
+    pending = []
+    for index, data in valid:
+        if data['id'] not in links:
+            result.error(index, 404, "Track link not found")
+        elif data.get('track_id') is not None and data['track_id'] not in tracks:
+            result.error(index, 404, "Track with this ID not found")
+        else:
+            row = {field: data[field] for field in ('link_type', 'link_url', 'track_id') if field in data}
+            row['id'] = data['id']
+            row['updated_at'] = datetime.now(timezone.utc)
+            pending.append((index, row))
+
+    write_in_chunks(pending, _update_links, result, 200, "Duplicate entry detected")
+    # The links' previous tracks are not known here
+    invalidate('tracks', 'track_links', ALL_TRACKS)
+    return jsonify(result.to_dict()), 200
+
+@track_links_bp.route('/track_links/bulk', methods=['DELETE'])
+@jwt_required()
+def bulk_delete_track_links():
+    """Delete many track links in chunked transactions.
+    Request Body: [int, ...] track link IDs
+    Returns: Per-item results (200)
+    """
+    items = get_bulk_items()
+    result = BulkResult(len(items))
+
+    valid = []
+    for index, id in enumerate(items):
+        if not isinstance(id, int):
+            result.error(index, 400, "id must be an integer")
+        else:
+            valid.append((index, id))
+
+    existing = _existing_ids(Track_Link, [id for _, id in valid])
+    pending = []
+    for index, id in valid:
+        if id not in existing:
+            result.error(index, 404, "Track link not found")
+        else:
+            pending.append((index, id))
+
+    write_in_chunks(pending, _delete_links, result, 200, "Track link could not be deleted")
+    invalidate('tracks', 'track_links', ALL_TRACKS)
+    return jsonify(result.to_dict()), 200
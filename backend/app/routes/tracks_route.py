@@ -1,11 +1,50 @@
 from flask import Blueprint, jsonify, request, abort
+from werkzeug.exceptions import HTTPException
+from sqlalchemy import delete, insert, literal, update
 from sqlalchemy.exc import IntegrityError
-from app.database import db
+from datetime import datetime, timezone
+from app.database import db, mark_write, use_replica_for_reads
 from app.models import Track, Track_Link
+from app.search import search_tracks as apply_track_search
+from app.versioning import conditional_get, mark_changed
+from app.response_cache import ALL_TRACKS, cached_response, invalidate, track_tag
+from app.changes import TRACK, TRACK_FIELDS, TRACK_LINK, publish
+from app.links import defer_normalization
+from app.ratelimit import rate_limit
+from app.stats import count_changes, update_returning_previous
+from app.utils.validation import validate_track, validate_link
+from app.utils.bulk import BulkResult, get_bulk_items, write_in_chunks
+from app.utils.serializers import (
+    LINK_COLUMNS, TRACK_COLUMNS, link_rows_query, parse_fields, serialize_link_row, serialize_links,
+    serialize_tracks, track_rows_query,
+)
+from sqlalchemy.orm import selectinload
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.pagination import paginate_query  # Import pagination utility
 
 tracks_bp = Blueprint('track_bp', __name__)
+tracks_bp.before_request(use_replica_for_reads)
+
+
+def _track_projection():
+    """Parse `?fields=` / `?include=links` into a field set (or None for all fields).
+
+    `fields` is a comma-separated list of Track fields; `include=links` adds the
+    links to a projection. Links are not part of the output (and `track_links`
+    is never queried) when a projection omits them.
+    """
+    try:
+        return parse_fields(request.args.get('fields', ''), request.args.get('include', ''))
+    except ValueError as e:
+        abort(400, description=str(e))
+
+
+def _track_query(fields):
+    """Base Track query that bulk-loads links with one IN query when they are serialized."""
+    query = Track.query
+    if fields is None or 'links' in fields:
+        query = query.options(selectinload(Track.links))
+    return query
 
 @tracks_bp.route('/health', methods=['GET'])
 def health():
@@ -13,16 +52,22 @@ def health():
     return jsonify({'status': 'healthy', 'message': 'Flask Racer X is running'}), 200
 
 @tracks_bp.route('/tracks', methods=['GET'])
+@conditional_get
+@cached_response(lambda: {'tracks'})
 def get_tracks():
     """Retrieve paginated list of all tracks."""
-    query = Track.query
-    return jsonify(paginate_query(query)), 200
+    fields = _track_projection()
+    query = track_rows_query()
+    return jsonify(paginate_query(query, serialize=lambda rows: serialize_tracks(rows, fields))), 200
 
 @tracks_bp.route('/tracks/<int:id>', methods=['GET'])
+@conditional_get
+@cached_response(lambda id: {track_tag(id), ALL_TRACKS})
 def get_track(id):
     """Retrieve a track by ID."""
-    track = Track.query.get_or_404(id)
-    return jsonify(track.to_dict()), 200
+    fields = _track_projection()
+    track = _track_query(fields).get_or_404(id)
+    return jsonify(track.to_dict(fields)), 200
 
 @tracks_bp.route('/tracks', methods=['POST'])
 @jwt_required()
@@ -35,16 +80,9 @@ def create_track():
     if not data:
         abort(400, description="No JSON data provided")
 
-    required_fields = ['title']
-    if not all(field in data for field in required_fields):
-        abort(400, description="Missing required field: title")
-
-    if not isinstance(data['title'], str) or not data['title'].strip():
-        abort(400, description="title must be a non-empty string")
-    if 'artist' in data and not isinstance(data['artist'], (str, type(None))):
-        abort(400, description="artist must be a string or null")
-    if 'genre' in data and not isinstance(data['genre'], (str, type(None))):
-        abort(400, description="genre must be a string or null")
+    error = validate_track(data)
+    if error:
+        abort(400, description=error)
 
     try:
         # If authenticated, associate the track with the requesting user
@@ -61,7 +99,13 @@ def create_track():
             user_id=user_id if user_id is not None else data.get('user_id', None)
         )
         db.session.add(track)
+        db.session.flush()
+        db.session.refresh(track)  # column values as the database stores them
+        created = track.to_dict(TRACK_FIELDS)
+        publish(TRACK, 'created', [created])
+        count_changes(TRACK, added=[created])
         db.session.commit()
+        invalidate('tracks')
         return jsonify(track.to_dict()), 201
     except IntegrityError:
         db.session.rollback()
@@ -77,7 +121,11 @@ def delete_track(id):
     try:
         data = track.to_dict()  # Capture data before deletion
         db.session.delete(track)
+        deleted = track.to_dict(TRACK_FIELDS)
+        publish(TRACK, 'deleted', [deleted])
+        count_changes(TRACK, removed=[deleted])
         db.session.commit()
+        invalidate('tracks', track_tag(id))
         return jsonify({'message': 'Track deleted', 'data': data}), 200
     except Exception as e:
         db.session.rollback()
@@ -94,21 +142,24 @@ def update_track(id):
     if not data:
         abort(400, description="No JSON data provided")
 
-    if 'title' in data:
-        if not isinstance(data['title'], str) or not data['title'].strip():
-            abort(400, description="title must be a non-empty string")
-        track.title = data['title']
-    if 'artist' in data:
-        if not isinstance(data['artist'], (str, type(None))):
-            abort(400, description="artist must be a string or null")
-        track.artist = data['artist']
-    if 'genre' in data:
-        if not isinstance(data['genre'], (str, type(None))):
-            abort(400, description="genre must be a string or null")
-        track.genre = data['genre']
+    error = validate_track(data, partial=True)
+    if error:
+        abort(400, description=error)
+
+    previous = track.to_dict(TRACK_FIELDS)
+    for field in ('title', 'artist', 'genre'):
+        if field in data:
+            setattr(track, field, data[field])
 
     try:
+        if db.session.is_modified(track):
+            db.session.flush()
+            db.session.refresh(track)
+            updated = track.to_dict(TRACK_FIELDS)
+            publish(TRACK, 'updated', [updated])
+            count_changes(TRACK, added=[updated], removed=[previous])
         db.session.commit()
+        invalidate('tracks', track_tag(id))
         return jsonify(track.to_dict()), 200
     except IntegrityError:
         db.session.rollback()
@@ -117,12 +168,62 @@ def update_track(id):
         db.session.rollback()
         abort(500, description=f"Server error: {str(e)}")
 
+def _abort_if_missing(track_id, link_id=None):
+    """404 if the track (or the link within it) does not exist.
+
+    The nested link routes find missing rows from their single write
+    statement; this is only called on error paths, where a missing track or
+    link must still win over a bad request body.
+    """
+    if link_id is None:
+        query = db.select(Track.id).where(Track.id == track_id)
+    else:
+        query = db.select(Track_Link.id).where(Track_Link.id == link_id, Track_Link.track_id == track_id)
+    if db.session.scalar(query) is None:
+        abort(404)
+
+def _link_payload(track_id, link_id=None, partial=False):
+    """Read and validate a nested link request body."""
+    try:
+        data = request.get_json()
+    except HTTPException:
+        _abort_if_missing(track_id, link_id)
+        raise
+    if not data:
+        _abort_if_missing(track_id, link_id)
+        abort(400, description="No JSON data provided")
+
+    error = validate_link({k: data[k] for k in ('link_type', 'link_url') if k in data}, partial=partial)
+    if error:
+        _abort_if_missing(track_id, link_id)
+        abort(400, description=error)
+    return data
+
+def _link_write_committed(track_id, op, row, previous_type=None):
+    """Publish, count and commit a nested link write; `previous_type` is the type an update replaced."""
+    link = serialize_link_row(row)
+    publish(TRACK_LINK, op, [link])
+    if op == 'created':
+        count_changes(TRACK_LINK, added=[link])
+    elif op == 'deleted':
+        count_changes(TRACK_LINK, removed=[link])
+    elif previous_type is not None:
+        count_changes(TRACK_LINK, added=[link], removed=[{**link, 'link_type': previous_type}])
+    mark_changed(db.session, {'track_links'})
+    mark_write()
+    db.session.commit()
+    invalidate('tracks', 'track_links', track_tag(track_id))
+
 @tracks_bp.route('/tracks/<int:track_id>/links', methods=['GET'])
+@conditional_get
+@cached_response(lambda track_id: {track_tag(track_id), ALL_TRACKS})
 def get_links_for_track(track_id):
     """Retrieve paginated list of links for a specific track."""
-    Track.query.get_or_404(track_id)  # Validate track exists
-    query = Track_Link.query.filter_by(track_id=track_id)
-    return jsonify(paginate_query(query)), 200
+    query = link_rows_query().filter(Track_Link.track_id == track_id)
+    page = paginate_query(query, serialize=serialize_links)
+    if not page['data']:
+        _abort_if_missing(track_id)  # only an empty page can mean the track does not exist
+    return jsonify(page), 200
 
 @tracks_bp.route('/tracks/<int:track_id>/links', methods=['POST'])
 @jwt_required()
@@ -131,19 +232,7 @@ def add_link_to_track(track_id):
     Request Body: { "link_type": str, "link_url": str }
     Returns: JSON of created track link (201)
     """
-    Track.query.get_or_404(track_id)  # Validate track exists
-    data = request.get_json()
-    if not data:
-        abort(400, description="No JSON data provided")
-
-    required_fields = ['link_type', 'link_url']
-    if not all(field in data for field in required_fields):
-        abort(400, description="Missing required fields: link_type, link_url")
-
-    if not isinstance(data['link_type'], str) or not data['link_type'].strip():
-        abort(400, description="link_type must be a non-empty string")
-    if not isinstance(data['link_url'], str) or not data['link_url'].strip():
-        abort(400, description="link_url must be a non-empty string")
+    data = _link_payload(track_id)
 
     try:
         # user_id from token if available
@@ -153,15 +242,27 @@ def add_link_to_track(track_id):
         except Exception:
             user_id = None
 
-        link = Track_Link(
-            link_type=data['link_type'],
-            link_url=data['link_url'],
-            track_id=track_id,
-            user_id=user_id if user_id is not None else data.get('user_id', None)
-        )
-        db.session.add(link)
-        db.session.commit()
-        return jsonify(link.to_dict()), 201
+        values = {
+            'link_type': data['link_type'],
+            'link_url': data['link_url'],
+            'track_id': track_id,
+            'user_id': user_id if user_id is not None else data.get('user_id', None),
+        }
+        # INSERT ... SELECT ... WHERE EXISTS: no row is inserted (or returned) if the track is missing
+        source = db.select(
+            *[literal(value, getattr(Track_Link, key).type) for key, value in values.items()]
+        ).where(db.exists().where(Track.id == track_id))
+        row = db.session.execute(
+            insert(Track_Link).from_select(list(values), source).returning(*LINK_COLUMNS)
+        ).first()
+        if row is None:
+            db.session.rollback()
+            abort(404)
+        defer_normalization([row.id])
+        _link_write_committed(track_id, 'created', row)
+        return jsonify(serialize_link_row(row)), 201
+    except HTTPException:
+        raise
     except IntegrityError:
         db.session.rollback()
         abort(400, description="Duplicate link or invalid track_id")
@@ -172,13 +273,19 @@ def add_link_to_track(track_id):
 @tracks_bp.route('/tracks/<int:track_id>/links/<int:link_id>', methods=['DELETE'])
 def delete_link_from_track(track_id, link_id):
     """Delete a track link by ID for a specific track."""
-    Track.query.get_or_404(track_id)  # Validate track exists
-    link = Track_Link.query.filter_by(id=link_id, track_id=track_id).first_or_404()
     try:
-        data = link.to_dict()  # Capture data before deletion
-        db.session.delete(link)
-        db.session.commit()
-        return jsonify({'message': 'Link deleted', 'data': data}), 200
+        row = db.session.execute(
+            delete(Track_Link)
+            .where(Track_Link.id == link_id, Track_Link.track_id == track_id)
+            .returning(*LINK_COLUMNS)
+        ).first()
+        if row is None:
+            db.session.rollback()
+            abort(404)
+        _link_write_committed(track_id, 'deleted', row)
+        return jsonify({'message': 'Link deleted', 'data': serialize_link_row(row)}), 200
+    except HTTPException:
+        raise
     except Exception as e:
         db.session.rollback()
         abort(500, description=f"Server error: {str(e)}")
@@ -189,24 +296,35 @@ def update_link_for_track(track_id, link_id):
     Request Body: { "link_type": str (optional), "link_url": str (optional) }
     Returns: JSON of updated track link (200)
     """
-    Track.query.get_or_404(track_id)  # Validate track exists
-    link = Track_Link.query.filter_by(id=link_id, track_id=track_id).first_or_404()
-    data = request.get_json()
-    if not data:
-        abort(400, description="No JSON data provided")
-
-    if 'link_type' in data:
-        if not isinstance(data['link_type'], str) or not data['link_type'].strip():
-            abort(400, description="link_type must be a non-empty string")
-        link.link_type = data['link_type']
-    if 'link_url' in data:
-        if not isinstance(data['link_url'], str) or not data['link_url'].strip():
-            abort(400, description="link_url must be a non-empty string")
-        link.link_url = data['link_url']
+    data = _link_payload(track_id, link_id, partial=True)
+    values = {field: data[field] for field in ('link_type', 'link_url') if field in data}
+    match = (Track_Link.id == link_id, Track_Link.track_id == track_id)
 
     try:
-        db.session.commit()
-        return jsonify(link.to_dict()), 200
+        if not values:
+            # Nothing to change; the link is returned as is
+            row = db.session.execute(db.select(*LINK_COLUMNS).where(*match)).first()
+            if row is None:
+                abort(404)
+            return jsonify(serialize_link_row(row)), 200
+
+        values['updated_at'] = datetime.now(timezone.utc)
+        statement = update(Track_Link).where(*match).values(**values)
+        previous_type = None
+        if 'link_type' in values:
+            # The stats counters need the type being replaced
+            row, previous_type = update_returning_previous(statement, LINK_COLUMNS, Track_Link.link_type, *match)
+        else:
+            row = db.session.execute(statement.returning(*LINK_COLUMNS)).first()
+        if row is None:
+            db.session.rollback()
+            abort(404)
+        if 'link_url' in values:
+            defer_normalization([link_id])
+        _link_write_committed(track_id, 'updated', row, previous_type)
+        return jsonify(serialize_link_row(row)), 200
+    except HTTPException:
+        raise
     except IntegrityError:
         db.session.rollback()
         abort(400, description="Duplicate link or invalid data")
@@ -215,11 +333,17 @@ def update_link_for_track(track_id, link_id):
         abort(500, description=f"Server error: {str(e)}")
 
 @tracks_bp.route('/tracks/search', methods=['GET'])
+@rate_limit('search')
+@conditional_get
+@cached_response(lambda: {'tracks'})
 def search_tracks():
     """Search tracks by title, artist, or genre.
-    Query Params: title (str, optional), artist (str, optional), genre (str, optional)
+    Uses the full-text index (ranked, prefix-matched) when one is present.
+    Query Params: title (str, optional), artist (str, optional), genre (str, optional),
+                  fields (str, optional), include (str, optional)
     Returns: Paginated list of matching tracks
     """
+    fields = _track_projection()
     title = request.args.get('title', '').strip()
     artist = request.args.get('artist', '').strip()
     genre = request.args.get('genre', '').strip()
@@ -227,12 +351,147 @@ def search_tracks():
     if len(title) > 100 or len(artist) > 100 or len(genre) > 100:
         abort(400, description="Query parameters cannot exceed 100 characters")
 
-    query = Track.query
-    if title:
-        query = query.filter(Track.title.ilike(f'%{title}%'))
-    if artist:
-        query = query.filter(Track.artist.ilike(f'%{artist}%'))
-    if genre:
-        query = query.filter(Track.genre.ilike(f'%{genre}%'))
-
-    return jsonify(paginate_query(query)), 200
\ No newline at end of file
+    query = apply_track_search(track_rows_query(), title=title, artist=artist, genre=genre)
+
+    return jsonify(paginate_query(query, serialize=lambda rows: serialize_tracks(rows, fields))), 200
+
+def _insert_tracks(rows):
+    created = db.session.execute(insert(Track).returning(*TRACK_COLUMNS, sort_by_parameter_order=True), rows).all()
+    created_items = serialize_tracks(created, TRACK_FIELDS)
+    publish(TRACK, 'created', created_items)
+    count_changes(TRACK, added=created_items)
+    mark_changed(db.session, {'tracks'})
+    return [row.id for row in created]
+
+def _update_tracks(rows):
+    ids = [row['id'] for row in rows]
+    # Only a new genre moves a track between stats counters
+    regenred = {row['id'] for row in rows if 'genre' in row}
+    previous = []
+    if regenred:
+        previous = db.session.execute(
+            db.select(*TRACK_COLUMNS).where(Track.id.in_(regenred)).with_for_update()
+        ).all()
+    db.session.execute(update(Track), rows)
+    updated = db.session.execute(db.select(*TRACK_COLUMNS).where(Track.id.in_(ids))).all()
+    updated_items = serialize_tracks(updated, TRACK_FIELDS)
+    publish(TRACK, 'updated', updated_items)
+    count_changes(
+        TRACK,
+        added=[item for item in updated_items if item['id'] in regenred],
+        removed=serialize_tracks(previous, TRACK_FIELDS),
+    )
+    mark_changed(db.session, {'tracks'})
+    return ids
+
+def _delete_tracks(ids):
+    deleted = db.session.execute(delete(Track).where(Track.id.in_(ids)).returning(*TRACK_COLUMNS)).all()
+    deleted_items = serialize_tracks(deleted, TRACK_FIELDS)
+    publish(TRACK, 'deleted', deleted_items)
+    count_changes(TRACK, removed=deleted_items)
+    mark_changed(db.session, {'tracks'})
+    return ids
+
+def _existing_track_ids(ids):
+    return set(db.session.scalars(db.select(Track.id).where(Track.id.in_(ids))))
+
+@tracks_bp.route('/tracks/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_tracks():
+    """Create many tracks in chunked transactions.
+    Request Body: [{ "title": str, "artist": str (optional), "genre": str (optional) }, ...]
+    Returns: Per-item results (200); created items have status 201 and their id
+    """
+    items = get_bulk_items()
+    user_id = get_jwt_identity()
+    result = BulkResult(len(items))
+
+    pending = []
+    for index, data in enumerate(items):
+        error = validate_track(data) if isinstance(data, dict) and data else "No JSON data provided"
+        if error:
+            result.error(index, 400, error)
+            continue
+        pending.append((index, {
+            'title': data['title'],
+            'artist': data.get('artist'),
+            'genre': data.get('genre'),
+            'user_id': user_id if user_id is not None else data.get('user_id'),
+        }))
+
+    write_in_chunks(pending, _insert_tracks, result, 201, "Duplicate track or invalid data")
+    invalidate('tracks')
+    return jsonify(result.to_dict()), 200
+
+@tracks_bp.route('/tracks/bulk', methods=['PUT', 'PATCH'])
+@jwt_required()
+def bulk_update_tracks():
+    """Update many tracks in chunked transactions.
+    Request Body: [{ "id": int, "title": str (optional), "artist": str (optional), "genre": str (optional) }, ...]
+    Returns: Per-item results (200)
+    """
+    items = get_bulk_items()
+    result = BulkResult(len(items))
+
+    valid = []
+    for index, data in enumerate(items):
+        if not isinstance(data, dict) or not data:
+            result.error(index, 400, "No JSON data provided")
+        elif not isinstance(data.get('id'), int):
+            result.error(index, 400, "id must be an integer")
+        else:
+            error = validate_track(data, partial=True)
+            if error:
+                result.error(index, 400, error)
+            else:
+                valid.append((index, data))
+
+    existing = _existing_track_ids([data['id'] for _, data in valid])
+    pending = []
+    for index, data in valid:
+        if data['id'] not in existing:
+            result.error(index, 404, "Track not found")
+            continue
+        row = {field: data[field] for field in ('title', 'artist', 'genre') if field in data}
+        row['id'] = data['id']
+        row['updated_at'] = datetime.now(timezone.utc)
+        pending.append((index, row))
+
+    write_in_chunks(pending, _update_tracks, result, 200, "Duplicate track or invalid data")
+    invalidate('tracks', *(track_tag(row['id']) for _, row in pending))
+    return jsonify(result.to_dict()), 200
+
+@tracks_bp.route('/tracks/bulk', methods=['DELETE'])
+@jwt_required()
+def bulk_delete_tracks():
+    """Delete many tracks in chunked transactions.
+    Request Body: [int, ...] track IDs
+    Returns: Per-item results (200); tracks that still have links are rejected (409)
+    """
+    items = get_bulk_items()
+    result = BulkResult(len(items))
+
+    valid = []
+    for index, id in enumerate(items):
+        if not isinstance(id, int):
+            result.error(index, 400, "id must be an integer")
+        else:
+            valid.append((index, id))
+
+    ids = [id for _, id in valid]
+    existing = _existing_track_ids(ids)
+    with_links = set(db.session.scalars(
+        db.select(Track_Link.track_id).where(Track_Link.track_id.in_(ids)).distinct()
+    ))
+    pending = []
+    for index, id in valid:
+        if id not in existing:
+            result.error(index, 404, "Track not found")
+        elif id in with_links:
+            result.error(index, 409, "Track has links; delete them first")
+        else:
+            pending.append((index, id))
+
+    write_in_chunks(pending, _delete_tracks, result, 200, "Track could not be deleted")
+    invalidate('tracks', *(track_tag(id) for _, id in pending))
+    return jsonify(result.to_dict()), 200
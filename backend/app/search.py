@@ -0,0 +1,246 @@
+"""Full-text search for tracks and track links.
+
+On SQLite the searchable columns are mirrored into FTS5 external-content
+tables (`tracks_fts`, `track_links_fts`) that triggers keep in sync with
+every insert/update/delete. On Postgres a GIN index over a weighted
+`tsvector` expression is used instead, which Postgres maintains itself.
+
+Both backends rank matches and treat every term as a prefix, so partial
+words typed into the search box match. When no index is present (or
+`SEARCH_FTS_ENABLED` is false) the search falls back to `ILIKE '%q%'`.
+"""
+import re
+import weakref
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import DDL, event, func, literal_column, or_, table, column, text
+
+from app.database import db
+from app.models import Track, Track_Link
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Searchable columns per table, in tsvector weight order (A, B, C).
+SEARCH_COLUMNS = {
+    'tracks': ('title', 'artist', 'genre'),
+    'track_links': ('link_type', 'link_url'),
+}
+
+_WEIGHTS = 'ABC'
+
+# engine -> {table name: bool}; reset whenever the index is (re)built
+_index_cache = weakref.WeakKeyDictionary()
+
+
+# --- SQLite FTS5 DDL ---------------------------------------------------------
+
+def _sqlite_ddl(tablename):
+    cols = SEARCH_COLUMNS[tablename]
+    fts = f'{tablename}_fts'
+    col_list = ', '.join(cols)
+    new_vals = ', '.join(f'new.{c}' for c in cols)
+    old_vals = ', '.join(f'old.{c}' for c in cols)
+    return [
+        f'DROP TABLE IF EXISTS {fts}',
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({col_list}, content='{tablename}', content_rowid='id')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN '
+        f'INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tablename} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); "
+        f'INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals}); END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+# --- Postgres tsvector DDL ---------------------------------------------------
+
+def _pg_column_expr(name):
+    # URLs are split on punctuation so their parts are searchable words, as in FTS5
+    if name == 'link_url':
+        return f"regexp_replace(coalesce({name}, ''), '[^[:alnum:]]+', ' ', 'g')"
+    return f"coalesce({name}, '')"
+
+
+def _pg_document(tablename):
+    return ' || '.join(
+        f"setweight(to_tsvector('simple', {_pg_column_expr(c)}), '{_WEIGHTS[i]}')"
+        for i, c in enumerate(SEARCH_COLUMNS[tablename])
+    )
+
+
+def _pg_ddl(tablename):
+    return [
+        f'CREATE INDEX IF NOT EXISTS ix_{tablename}_search ON {tablename} '
+        f'USING gin (({_pg_document(tablename)}))',
+    ]
+
+
+def index_ddl(dialect_name, tablename):
+    """Statements that (re)create and backfill the search index, or [] if unsupported."""
+    if dialect_name == 'sqlite':
+        return _sqlite_ddl(tablename)
+    if dialect_name == 'postgresql':
+        return _pg_ddl(tablename)
+    return []
+
+
+def drop_index_ddl(dialect_name, tablename):
+    """Statements that remove the search index for `tablename`."""
+    if dialect_name == 'sqlite':
+        return [f'DROP TRIGGER IF EXISTS {tablename}_fts_{suffix}' for suffix in ('ai', 'ad', 'au')] + [
+            f'DROP TABLE IF EXISTS {tablename}_fts',
+        ]
+    if dialect_name == 'postgresql':
+        return [f'DROP INDEX IF EXISTS ix_{tablename}_search']
+    return []
+
+
+def sqlite_insert_trigger(tablename):
+    """(name, CREATE statement) of the FTS5 trigger that indexes rows as they are inserted into `tablename`."""
+    name = f'{tablename}_fts_ai'
+    return name, next(s for s in _sqlite_ddl(tablename) if s.startswith(f'CREATE TRIGGER IF NOT EXISTS {name} '))
+
+
+def sqlite_index_range(tablename):
+    """Statement indexing the rows of `tablename` with ids in [:first, :last], for bulk loads that bypass the trigger."""
+    cols = ', '.join(SEARCH_COLUMNS[tablename])
+    return text(
+        f'INSERT INTO {tablename}_fts(rowid, {cols}) '
+        f'SELECT id, {cols} FROM {tablename} WHERE id BETWEEN :first AND :last'
+    )
+
+
+def is_search_object(name):
+    """True for FTS5 tables (and their shadow tables) and search indexes, which the ORM metadata does not model."""
+    return any(name.startswith(f'{t}_fts') or name == f'ix_{t}_search' for t in SEARCH_COLUMNS)
+
+
+def _register_ddl_events(model):
+    tablename = model.__tablename__
+    for statement in _sqlite_ddl(tablename):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    for statement in _pg_ddl(tablename):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    event.listen(
+        model.__table__, 'before_drop',
+        DDL(f'DROP TABLE IF EXISTS {tablename}_fts').execute_if(dialect='sqlite'),
+    )
+    event.listen(model.__table__, 'after_create', lambda target, connection, **kw: _index_cache.pop(connection.engine, None))
+
+
+_register_ddl_events(Track)
+_register_ddl_events(Track_Link)
+
+
+def build_index(tablename):
+    """(Re)create the search index for `tablename` and backfill it from existing rows."""
+    engine = db.engine
+    statements = index_ddl(engine.dialect.name, tablename)
+    if not statements:
+        raise click.ClickException(f"Full-text search is not supported on {engine.dialect.name}")
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    _index_cache.pop(engine, None)
+
+
+def has_index(tablename):
+    """Return True if a full-text index exists for `tablename` on the current engine."""
+    if not current_app.config.get('SEARCH_FTS_ENABLED', True):
+        return False
+    engine = db.engine
+    cache = _index_cache.setdefault(engine, {})
+    if tablename not in cache:
+        if engine.dialect.name == 'sqlite':
+            sql = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name")
+            params = {'name': f'{tablename}_fts'}
+        elif engine.dialect.name == 'postgresql':
+            sql = text('SELECT 1 FROM pg_indexes WHERE indexname = :name')
+            params = {'name': f'ix_{tablename}_search'}
+        else:
+            cache[tablename] = False
+            return False
+        with engine.connect() as conn:
+            cache[tablename] = conn.execute(sql, params).first() is not None
+    return cache[tablename]
+
+
+def tokenize(value):
+    """Split user input into lower-cased search terms."""
+    return [token.lower() for token in _TOKEN_RE.findall(value)]
+
+
+# --- Query building ----------------------------------------------------------
+
+def _fts5_expression(terms_by_column):
+    clauses = []
+    for col, terms in terms_by_column.items():
+        for term in terms:
+            phrase = '"' + term.replace('"', '""') + '"*'
+            clauses.append(f'{col} : {phrase}' if col else phrase)
+    return ' AND '.join(clauses)
+
+
+def _tsquery_expression(tablename, terms_by_column):
+    clauses = []
+    for col, terms in terms_by_column.items():
+        weight = _WEIGHTS[SEARCH_COLUMNS[tablename].index(col)] if col else ''
+        clauses.extend(f"'{term}':*{weight}" for term in terms)
+    return ' & '.join(clauses)
+
+
+def _apply_fulltext(query, model, terms_by_column):
+    tablename = model.__tablename__
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        fts = table(f'{tablename}_fts', column('rowid'), column('rank'))
+        return (
+            query.join(fts, fts.c.rowid == model.id)
+            .filter(literal_column(fts.name).op('MATCH')(_fts5_expression(terms_by_column)))
+            .order_by(fts.c.rank, model.id)
+        )
+    document = literal_column(f'({_pg_document(tablename)})')
+    tsquery = func.to_tsquery('simple', _tsquery_expression(tablename, terms_by_column))
+    return (
+        query.filter(document.op('@@')(tsquery))
+        .order_by(func.ts_rank(document, tsquery).desc(), model.id)
+    )
+
+
+def search_tracks(query, title='', artist='', genre=''):
+    """Filter a Track query by title/artist/genre, ranked when an index exists."""
+    filters = {'title': title, 'artist': artist, 'genre': genre}
+    terms = {col: tokenize(value) for col, value in filters.items() if value}
+    if has_index('tracks') and terms and all(terms.values()):
+        return _apply_fulltext(query, Track, terms)
+
+    for col, value in filters.items():
+        if value:
+            query = query.filter(getattr(Track, col).ilike(f'%{value}%'))
+    return query
+
+
+def search_track_links(query, q):
+    """Filter a Track_Link query by link_type/link_url, ranked when an index exists."""
+    terms = tokenize(q)
+    if has_index('track_links') and terms:
+        return _apply_fulltext(query, Track_Link, {None: terms})
+
+    return query.filter(
+        or_(Track_Link.link_type.ilike(f'%{q}%'), Track_Link.link_url.ilike(f'%{q}%'))
+    )
+
+
+search_cli = AppGroup('search', help='Manage the full-text search index.')
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Create or rebuild the tracks and track_links search indexes."""
+    for tablename in SEARCH_COLUMNS:
+        build_index(tablename)
+        click.echo(f"Rebuilt search index for {tablename}")
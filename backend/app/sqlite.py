@@ -0,0 +1,131 @@
+"""SQLite tuning for deployments that run on a SQLite file.
+
+Every new connection to a SQLite database (the primary, replicas and the
+ASGI engine) runs these PRAGMAs, in this order. An empty setting (other
+than the busy timeout) leaves SQLite's default.
+
+* `SQLITE_BUSY_TIMEOUT` (5000 ms): how long to wait for a lock before
+  failing with "database is locked";
+* `SQLITE_JOURNAL_MODE` (WAL): readers see the last commit and no longer
+  block the writer, or each other. The mode is stored in the file;
+* `SQLITE_SYNCHRONOUS` (NORMAL): in WAL mode, sync at checkpoints instead
+  of every commit. A power loss can lose the last commits, but the file
+  stays consistent;
+* `SQLITE_MMAP_SIZE` (256 MiB): read the file through a memory map;
+* `SQLITE_CACHE_SIZE` (-65536): the page cache of each connection, in KiB
+  when negative.
+
+SQLite has one writer at a time. A writer that finds the lock taken is
+put to sleep by SQLite's busy handler, for up to 100ms at a time. Under
+load, writes that arrive later can overtake it, and some run out the busy
+timeout. With `SQLITE_SERIALIZE_WRITES`, the writes of a process queue on
+a lock instead. A connection takes the lock before its transaction's
+first write and releases it at commit or rollback. Each process then has
+at most one writing connection, and the next one starts as soon as the
+lock is released. Processes still wait for each other through the busy
+timeout. ``python -m bench.sqlite_profile`` measures the difference.
+"""
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app.database import db
+
+PRAGMAS = (
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+)
+
+# Statements that need SQLite's write lock
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+# Connection.info key set while a connection holds the write lock
+_HOLDS_WRITE_LOCK = 'sqlite_write_lock'
+
+
+def pragma_statements(config) -> list:
+    """The PRAGMA statements a new connection runs, from the SQLITE_* settings."""
+    return [f'PRAGMA {pragma}={config[key]}' for pragma, key in PRAGMAS if config[key] not in (None, '')]
+
+
+def apply_pragmas(engine, statements):
+    """Run `statements` on every new DBAPI connection of `engine` (a sync engine or an async engine's `sync_engine`)."""
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+class WriteQueue:
+    """Lets one connection of an engine at a time write (see the module docstring)."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'count': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'commit', self._release_connection)
+        event.listen(engine, 'rollback', self._release_connection)
+        # A connection returned to the pool or invalidated mid-transaction
+        event.listen(engine.pool, 'reset', self._on_reset)
+        event.listen(engine.pool, 'invalidate', self._on_invalidate)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get(_HOLDS_WRITE_LOCK) or not statement.lstrip()[:7].upper().startswith(WRITE_PREFIXES):
+            return
+        started = time.perf_counter()
+        if not self._lock.acquire(timeout=self.timeout):
+            # What SQLite itself raises when the busy timeout runs out
+            raise OperationalError(statement, parameters, sqlite3.OperationalError('database is locked'))
+        conn.info[_HOLDS_WRITE_LOCK] = True
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats['count'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+
+    def _release(self, info):
+        if info.pop(_HOLDS_WRITE_LOCK, False):
+            self._lock.release()
+
+    def _release_connection(self, conn):
+        self._release(conn.info)
+
+    def _on_reset(self, dbapi_connection, connection_record, reset_state):
+        self._release(connection_record.info)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self._release(connection_record.info)
+
+    def metrics(self) -> dict:
+        """Write transactions admitted and the time spent waiting for the lock."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+def init_app(app):
+    """Apply the PRAGMAs, and the write queue if enabled, to every SQLite engine of `app`."""
+    statements = pragma_statements(app.config)
+    queues = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            apply_pragmas(engine, statements)
+            if app.config['SQLITE_SERIALIZE_WRITES']:
+                queues[key or 'primary'] = queue = WriteQueue(app.config['SQLITE_BUSY_TIMEOUT'] / 1000)
+                queue.install(engine)
+    app.extensions['sqlite_write_queues'] = queues
@@ -0,0 +1,196 @@
+"""Precomputed aggregate counters for the `/api/stats` endpoints.
+
+`stat_counters` holds one count per (dimension, key): tracks per user and
+per genre, links per type, and the ``totals`` of tracks and links. Write
+handlers call `count_changes` with the rows they add and remove, in the
+same transaction as the write, so a stats read is a lookup in this small
+table instead of a GROUP BY over `tracks` or `track_links`. An update
+passes the row both before (removed) and after (added), and only the keys
+whose counts really change are touched.
+
+``flask stats rebuild`` (or the ``stats.rebuild`` job) recomputes every
+counter from the base tables, for example after rows were changed outside
+the API.
+"""
+from collections import Counter
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import String, cast, func, insert, literal, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from app.changes import TRACK, TRACK_LINK
+from app.database import db
+from app.jobs import after_commit, task
+from app.models import StatCounter, Track, Track_Link
+from app.response_cache import invalidate
+from app.versioning import mark_changed
+
+# dimension -> (entity, field)
+DIMENSIONS = {
+    'tracks_by_user': (TRACK, 'user_id'),
+    'tracks_by_genre': (TRACK, 'genre'),
+    'links_by_type': (TRACK_LINK, 'link_type'),
+}
+
+# Row counts of each entity, under these keys
+TOTALS = 'totals'
+TOTAL_KEYS = {TRACK: 'tracks', TRACK_LINK: 'track_links'}
+
+MODELS = {TRACK: Track, TRACK_LINK: Track_Link}
+
+
+def _key(value) -> str:
+    # A missing genre is serialized as '' by the API, so it is counted under ''
+    return '' if value is None else str(value)
+
+
+def count_changes(entity: str, added=(), removed=()):
+    """
+    Updates the counters of `entity` in the current transaction; call before committing.
+
+    Args:
+        entity (str): `TRACK` or `TRACK_LINK`.
+        added (Iterable[dict]): Rows created, or the new state of updated rows.
+        removed (Iterable[dict]): Rows deleted, or the old state of updated rows.
+    """
+    deltas = Counter()
+    for sign, rows in ((1, added), (-1, removed)):
+        for row in rows:
+            deltas[(TOTALS, TOTAL_KEYS[entity])] += sign
+            for dimension, (dim_entity, field) in DIMENSIONS.items():
+                if dim_entity == entity:
+                    deltas[(dimension, _key(row[field]))] += sign
+    changed = {key: delta for key, delta in deltas.items() if delta}
+    if changed:
+        _apply(db.session.connection(), changed)
+
+
+def update_returning_previous(statement, columns, column, *where):
+    """
+    Runs an UPDATE and returns the updated row with `column`'s value from before it.
+
+    Counting an update needs the value it replaces. On Postgres that value
+    is read, and the row locked, in a CTE of the UPDATE itself. SQLite's
+    RETURNING only sees the new row, so there it is read by a SELECT first,
+    in the same transaction; SQLite runs in-process, so that costs no round
+    trip to a server.
+
+    Args:
+        statement (Update): The UPDATE with its values and conditions, without RETURNING.
+        columns (Iterable): Columns to return.
+        column (Column): The column whose previous value is needed.
+        *where: Conditions selecting the row being updated.
+
+    Returns:
+        tuple: The updated row (None if no row matched) and the previous value.
+    """
+    table = column.table
+    if db.engine.dialect.name == 'postgresql':
+        previous = select(table.c.id, column.label('previous')).where(*where).with_for_update().cte('previous')
+        row = db.session.execute(
+            statement.where(table.c.id == previous.c.id).returning(*columns, previous.c.previous)
+        ).first()
+        return row, row.previous if row is not None else None
+    previous = db.session.execute(select(table.c.id, column).where(*where)).first()
+    if previous is None:
+        return None, None
+    return db.session.execute(statement.returning(*columns)).first(), previous[1]
+
+
+def _apply(connection, deltas):
+    table = StatCounter.__table__
+    # Sorted, so concurrent writers lock counter rows in the same order
+    for (dimension, key), delta in sorted(deltas.items()):
+        increment = (
+            update(table)
+            .where(table.c.dimension == dimension, table.c.key == key)
+            .values(count=table.c.count + delta)
+        )
+        if connection.execute(increment).rowcount == 0:
+            # First row with this key; another writer may create it concurrently
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(table).values(dimension=dimension, key=key, count=delta))
+            except IntegrityError:
+                connection.execute(increment)
+
+
+def get_totals() -> dict:
+    """Return ({'tracks': int, 'track_links': int})."""
+    rows = db.session.execute(
+        select(StatCounter.key, StatCounter.count).where(StatCounter.dimension == TOTALS)
+    ).all()
+    totals = {key: 0 for key in TOTAL_KEYS.values()}
+    totals.update({key: count for key, count in rows})
+    return totals
+
+
+def get_dimension(dimension: str, limit: int) -> list:
+    """
+    Returns the non-zero counters of one dimension, largest first.
+
+    Args:
+        dimension (str): A key of `DIMENSIONS`.
+        limit (int): Maximum number of keys.
+
+    Returns:
+        list: ``{'key': str, 'count': int}`` dicts.
+    """
+    rows = db.session.execute(
+        select(StatCounter.key, StatCounter.count)
+        .where(StatCounter.dimension == dimension, StatCounter.count > 0)
+        .order_by(StatCounter.count.desc(), StatCounter.key)
+        .limit(limit)
+    ).all()
+    return [{'key': key, 'count': count} for key, count in rows]
+
+
+def rebuild_statements() -> list:
+    """Statements that recompute every counter from the base tables."""
+    table = StatCounter.__table__
+    columns = ['dimension', 'key', 'count']
+    statements = [table.delete()]
+    for dimension, (entity, field) in DIMENSIONS.items():
+        key = func.coalesce(cast(getattr(MODELS[entity], field), String), '')
+        statements.append(table.insert().from_select(
+            columns, select(literal(dimension), key, func.count()).group_by(key)
+        ))
+    for entity, key in TOTAL_KEYS.items():
+        statements.append(table.insert().from_select(
+            columns, select(literal(TOTALS), literal(key), func.count()).select_from(MODELS[entity])
+        ))
+    return statements
+
+
+def rebuild(connection):
+    """Recompute every counter on `connection`, inside its transaction."""
+    if connection.dialect.name == 'postgresql':
+        # Writers wait until the new counters are committed, so none of their changes are lost
+        connection.execute(text('LOCK TABLE tracks, track_links IN SHARE MODE'))
+    for statement in rebuild_statements():
+        connection.execute(statement)
+
+
+def _rebuild():
+    # The stats endpoints are cached under the tracks and track_links tags and versions
+    rebuild(db.session.connection())
+    mark_changed(db.session, {'tracks', 'track_links'})
+
+
+@task('stats.rebuild')
+def rebuild_task():
+    _rebuild()
+    after_commit(lambda: invalidate('tracks', 'track_links'))
+
+
+stats_cli = AppGroup('stats', help='Manage the precomputed stats counters.')
+
+
+@stats_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the stats counters from the tracks and track_links tables."""
+    _rebuild()
+    db.session.commit()
+    invalidate('tracks', 'track_links')
+    click.echo("Rebuilt stats counters")
@@ -0,0 +1,120 @@
+from flask import request, abort, current_app
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+from app.database import db, mark_write
+
+
+def get_bulk_items() -> list:
+    """
+    Reads the JSON array body of a bulk request.
+
+    Aborts with 400 if the body is not a non-empty array or exceeds BULK_MAX_ITEMS.
+
+    Returns:
+        list: The request items, in order.
+    """
+    items = request.get_json()
+    if not isinstance(items, list) or not items:
+        abort(400, description="Request body must be a non-empty JSON array")
+    max_items = current_app.config['BULK_MAX_ITEMS']
+    if len(items) > max_items:
+        abort(400, description=f"Bulk requests cannot exceed {max_items} items")
+    return items
+
+
+def get_batch_track_ids() -> list:
+    """
+    Reads the track IDs of a batch lookup.
+
+    GET requests pass them as ``?track_ids=1,2,3``; POST requests as a JSON
+    body ``{"track_ids": [1, 2, 3]}``. Duplicates are dropped. Aborts with 400
+    if an ID is not an integer, none are given, or there are more than
+    BATCH_MAX_TRACK_IDS.
+
+    Returns:
+        list: Unique track IDs, in request order.
+    """
+    if request.method == 'GET':
+        raw = [part.strip() for part in request.args.get('track_ids', '').split(',') if part.strip()]
+        try:
+            ids = [int(part) for part in raw]
+        except ValueError:
+            abort(400, description="track_ids must be a comma-separated list of integers")
+    else:
+        data = request.get_json(silent=True)
+        ids = data.get('track_ids') if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            abort(400, description="track_ids must be a list of integers")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        abort(400, description="track_ids is required")
+    max_ids = current_app.config['BATCH_MAX_TRACK_IDS']
+    if len(ids) > max_ids:
+        abort(400, description=f"Cannot look up more than {max_ids} track_ids at once")
+    return ids
+
+
+def group_by_track_id(track_ids: list, links: dict) -> dict:
+    """Batch lookup response: every requested track ID (as a string key) with its links."""
+    return {'data': {str(id): links.get(id, []) for id in track_ids}}
+
+
+class BulkResult:
+    """Collects per-item outcomes of a bulk request, keyed by request index."""
+
+    def __init__(self, size: int):
+        self.results = [None] * size
+
+    def ok(self, index: int, status: int, **data):
+        self.results[index] = {'index': index, 'status': status, **data}
+
+    def error(self, index: int, status: int, message: str):
+        self.results[index] = {'index': index, 'status': status, 'error': message}
+
+    def to_dict(self) -> dict:
+        failed = sum(1 for r in self.results if 'error' in r)
+        return {
+            'results': self.results,
+            'succeeded': len(self.results) - failed,
+            'failed': failed,
+        }
+
+
+def write_in_chunks(pending: list, write_chunk, result: BulkResult, status: int, error_message: str):
+    """
+    Writes validated rows in chunked transactions.
+
+    Each chunk of BULK_CHUNK_SIZE rows is written with a single executemany
+    statement and committed. If a chunk hits a database error it is rolled
+    back and retried one row per transaction, so only the offending rows fail:
+    constraint and data errors with a 400, anything else with a 500.
+
+    Args:
+        pending (list): (index, row) pairs that passed validation.
+        write_chunk (callable): Writes a list of rows and returns one id per row.
+        result (BulkResult): Receives `status` with the row id, or a 400 with `error_message`.
+    """
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    mark_write()
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            ids = write_chunk([row for _, row in chunk])
+            db.session.commit()
+        except DBAPIError:
+            db.session.rollback()
+        else:
+            for (index, _), id in zip(chunk, ids):
+                result.ok(index, status, id=id)
+            continue
+
+        for index, row in chunk:
+            try:
+                ids = write_chunk([row])
+                db.session.commit()
+                result.ok(index, status, id=ids[0])
+            except (IntegrityError, DataError):
+                db.session.rollback()
+                result.error(index, 400, error_message)
+            except DBAPIError as e:
+                db.session.rollback()
+                result.error(index, 500, f"Database error: {type(e.orig).__name__}")
@@ -1,27 +1,139 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
 from flask import request, abort
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Query
+from app.counts import count_query
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Encode a (created_at, id) position as an opaque URL-safe cursor."""
+    raw = json.dumps([created_at.isoformat(), id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by `encode_cursor`.
+
+    Aborts with 400 if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        abort(400, description="Invalid cursor")
+
+
+def _to_dicts(items: list) -> list:
+    return [item.to_dict() for item in items]
+
+
+def _model_for(query: Query):
+    return query.column_descriptions[0]['entity']
 
-def paginate_query(query: Query, max_per_page: int = 100) -> dict:
+
+def paginate_query(query: Query, max_per_page: int = 100, serialize=None) -> dict:
     """
     Paginates a SQLAlchemy query and returns a standardized response.
 
+    Two modes are supported:
+
+    * Offset mode (default): ``?page=`` and ``?per_page=``. Returns
+      ``data``, ``page``, ``total``, ``total_exact`` and ``pages``.
+    * Cursor mode: enabled by passing ``?after=`` (empty for the first page).
+      Rows are ordered on ``(created_at, id)`` (replacing any ordering on
+      the query) and fetched with a keyset seek
+      instead of ``OFFSET``. Returns ``data`` and ``next_cursor`` (``None`` on
+      the last page); ``total`` and ``total_exact`` are only computed when
+      ``?with_total=1``.
+
+    Totals come from `app.counts.count_query`: cached until the next write,
+    and a planner estimate (``total_exact`` false) for very large
+    unfiltered Postgres tables when that is enabled.
+
     Args:
         query (Query): SQLAlchemy query to paginate.
         max_per_page (int): Maximum items per page (default: 100).
+        serialize (callable): Turns the page's items into a list of dicts
+            (default: `item.to_dict()` for each item).
 
     Returns:
         dict: Dictionary containing paginated data and metadata.
     """
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = get_per_page(max_per_page)
 
-    if per_page > max_per_page:
-        abort(400, description=f"per_page cannot exceed {max_per_page}")
+    if serialize is None:
+        serialize = _to_dicts
+
+    if 'after' in request.args:
+        return _paginate_cursor(query, per_page, serialize)
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    page = request.args.get('page', 1, type=int)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total, exact = count_query(query)
     return {
-        'data': [item.to_dict() for item in pagination.items],
+        'data': serialize(pagination.items),
         'page': pagination.page,
         'total': pagination.total,
+        'total_exact': exact,
         'pages': pagination.pages
-    }
\ No newline at end of file
+    }
+
+
+def get_per_page(max_per_page: int = 100) -> int:
+    """Read ``?per_page=`` (default 10), aborting with 400 above `max_per_page`."""
+    per_page = request.args.get('per_page', 10, type=int)
+    if per_page > max_per_page:
+        abort(400, description=f"per_page cannot exceed {max_per_page}")
+    return per_page
+
+
+def wants_total() -> bool:
+    """True if a cursor-mode request asked for ``?with_total=1``."""
+    return request.args.get('with_total', '0') in ('1', 'true', 'True')
+
+
+def cursor_seek(query, per_page: int):
+    """
+    Restricts a query or select to the cursor page after ``?after=``.
+
+    Args:
+        query (Query | Select): Rows of one model with ``created_at`` and ``id``.
+        per_page (int): Page size; one extra row is fetched to detect a next page.
+
+    Returns:
+        Query | Select: The seek, ordered on ``(created_at, id)``.
+    """
+    if per_page < 1:
+        abort(400, description="per_page must be at least 1")
+
+    model = _model_for(query)
+    after = request.args.get('after', '')
+    if after:
+        created_at, last_id = decode_cursor(after)
+        query = query.filter(tuple_(model.created_at, model.id) > tuple_(created_at, last_id))
+    return query.order_by(None).order_by(model.created_at, model.id).limit(per_page + 1)
+
+
+def cursor_page(items: list, per_page: int) -> tuple:
+    """Split `cursor_seek` results into (page items, next cursor or None)."""
+    if len(items) <= per_page:
+        return items, None
+    items = items[:per_page]
+    return items, encode_cursor(items[-1].created_at, items[-1].id)
+
+
+def _paginate_cursor(query: Query, per_page: int, serialize) -> dict:
+    seek = cursor_seek(query, per_page)
+
+    result = {}
+    if wants_total():
+        result['total'], result['total_exact'] = count_query(query)
+
+    items, result['next_cursor'] = cursor_page(seek.all(), per_page)
+    result['data'] = serialize(items)
+    return result
@@ -0,0 +1,177 @@
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+
+from sqlalchemy import select
+from app.database import db
+from app.models import Track, Track_Link
+
+
+def _or_empty(value):
+    return value or ''
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+# (key, format) pairs in column order. Each format turns one column value
+# into exactly what the model's `to_dict()` outputs; None passes it as is.
+TRACK_SPEC = (
+    ('id', None),
+    ('title', None),
+    ('artist', _or_empty),
+    ('genre', _or_empty),
+    ('created_at', _isoformat),
+    ('updated_at', _isoformat),
+    ('user_id', None),
+)
+LINK_SPEC = (
+    ('id', None),
+    ('link_type', None),
+    ('link_url', None),
+    ('created_at', _isoformat),
+    ('updated_at', _isoformat),
+    ('track_id', None),
+    ('user_id', None),
+)
+
+TRACK_COLUMNS = tuple(getattr(Track, key) for key, _ in TRACK_SPEC)
+LINK_COLUMNS = tuple(getattr(Track_Link, key) for key, _ in LINK_SPEC)
+
+
+def compile_serializer(spec: tuple, keys=None):
+    """
+    Builds a function turning one row (a tuple in `spec` column order) into a dict.
+
+    The (key, getter) pairs are resolved once, so serializing a row is a
+    single dict comprehension with no key filtering or attribute lookups.
+
+    Args:
+        spec (tuple): (key, format) pairs, one per column.
+        keys (Iterable[str]): Keys to output (default: all of them).
+
+    Returns:
+        callable: `row -> dict`.
+    """
+    pairs = tuple(
+        (key, itemgetter(index) if fmt is None else lambda row, index=index, fmt=fmt: fmt(row[index]))
+        for index, (key, fmt) in enumerate(spec)
+        if keys is None or key in keys
+    )
+    return lambda row: {key: getter(row) for key, getter in pairs}
+
+
+serialize_link_row = compile_serializer(LINK_SPEC)
+
+
+@lru_cache(maxsize=64)
+def _track_serializer(fields):
+    return compile_serializer(TRACK_SPEC, fields)
+
+
+def track_rows_query():
+    """Track query returning `TRACK_COLUMNS` rows instead of ORM instances."""
+    return db.session.query(*TRACK_COLUMNS)
+
+
+def link_rows_query():
+    """Track_Link query returning `LINK_COLUMNS` rows instead of ORM instances."""
+    return db.session.query(*LINK_COLUMNS)
+
+
+def parse_fields(fields_arg: str, include_arg: str = ''):
+    """
+    Parses `?fields=` / `?include=links` into a Track field set.
+
+    Args:
+        fields_arg (str): Comma-separated Track fields; empty for all fields.
+        include_arg (str): Comma-separated extras; `links` adds the links to a projection.
+
+    Returns:
+        set | None: The requested fields, or None for all of them.
+
+    Raises:
+        ValueError: If a field is not in `Track.FIELDS`.
+    """
+    fields_arg = fields_arg.strip()
+    if not fields_arg:
+        return None
+    fields = {f.strip() for f in fields_arg.split(',') if f.strip()}
+    if 'links' in {i.strip() for i in include_arg.split(',')}:
+        fields.add('links')
+    unknown = fields - set(Track.FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def links_statement(track_ids: list):
+    """Select `LINK_COLUMNS` for many tracks, grouped by track and ordered by id."""
+    return (
+        select(*LINK_COLUMNS)
+        .where(Track_Link.track_id.in_(track_ids))
+        .order_by(Track_Link.track_id, Track_Link.id)
+    )
+
+
+def group_links(rows) -> dict:
+    """Serialize `links_statement()` rows into lists keyed by track ID."""
+    return {
+        track_id: [serialize_link_row(row) for row in group]
+        for track_id, group in groupby(rows, key=lambda row: row.track_id)
+    }
+
+
+def links_by_track(track_ids: list) -> dict:
+    """
+    Loads the links of many tracks with one IN query.
+
+    Args:
+        track_ids (list): Track IDs.
+
+    Returns:
+        dict: Serialized links (ordered by id) keyed by track ID.
+    """
+    if not track_ids:
+        return {}
+    return group_links(db.session.execute(links_statement(track_ids)))
+
+
+def wants_links(fields) -> bool:
+    return fields is None or 'links' in fields
+
+
+def serialize_tracks(rows: list, fields=None, links=None) -> list:
+    """
+    Serializes `track_rows_query()` rows into the same dicts as `Track.to_dict(fields)`.
+
+    Args:
+        rows (list): Rows with `TRACK_COLUMNS`.
+        fields (set): Optional projection; links are only loaded when included.
+        links (dict): Links already loaded with `links_by_track` (default: load them).
+
+    Returns:
+        list: One dict per row.
+    """
+    serialize = _track_serializer(frozenset(fields) if fields is not None else None)
+    data = [serialize(row) for row in rows]
+    if wants_links(fields):
+        if links is None:
+            links = links_by_track([row.id for row in rows])
+        for item, row in zip(data, rows):
+            item['links'] = links.get(row.id, [])
+    return data
+
+
+def serialize_links(rows: list) -> list:
+    """
+    Serializes `link_rows_query()` rows into the same dicts as `Track_Link.to_dict()`.
+
+    Args:
+        rows (list): Rows with `LINK_COLUMNS`.
+
+    Returns:
+        list: One dict per row.
+    """
+    return [serialize_link_row(row) for row in rows]
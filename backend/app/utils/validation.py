@@ -0,0 +1,54 @@
+from app.models import Track, Track_Link
+
+
+def _too_long(model, data: dict, fields: tuple):
+    # Postgres rejects a string longer than its column; SQLite would store it
+    for field in fields:
+        limit = getattr(model, field).type.length
+        if isinstance(data.get(field), str) and len(data[field]) > limit:
+            return f"{field} cannot exceed {limit} characters"
+    return None
+
+
+def validate_track(data: dict, partial: bool = False):
+    """
+    Validates a track payload using the rules shared by the single-row and bulk handlers.
+
+    Args:
+        data (dict): Request payload for one track.
+        partial (bool): True for updates, where every field is optional.
+
+    Returns:
+        str | None: Error message, or None if the payload is valid.
+    """
+    if not partial and 'title' not in data:
+        return "Missing required field: title"
+    if 'title' in data and (not isinstance(data['title'], str) or not data['title'].strip()):
+        return "title must be a non-empty string"
+    if 'artist' in data and not isinstance(data['artist'], (str, type(None))):
+        return "artist must be a string or null"
+    if 'genre' in data and not isinstance(data['genre'], (str, type(None))):
+        return "genre must be a string or null"
+    return _too_long(Track, data, ('title', 'artist', 'genre'))
+
+
+def validate_link(data: dict, partial: bool = False):
+    """
+    Validates a track link payload using the rules shared by the single-row and bulk handlers.
+
+    Args:
+        data (dict): Request payload for one track link.
+        partial (bool): True for updates, where every field is optional.
+
+    Returns:
+        str | None: Error message, or None if the payload is valid.
+    """
+    if not partial and not all(field in data for field in ('link_type', 'link_url')):
+        return "Missing required fields: link_type, link_url"
+    if 'link_type' in data and (not isinstance(data['link_type'], str) or not data['link_type'].strip()):
+        return "link_type must be a non-empty string"
+    if 'link_url' in data and (not isinstance(data['link_url'], str) or not data['link_url'].strip()):
+        return "link_url must be a non-empty string"
+    if 'track_id' in data and not isinstance(data['track_id'], (int, type(None))):
+        return "track_id must be an integer or null"
+    return _too_long(Track_Link, data, ('link_type', 'link_url'))
@@ -0,0 +1,182 @@
+"""Table version counters and conditional GET support.
+
+Every flush that inserts, updates or deletes a Track or Track_Link marks
+that table as changed, and its row in `table_versions` is bumped once the
+session commits, in a short transaction of its own on the same
+connection. Writers therefore never hold the row's lock while their own
+transaction runs, so concurrent writes to a table do not queue behind
+each other. A reader that sees the new rows before the bump lands caches
+them under the old counters, which the bump then invalidates. Read
+endpoints decorated with `conditional_get` derive a weak ETag and a
+Last-Modified date from those counters, so a matching `If-None-Match` or
+`If-Modified-Since` gets a 304 before the view queries or serializes
+anything.
+
+A process that dies between its commit and the bump leaves the counters
+behind until the next write to that table.
+"""
+import hashlib
+import logging
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import db
+from app.models import TableVersion, Track, Track_Link
+
+logger = logging.getLogger(__name__)
+
+VERSIONED_MODELS = (Track, Track_Link)
+VERSIONED_TABLES = tuple(model.__tablename__ for model in VERSIONED_MODELS)
+
+# Session.info key holding {connection: table names} changed by the session's transaction
+_PENDING = 'changed_tables'
+
+
+def bump_versions(connection, tablenames):
+    """Increment the version counter of each table name on `connection`, in its current transaction.
+
+    Sessions call `mark_changed` instead, which bumps after they commit.
+    """
+    now = datetime.now(timezone.utc)
+    for name in sorted(tablenames):
+        result = connection.execute(
+            update(TableVersion.__table__)
+            .where(TableVersion.__table__.c.name == name)
+            .values(version=TableVersion.__table__.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            # First write to this table; another worker may create the row concurrently
+            try:
+                with connection.begin_nested():
+                    connection.execute(
+                        TableVersion.__table__.insert().values(name=name, version=1, updated_at=now)
+                    )
+            except IntegrityError:
+                connection.execute(
+                    update(TableVersion.__table__)
+                    .where(TableVersion.__table__.c.name == name)
+                    .values(version=TableVersion.__table__.c.version + 1, updated_at=now)
+                )
+
+
+@event.listens_for(TableVersion.__table__, 'after_create')
+def _seed_versions(target, connection, **kw):
+    connection.execute(target.insert(), [{'name': name, 'version': 0} for name in VERSIONED_TABLES])
+
+
+def mark_changed(session, tablenames):
+    """Bump the version counters of `tablenames` after `session` commits."""
+    pending = session.info.setdefault(_PENDING, {})
+    pending.setdefault(session.connection(), set()).update(tablenames)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_on_flush(session, flush_context):
+    changed = set()
+    for obj in session.deleted | session.new:
+        if isinstance(obj, VERSIONED_MODELS):
+            changed.add(obj.__tablename__)
+    for obj in session.dirty:
+        if isinstance(obj, VERSIONED_MODELS) and session.is_modified(obj, include_collections=False):
+            changed.add(obj.__tablename__)
+    if changed:
+        mark_changed(session, changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    # Also fires when a savepoint is released; the outer transaction may still roll back
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop(_PENDING, None)
+    for connection, tablenames in (pending or {}).items():
+        # The session has committed but not yet released the connection
+        try:
+            with connection.begin():
+                bump_versions(connection, tablenames)
+        except SQLAlchemyError:
+            # The write itself is committed; failing the request now would invite a retry
+            logger.exception("Could not bump table versions for %s", ', '.join(sorted(tablenames)))
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+def versions_statement(tablenames=VERSIONED_TABLES):
+    return (
+        select(TableVersion.name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.name.in_(tablenames))
+    )
+
+
+def versions_from_rows(rows, tablenames=VERSIONED_TABLES):
+    """Fold `versions_statement()` rows into ({name: version}, last_modified)."""
+    versions = {name: 0 for name in tablenames}
+    last_modified = None
+    for name, version, updated_at in rows:
+        versions[name] = version
+        if updated_at is not None:
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            last_modified = max(last_modified, updated_at) if last_modified else updated_at
+    return versions, last_modified
+
+
+def get_versions(tablenames=VERSIONED_TABLES):
+    """Return ({name: version}, last_modified) for the given tables."""
+    rows = db.session.execute(versions_statement(tablenames)).all()
+    return versions_from_rows(rows, tablenames)
+
+
+def etag_for(versions):
+    key = '|'.join(f'{name}={versions[name]}' for name in sorted(versions))
+    key += '|' + request.full_path
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def is_not_modified(etag, last_modified):
+    """True if the request's validators match `etag` / `last_modified`."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    """Add ETag, Last-Modified and the shared Cache-Control policy to `response`."""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    response.cache_control.must_revalidate = True
+    return response
+
+
+def conditional_get(view):
+    """Serve 304s for unchanged public reads and add ETag/Last-Modified/Cache-Control."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        versions, last_modified = get_versions()
+        g.table_versions = versions  # reused by the count cache
+        etag = etag_for(versions)
+        if last_modified is not None:
+            last_modified = last_modified.replace(microsecond=0)
+
+        if is_not_modified(etag, last_modified):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        return set_validators(response, etag, last_modified)
+    return wrapper
@@ -0,0 +1,5 @@
+from app import create_app
+from app.asgi import AsyncAPI
+
+# Serve with an ASGI server, e.g. `uvicorn asgi:app --workers 4`
+app = AsyncAPI(create_app())
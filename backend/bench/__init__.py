@@ -0,0 +1,4 @@
+"""Benchmark harness for the Flask Racer X API.
+
+    python -m bench.run --help
+"""
@@ -0,0 +1,73 @@
+"""Print query plans for the API's hot query paths and flag full table scans.
+
+    python -m bench.explain --database sqlite:////tmp/bench.db [--strict]
+
+Run it before and after a schema change to check that each path seeks
+through an index. With --strict the exit status is 1 if any path still
+scans a whole table, so it can gate CI.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import select, text, tuple_
+
+from app import create_app
+from app.database import db
+from app.models import Track, Track_Link, TokenBlocklist
+
+
+def hot_queries():
+    """(name, statement) pairs mirroring the queries issued by the API."""
+    now = datetime.now(timezone.utc)
+    return [
+        ('tracks keyset page', select(Track).where(tuple_(Track.created_at, Track.id) > tuple_(now, 0))
+            .order_by(Track.created_at, Track.id).limit(100)),
+        ('links of a track', select(Track_Link).where(Track_Link.track_id == 1)),
+        ('links selectin load', select(Track_Link).where(Track_Link.track_id.in_([1, 2, 3]))),
+        ('links keyset page', select(Track_Link).where(tuple_(Track_Link.created_at, Track_Link.id) > tuple_(now, 0))
+            .order_by(Track_Link.created_at, Track_Link.id).limit(100)),
+        ('tracks of a user', select(Track).where(Track.user_id == 1)),
+        ('links of a user', select(Track_Link).where(Track_Link.user_id == 1)),
+        ('tracks by genre', select(Track).where(Track.genre == 'rock')),
+        ('tracks by title', select(Track).where(Track.title == 'Donut City')),
+        ('blocklist jti', select(TokenBlocklist).where(TokenBlocklist.jti == 'x')),
+    ]
+
+
+def explain(conn, statement):
+    compiled = statement.compile(conn, compile_kwargs={'literal_binds': True})
+    if conn.dialect.name == 'sqlite':
+        rows = conn.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+        plan = [row[-1] for row in rows]
+        full_scan = any(line.startswith('SCAN ') and 'USING' not in line for line in plan)
+    else:
+        plan = [row[0] for row in conn.execute(text(f'EXPLAIN {compiled}')).all()]
+        full_scan = any('Seq Scan' in line for line in plan)
+    return plan, full_scan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=os.getenv('DATABASE_URL'), help='SQLAlchemy URL (default: $DATABASE_URL)')
+    parser.add_argument('--strict', action='store_true', help='exit 1 if any hot path does a full table scan')
+    args = parser.parse_args(argv)
+    if not args.database:
+        parser.error('--database or DATABASE_URL is required')
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database})
+    scans = 0
+    with app.app_context(), db.engine.connect() as conn:
+        for name, statement in hot_queries():
+            plan, full_scan = explain(conn, statement)
+            scans += full_scan
+            print(f"{'FULL SCAN' if full_scan else 'ok':9}  {name}")
+            for line in plan:
+                print(f"           {line}")
+    if args.strict and scans:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Local stand-in for the link metadata service used by ``links.normalize``.
+
+    python -m bench.metadata_stub [--port 8765] [--delay 0.2] [--fail-rate 0.1]
+
+Start the worker with ``LINK_METADATA_URL=http://127.0.0.1:8765/resolve``.
+For ``GET /resolve?url=...`` the stub returns ``{"url": <canonical>}``.
+It knows a few share-link forms (``youtu.be/<id>``, Spotify ``intl-xx``
+paths), and answers ``{"url": null}`` for any other URL. ``--delay``
+simulates a slow upstream. ``--fail-rate`` answers that fraction of
+requests with a 503, to exercise the job retries.
+"""
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+RULES = [
+    (re.compile(r'^https?://youtu\.be/([\w-]+)'), r'https://www.youtube.com/watch?v=\1'),
+    (re.compile(r'^https?://(?:m\.|music\.)?youtube\.com/watch\?v=([\w-]+)'), r'https://www.youtube.com/watch?v=\1'),
+    (re.compile(r'^https?://open\.spotify\.com/intl-[\w-]+/(\w+)/(\w+)'), r'https://open.spotify.com/\1/\2'),
+]
+
+
+def canonical(url):
+    for pattern, replacement in RULES:
+        match = pattern.match(url)
+        if match:
+            return match.expand(replacement)
+    return None
+
+
+def make_handler(delay, fail_rate):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            urls = parse_qs(parts.query).get('url')
+            if parts.path != '/resolve' or not urls:
+                self.send_error(404)
+                return
+            time.sleep(delay)
+            if random.random() < fail_rate:
+                self.send_error(503)
+                return
+            body = json.dumps({'url': canonical(urls[0])}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0, help='seconds to wait before answering')
+    parser.add_argument('--fail-rate', type=float, default=0, help='fraction of requests answered with 503')
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.delay, args.fail_rate))
+    print(f"Link metadata stub on http://127.0.0.1:{args.port}/resolve")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
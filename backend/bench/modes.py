@@ -0,0 +1,120 @@
+"""Compare throughput of the WSGI and ASGI deployment modes.
+
+Starts `gunicorn wsgi:app` (sync workers) and `uvicorn asgi:app` in turn
+with the same number of worker processes. Each server then gets the same
+workloads at increasing numbers of concurrent client connections.
+
+    python -m bench.modes --database sqlite:////tmp/bench.db --workers 2 --concurrency 1,8,32,64
+
+The database must already be prepared (e.g. by `python -m bench.run --seed`).
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from app import create_app
+from bench.run import build_context
+from bench.workloads import WORKLOADS, run_http
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), os.pardir)
+
+SERVERS = {
+    'wsgi': lambda port, workers: ['gunicorn', 'wsgi:app', '--bind', f'127.0.0.1:{port}',
+                                   '--workers', str(workers), '--log-level', 'warning'],
+    'asgi': lambda port, workers: ['uvicorn', 'asgi:app', '--port', str(port),
+                                   '--workers', str(workers), '--log-level', 'warning'],
+}
+
+
+def _wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"Server exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(url + '/api/health', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"Server did not start within {timeout}s")
+
+
+def run_mode(mode, args, env, ctx, names, levels):
+    """Start one server, run every workload at every concurrency level, stop it."""
+    url = f'http://127.0.0.1:{args.port}'
+    process = subprocess.Popen(SERVERS[mode](args.port, args.workers), cwd=BACKEND_DIR, env=env)
+    try:
+        _wait_until_up(url, process)
+        results = {}
+        for name in names:
+            for concurrency in levels:
+                rng = random.Random(1234)
+                result = run_http(url, WORKLOADS[name], ctx, args.requests, concurrency, rng)
+                results[f'{name}@{concurrency}'] = result
+                print(f"{mode:5} {name:12} c={concurrency:<4} {result['throughput_rps']:8.1f} req/s  "
+                      f"p50 {result['latency_ms']['p50']:8.2f}ms  p99 {result['latency_ms']['p99']:8.2f}ms  "
+                      f"errors {result['errors']}")
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=os.getenv('DATABASE_URL'), help='SQLAlchemy URL (default: $DATABASE_URL)')
+    parser.add_argument('--workloads', default='list,deep_cursor', help='comma-separated subset of ' + ', '.join(WORKLOADS))
+    parser.add_argument('--concurrency', default='1,8,32,64', help='comma-separated client connection counts')
+    parser.add_argument('--requests', type=int, default=500, help='requests per workload and concurrency level')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes in both modes')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default=None, help='result file (default: bench/results/modes-<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    if not args.database:
+        parser.error('--database or DATABASE_URL is required')
+    names = [n.strip() for n in args.workloads.split(',') if n.strip()]
+    unknown = set(names) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    secret = os.getenv('JWT_SECRET_KEY') or 'bench-secret'
+    env = {**os.environ, 'DATABASE_URL': args.database, 'JWT_SECRET_KEY': secret, 'RATE_LIMIT_ENABLED': 'False'}
+    ctx = build_context(create_app({'SQLALCHEMY_DATABASE_URI': args.database, 'JWT_SECRET_KEY': secret}))
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = {
+        'meta': {
+            'started_at': started_at,
+            'database': args.database.split('@')[-1],
+            'tracks': ctx['tracks'],
+            'workers': args.workers,
+            'requests': args.requests,
+        },
+        'modes': {mode: run_mode(mode, args, env, ctx, names, levels) for mode in SERVERS},
+    }
+
+    print(f"\n{'workload':20} {'wsgi req/s':>11} {'asgi req/s':>11} {'change':>8}")
+    for key, wsgi in results['modes']['wsgi'].items():
+        asgi = results['modes']['asgi'][key]
+        change = (asgi['throughput_rps'] - wsgi['throughput_rps']) / wsgi['throughput_rps']
+        print(f"{key:20} {wsgi['throughput_rps']:11.1f} {asgi['throughput_rps']:11.1f} {change:+8.0%}")
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), 'results', 'modes-' + started_at.replace(':', '-').split('.')[0] + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Check the number of SQL statements issued by the nested link routes.
+
+    python -m bench.query_budget [--database sqlite://] [--strict]
+
+Each scenario sends one request through the Flask test client and counts
+the statements it runs, including conditional GET, the JWT blocklist
+check, the change feed outbox insert and the stats counter updates. The
+response and count caches are disabled so counts do not depend on earlier
+requests. Writes go to a
+track created for the run, so by default a throwaway in-memory SQLite
+database is used. With --strict the exit status is 1 if any scenario goes
+over its budget or returns an unexpected status, so it can gate CI.
+"""
+import argparse
+import os
+import sys
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+
+from app import create_app
+from app.blocklist import get_blocklist_cache
+from app.database import db, init_migrate
+from app.models import Track, Track_Link, User
+from app.stats import rebuild
+from bench import workloads
+
+LINK = {'link_type': 'spotify', 'link_url': 'https://open.spotify.com/track/budget'}
+
+
+def scenarios(ctx):
+    """(name, method, path, kwargs, expected status, statement budget) for each checked request."""
+    track, other, link, missing = ctx['track'], ctx['other'], ctx['link'], ctx['missing']
+    auth = {'headers': {'Authorization': f"Bearer {ctx['token']}"}}
+    return [
+        ('list links', 'GET', f'/api/tracks/{track}/links', {}, 200, 3),
+        ('list links, unknown track', 'GET', f'/api/tracks/{missing}/links', {}, 404, 4),
+        ('add link', 'POST', f'/api/tracks/{track}/links', {'json': LINK, **auth}, 201, 6),
+        ('add link, unknown track', 'POST', f'/api/tracks/{missing}/links', {'json': LINK, **auth}, 404, 2),
+        ('add link, invalid body', 'POST', f'/api/tracks/{track}/links', {'json': {'link_type': ''}, **auth}, 400, 2),
+        ('update link', 'PATCH', f'/api/tracks/{track}/links/{link}', {'json': {'link_url': 'https://x.test/1'}}, 200, 3),
+        ('update link, wrong track', 'PATCH', f'/api/tracks/{other}/links/{link}', {'json': {'link_url': 'https://x.test/2'}}, 404, 1),
+        ('move link', 'PUT', f'/api/track_links/{link}', {'json': {'track_id': other}}, 200, 3),
+        ('move link, unknown track', 'PUT', f'/api/track_links/{link}', {'json': {'track_id': missing}}, 404, 2),
+        ('delete link, wrong track', 'DELETE', f'/api/tracks/{track}/links/{link}', {}, 404, 1),
+        ('delete link', 'DELETE', f'/api/tracks/{other}/links/{link}', {}, 200, 5),
+    ]
+
+
+def prepare(app):
+    """Create the user, tracks and link the scenarios work on."""
+    init_migrate(app)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(__file__), os.pardir, 'migrations'))
+        user = User(username='query-budget', email='query-budget@bench.test')
+        user.set_password('query-budget')
+        db.session.add(user)
+        db.session.flush()
+        track, other = Track(title='Budget', user_id=user.id), Track(title='Budget 2', user_id=user.id)
+        db.session.add_all([track, other])
+        db.session.flush()
+        link = Track_Link(track_id=track.id, user_id=user.id, **LINK)
+        db.session.add(link)
+        db.session.flush()
+        rebuild(db.session.connection())  # counters exist, as after the first writes
+        db.session.commit()
+        get_blocklist_cache().sync(force=True)  # loaded, as when a server starts on an existing database
+        return {
+            'token': create_access_token(identity=user.id),
+            'track': track.id,
+            'other': other.id,
+            'link': link.id,
+            'missing': db.session.query(db.func.max(Track.id)).scalar() + 1000,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='sqlite://', help='SQLAlchemy URL (default: in-memory SQLite)')
+    parser.add_argument('--strict', action='store_true', help='exit 1 if any scenario is over budget')
+    args = parser.parse_args(argv)
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database,
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY') or 'bench-secret',
+        'RESPONSE_CACHE_TTL': 0,
+        'COUNT_CACHE_SIZE': 0,
+        'RATE_LIMIT_ENABLED': False,
+    })
+    ctx = prepare(app)
+    client = app.test_client()
+    failures = 0
+    for name, method, path, kwargs, status, budget in scenarios(ctx):
+        workloads._local.queries = 0
+        response = client.open(path, method=method, **kwargs)
+        queries = workloads._local.queries
+        ok = response.status_code == status and queries <= budget
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':4}  {name:28} {response.status_code} (expected {status})  "
+              f"{queries} statements (budget {budget})")
+    if args.strict and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
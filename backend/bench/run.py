@@ -0,0 +1,155 @@
+"""Run API benchmarks and save the results as JSON.
+
+Examples:
+
+    # seed 1M tracks / 5M links into a scratch SQLite file, then benchmark in-process
+    python -m bench.run --database sqlite:////tmp/bench.db --seed --tracks 1000000 --links 5000000
+
+    # benchmark a running server (RATE_LIMIT_ENABLED=False gunicorn wsgi:app) with 16 concurrent clients
+    python -m bench.run --database $DATABASE_URL --url http://localhost:8000 --concurrency 16
+
+    # compare against an earlier run
+    python -m bench.run --database sqlite:////tmp/bench.db --compare results/before.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+
+from app import create_app
+from app.database import db, init_migrate
+from app.models import Track, User
+from app.utils.pagination import encode_cursor
+from bench import datagen
+from bench.workloads import WORKLOADS, run_http, run_in_process
+
+
+def build_context(app):
+    """Look up the ids, token and deep-page positions the workloads need."""
+    with app.app_context():
+        user = User.query.order_by(User.id).first()
+        if user is None:
+            sys.exit("Database has no users; run with --seed first")
+        total = db.session.query(db.func.count(Track.id)).scalar()
+        deep = (
+            Track.query.order_by(Track.created_at, Track.id)
+            .offset(max(total - 200, 0)).limit(1).first()
+        )
+        return {
+            'token': create_access_token(identity=user.id),
+            'email': user.email,
+            'tracks': total,
+            'last_page': max(math.ceil(total / 100) - 1, 1),
+            'deep_cursor': encode_cursor(deep.created_at, deep.id) if deep else '',
+        }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Print p50/p99/throughput deltas against a previous result file."""
+    print(f"\nCompared with {baseline['meta'].get('started_at')} ({baseline['meta'].get('git_revision')}):")
+    for name, result in current['workloads'].items():
+        before = baseline['workloads'].get(name)
+        if not before:
+            continue
+        parts = []
+        for label, key in (('p50', 'p50'), ('p99', 'p99')):
+            old, new = before['latency_ms'][key], result['latency_ms'][key]
+            if old and new:
+                parts.append(f"{label} {old:.2f}->{new:.2f}ms ({(new - old) / old:+.0%})")
+        old, new = before['throughput_rps'], result['throughput_rps']
+        if old and new:
+            parts.append(f"rps {old:.0f}->{new:.0f} ({(new - old) / old:+.0%})")
+        print(f"  {name:12} " + ', '.join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=os.getenv('DATABASE_URL'), help='SQLAlchemy URL (default: $DATABASE_URL)')
+    parser.add_argument('--seed', action='store_true', help='append a synthetic catalog before running')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--tracks', type=int, default=10000)
+    parser.add_argument('--links', type=int, default=50000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help='comma-separated subset of ' + ', '.join(WORKLOADS))
+    parser.add_argument('--requests', type=int, default=200, help='requests per workload')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process test client')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads in --url mode')
+    parser.add_argument('--output', default=None, help='result file (default: bench/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args(argv)
+
+    if not args.database:
+        parser.error('--database or DATABASE_URL is required')
+    names = [n.strip() for n in args.workloads.split(',') if n.strip()]
+    unknown = set(names) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    # The login workload would otherwise measure the login rate limit
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database, 'RATE_LIMIT_ENABLED': False,
+                      'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY') or 'bench-secret'})
+    init_migrate(app)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(__file__), os.pardir, 'migrations'))
+        if args.seed:
+            print(f"Seeding {args.users} users, {args.tracks} tracks, {args.links} links...")
+            seeded = datagen.seed(args.users, args.tracks, args.links, args.chunk_size)
+            print(f"Seeded {sum(seeded['rows'].values())} rows at {seeded['rows_per_second']:,.0f} rows/s")
+
+    ctx = build_context(app)
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = {
+        'meta': {
+            'started_at': started_at,
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+            'tracks': ctx['tracks'],
+            'mode': 'http' if args.url else 'in-process',
+            'concurrency': args.concurrency if args.url else 1,
+            'requests_per_workload': args.requests,
+        },
+        'workloads': {},
+    }
+
+    rng = random.Random(1234)
+    for name in names:
+        if args.url:
+            result = run_http(args.url, WORKLOADS[name], ctx, args.requests, args.concurrency, rng)
+        else:
+            result = run_in_process(app, WORKLOADS[name], ctx, args.requests, rng)
+        results['workloads'][name] = result
+        lat = result['latency_ms']
+        print(f"{name:12} p50 {lat['p50']:8.2f}ms  p99 {lat['p99']:8.2f}ms  "
+              f"{result['throughput_rps']:8.1f} req/s  queries/req {result['queries_per_request']}  "
+              f"errors {result['errors']}")
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), 'results', started_at.replace(':', '-').split('.')[0] + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
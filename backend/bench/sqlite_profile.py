@@ -0,0 +1,140 @@
+"""Compare SQLite's default settings with the tuned profile under concurrent load.
+
+Starts `gunicorn wsgi:app` with threaded workers once per profile, on the
+same database file. The `default` profile sets SQLite's own defaults:
+
+* the rollback journal;
+* ``synchronous=FULL``;
+* no memory map;
+* a 2 MB page cache;
+* writers that wait only in SQLite's busy handler.
+
+The `pragmas` profile applies the tuned PRAGMAs without the write queue.
+The `tuned` profile uses the app's defaults (see app/sqlite.py). Each
+server then gets the same workloads at increasing numbers of concurrent
+client connections. Failed requests, e.g. with "database is locked", are
+counted as errors. The `create` workload shows writers contending, and
+`mixed` adds readers to them.
+
+    python -m bench.sqlite_profile --database sqlite:////tmp/bench.db --workers 2 --threads 8 --concurrency 8,32
+
+The database must already be prepared (e.g. by `python -m bench.run --seed`).
+The journal mode is stored in the file; the last profile run leaves it as set.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+from datetime import datetime, timezone
+
+from sqlalchemy.engine import make_url
+
+from app import create_app
+from app.database import db
+from bench.modes import BACKEND_DIR, _wait_until_up
+from bench.run import build_context
+from bench.workloads import WORKLOADS, run_http
+
+PROFILES = {
+    'default': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+        'SQLITE_BUSY_TIMEOUT': '5000',  # what Python's sqlite3 module sets
+        'SQLITE_SERIALIZE_WRITES': 'False',
+    },
+    'pragmas': {'SQLITE_SERIALIZE_WRITES': 'False'},
+    'tuned': {},
+}
+
+
+def run_profile(profile, args, env, ctx, names, levels):
+    """Start one server with `profile`'s settings, run every workload at every concurrency level, stop it."""
+    env = {**env, **PROFILES[profile]}
+    # Switch the journal mode before several workers race to do it
+    with sqlite3.connect(make_url(args.database).database) as conn:
+        conn.execute(f"PRAGMA journal_mode={PROFILES[profile].get('SQLITE_JOURNAL_MODE', 'WAL')}")
+
+    url = f'http://127.0.0.1:{args.port}'
+    command = ['gunicorn', 'wsgi:app', '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers),
+               '--worker-class', 'gthread', '--threads', str(args.threads), '--log-level', 'warning']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    try:
+        _wait_until_up(url, process)
+        results = {}
+        for name in names:
+            for concurrency in levels:
+                rng = random.Random(1234)
+                result = run_http(url, WORKLOADS[name], ctx, args.requests, concurrency, rng)
+                results[f'{name}@{concurrency}'] = result
+                print(f"{profile:7} {name:8} c={concurrency:<4} {result['throughput_rps']:8.1f} req/s  "
+                      f"p50 {result['latency_ms']['p50']:8.2f}ms  p99 {result['latency_ms']['p99']:8.2f}ms  "
+                      f"errors {result['errors']}")
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=os.getenv('DATABASE_URL'), help='SQLite URL (default: $DATABASE_URL)')
+    parser.add_argument('--workloads', default='create,mixed', help='comma-separated subset of ' + ', '.join(WORKLOADS))
+    parser.add_argument('--concurrency', default='8,32', help='comma-separated client connection counts')
+    parser.add_argument('--requests', type=int, default=500, help='requests per workload and concurrency level')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default=None, help='result file (default: bench/results/sqlite-<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    if not args.database:
+        parser.error('--database or DATABASE_URL is required')
+    if make_url(args.database).get_backend_name() != 'sqlite' or not make_url(args.database).database:
+        parser.error('--database must be a SQLite file URL')
+    names = [n.strip() for n in args.workloads.split(',') if n.strip()]
+    unknown = set(names) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    secret = os.getenv('JWT_SECRET_KEY') or 'bench-secret'
+    env = {**os.environ, 'DATABASE_URL': args.database, 'JWT_SECRET_KEY': secret, 'RATE_LIMIT_ENABLED': 'False'}
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database, 'JWT_SECRET_KEY': secret})
+    ctx = build_context(app)
+    with app.app_context():
+        db.engine.dispose()  # changing the journal mode needs the file to ourselves
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = {
+        'meta': {
+            'started_at': started_at,
+            'database': args.database,
+            'tracks': ctx['tracks'],
+            'workers': args.workers,
+            'threads': args.threads,
+            'requests': args.requests,
+        },
+        'profiles': {profile: run_profile(profile, args, env, ctx, names, levels) for profile in PROFILES},
+    }
+
+    print(f"\n{'workload':16}" + ''.join(f" {profile + ' req/s':>14} {'errors':>6}" for profile in PROFILES)
+          + f" {'change':>8}")
+    for key, default in results['profiles']['default'].items():
+        row = [results['profiles'][profile][key] for profile in PROFILES]
+        change = (row[-1]['throughput_rps'] - default['throughput_rps']) / default['throughput_rps']
+        print(f"{key:16}" + ''.join(f" {r['throughput_rps']:14.1f} {r['errors']:6}" for r in row) + f" {change:+8.0%}")
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), 'results', 'sqlite-' + started_at.replace(':', '-').split('.')[0] + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
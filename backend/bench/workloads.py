@@ -0,0 +1,136 @@
+"""Scripted API workloads and latency/throughput measurement.
+
+A workload is a function `(ctx, rng) -> (method, path, kwargs)` describing
+one request. `run_workload` replays it either in-process through the
+Flask test client (which also counts SQL statements per request) or
+against a running server over HTTP with a pool of concurrent clients.
+"""
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bench.datagen import BENCH_PASSWORD, WORDS
+
+_local = threading.local()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+
+def w_list(ctx, rng):
+    return 'GET', '/api/tracks?per_page=100', {}
+
+
+def w_deep_page(ctx, rng):
+    return 'GET', f"/api/tracks?per_page=100&page={ctx['last_page']}", {}
+
+
+def w_deep_cursor(ctx, rng):
+    return 'GET', f"/api/tracks?per_page=100&after={ctx['deep_cursor']}", {}
+
+
+def w_search(ctx, rng):
+    return 'GET', f'/api/tracks/search?title={rng.choice(WORDS)[:3]}&per_page=20', {}
+
+
+def w_create(ctx, rng):
+    body = {'title': f'Bench {rng.getrandbits(32):08x}', 'artist': 'Bench', 'genre': 'demo'}
+    return 'POST', '/api/tracks', {'json': body, 'headers': {'Authorization': f"Bearer {ctx['token']}"}}
+
+
+def w_login(ctx, rng):
+    return 'POST', '/api/login', {'json': {'email': ctx['email'], 'password': BENCH_PASSWORD}}
+
+
+def w_mixed(ctx, rng):
+    # One write for every three reads
+    return w_create(ctx, rng) if rng.random() < 0.25 else w_list(ctx, rng)
+
+
+WORKLOADS = {
+    'list': w_list,
+    'deep_page': w_deep_page,
+    'deep_cursor': w_deep_cursor,
+    'search': w_search,
+    'create': w_create,
+    'login': w_login,
+    'mixed': w_mixed,
+}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, queries, errors, wall_seconds):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        'latency_ms': {
+            'mean': ms(statistics.fmean(latencies)) if latencies else None,
+            'p50': ms(_percentile(latencies, 50)),
+            'p90': ms(_percentile(latencies, 90)),
+            'p99': ms(_percentile(latencies, 99)),
+            'max': ms(latencies[-1]) if latencies else None,
+        },
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+def run_in_process(app, workload, ctx, requests, rng):
+    """Replay `workload` sequentially through the Flask test client."""
+    client = app.test_client()
+    latencies, queries, errors = [], [], 0
+    wall = time.perf_counter()
+    for _ in range(requests):
+        method, path, kwargs = workload(ctx, rng)
+        _local.queries = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        latencies.append(time.perf_counter() - started)
+        queries.append(_local.queries)
+        if response.status_code >= 400:
+            errors += 1
+    return summarize(latencies, queries, errors, time.perf_counter() - wall)
+
+
+def run_http(base_url, workload, ctx, requests, concurrency, rng):
+    """Replay `workload` against a running server with `concurrency` client threads."""
+    def one(_):
+        method, path, kwargs = workload(ctx, rng)
+        headers = dict(kwargs.get('headers', {}))
+        data = None
+        if 'json' in kwargs:
+            data = json.dumps(kwargs['json']).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(base_url.rstrip('/') + path, data=data, method=method, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                resp.read()
+            ok = True
+        except urllib.error.HTTPError:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, ok in results if not ok)
+    return summarize(latencies, [], errors, time.perf_counter() - wall)
@@ -0,0 +1,84 @@
+"""full-text search indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:12:03.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# A snapshot of app/search.py's DDL when this revision was written; the migration
+# must not change when the app code does.
+SQLITE_FTS = {
+    'tracks': ('title', 'artist', 'genre'),
+    'track_links': ('link_type', 'link_url'),
+}
+
+POSTGRES_INDEXES = {
+    'tracks': (
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(artist, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(genre, '')), 'C')"
+    ),
+    'track_links': (
+        "setweight(to_tsvector('simple', coalesce(link_type, '')), 'A') || "
+        "setweight(to_tsvector('simple', regexp_replace(coalesce(link_url, ''), '[^[:alnum:]]+', ' ', 'g')), 'B')"
+    ),
+}
+
+
+def _sqlite_ddl(tablename, columns):
+    fts = f'{tablename}_fts'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    insert_new = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new});"
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    return [
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{tablename}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tablename} BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _sqlite_drop_ddl(tablename):
+    fts = f'{tablename}_fts'
+    return [f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ('ai', 'ad', 'au')] + [f"DROP TABLE IF EXISTS {fts}"]
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 tables + triggers on SQLite, tsvector GIN indexes on Postgres (see app/search.py).
+    # Raw driver SQL: the Postgres expressions contain ':' which text() would treat as binds.
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        statements = [s for tablename, columns in SQLITE_FTS.items() for s in _sqlite_ddl(tablename, columns)]
+    elif bind.dialect.name == 'postgresql':
+        statements = [f"CREATE INDEX IF NOT EXISTS ix_{tablename}_search ON {tablename} USING gin (({expression}))"
+                      for tablename, expression in POSTGRES_INDEXES.items()]
+    else:
+        statements = []
+    for statement in statements:
+        bind.exec_driver_sql(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        statements = [s for tablename in SQLITE_FTS for s in _sqlite_drop_ddl(tablename)]
+    elif bind.dialect.name == 'postgresql':
+        statements = [f"DROP INDEX IF EXISTS ix_{tablename}_search" for tablename in POSTGRES_INDEXES]
+    else:
+        statements = []
+    for statement in statements:
+        bind.exec_driver_sql(statement)
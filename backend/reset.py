@@ -1,10 +1,14 @@
+from flask_migrate import upgrade
+from sqlalchemy import text
 from app import create_app
-from app.database import db
-from app.models import User, Track, TrackLink
+from app.database import db, init_migrate
 
 app = create_app()
+init_migrate(app)
 
 with app.app_context():
     db.drop_all()
-    db.create_all()
-    print("✅ app.db reset with fresh tables!")
\ No newline at end of file
+    db.session.execute(text('DROP TABLE IF EXISTS alembic_version'))
+    db.session.commit()
+    upgrade()
+    print("✅ app.db reset with fresh tables!")
@@ -1,9 +1,7 @@
 from app import create_app
-from app.database import db
 
 app = create_app()
 
+# Schema changes are not applied on start; run `flask db upgrade` first
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True, port=5555)
\ No newline at end of file
+    app.run(debug=True, port=5555)
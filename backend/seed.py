@@ -1,13 +1,19 @@
+from flask_migrate import upgrade
+from sqlalchemy import text
 from app import create_app
 from app.models import User, Track, Track_Link
-from app.database import db
+from app.database import db, init_migrate
+from app.stats import rebuild
 
 app = create_app()
+init_migrate(app)
 
 with app.app_context():
     # Drop and recreate tables for a clean dev seed
     db.drop_all()
-    db.create_all()
+    db.session.execute(text('DROP TABLE IF EXISTS alembic_version'))
+    db.session.commit()
+    upgrade()
 
     # Create users
     user1 = User(username="josh", email="josh@example.com")
@@ -35,6 +41,8 @@ with app.app_context():
     tl4 = Track_Link(link_type="spotify", link_url="https://open.spotify.com/track/3HZ7gHamJJzcjKbEENuGyY?si=518cc1dba71443c4", track_id=track3.id, user_id=user1.id)
 
     db.session.add_all([tl1, tl2, tl3, tl4])
+    db.session.flush()
+    rebuild(db.session.connection())
     db.session.commit()
 
     print("✅ Database seeded with users, tracks, and track links (with hashed passwords)!")
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Fixtures shared by the test suite.
+
+`app` is the application on a throwaway SQLite file, migrated to head as a
+deployment would be. `statements` records every SQL statement the app's
+engine runs, so a test can hold a request to a query budget.
+"""
+import os
+
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy import event
+
+from app import create_app
+from app.blocklist import get_blocklist_cache
+from app.database import db, init_migrate
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), os.pardir, 'migrations')
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        # Counts must not depend on what earlier requests left in a cache
+        'RESPONSE_CACHE_TTL': 0,
+        'COUNT_CACHE_SIZE': 0,
+        'RATE_LIMIT_ENABLED': False,
+    })
+    init_migrate(app)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        get_blocklist_cache().sync(force=True)  # loaded, as when a server starts on this database
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements run on the primary engine, in order; clear it before the request under test."""
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', record)
+    yield recorded
+    event.remove(engine, 'after_cursor_execute', record)
@@ -0,0 +1,31 @@
+"""The hot query paths seek through the indexes added by migration 0003."""
+import os
+
+import pytest
+from flask_migrate import downgrade
+
+from app.database import db
+from bench.explain import explain, hot_queries
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), os.pardir, 'migrations')
+NAMES = [name for name, _ in hot_queries()]
+
+
+def plans(app):
+    with app.app_context(), db.engine.connect() as conn:
+        return {name: explain(conn, statement) for name, statement in hot_queries()}
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_hot_query_uses_an_index(app, name):
+    plan, full_scan = plans(app)[name]
+    assert not full_scan, plan
+
+
+def test_hot_queries_scanned_tables_before_the_indexes(app):
+    with app.app_context():
+        downgrade(directory=MIGRATIONS, revision='0002')
+    scanned = {name for name, (_, full_scan) in plans(app).items() if full_scan}
+    # Each of these filters on a column that 0003 indexes
+    assert {'links of a track', 'links selectin load', 'tracks of a user', 'links of a user',
+            'tracks by genre', 'tracks by title'} <= scanned
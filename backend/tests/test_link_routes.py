@@ -0,0 +1,28 @@
+"""The nested link routes keep their 404/400 semantics within a fixed number of statements."""
+from bench.query_budget import prepare, scenarios
+
+WRITE_VERBS = {'POST': 'INSERT INTO track_links', 'PUT': 'UPDATE track_links',
+               'PATCH': 'UPDATE track_links', 'DELETE': 'DELETE FROM track_links'}
+
+
+def run_scenarios(app, client, statements):
+    """Yield (name, method, expected status, budget, response, statements) for each scenario, in order."""
+    for name, method, path, kwargs, status, budget in scenarios(prepare(app)):
+        statements.clear()
+        response = client.open(path, method=method, **kwargs)
+        yield name, method, status, budget, response, list(statements)
+
+
+def test_link_routes_stay_within_their_statement_budgets(app, client, statements):
+    for name, method, status, budget, response, run in run_scenarios(app, client, statements):
+        assert response.status_code == status, name
+        assert len(run) <= budget, (name, run)
+
+
+def test_link_writes_are_single_statements_without_an_existence_check(app, client, statements):
+    for name, method, status, budget, response, run in run_scenarios(app, client, statements):
+        if method not in WRITE_VERBS or status == 400:
+            continue
+        # The write itself comes first: the track is checked in the same statement, not by a SELECT before it
+        assert run[0].startswith(WRITE_VERBS[method]), (name, run)
+        assert sum(statement.startswith(WRITE_VERBS[method]) for statement in run) == 1, (name, run)
@@ -0,0 +1,61 @@
+"""Track reads load links in bulk, so their statement count does not grow with the page."""
+import pytest
+from sqlalchemy import insert
+
+from app.database import db
+from app.models import Track, Track_Link, User
+
+PAGE_SIZES = (1, 10, 30)
+
+
+@pytest.fixture
+def catalog(app):
+    """30 tracks with two links each; returns a track id."""
+    with app.app_context():
+        user_id = db.session.execute(insert(User).values(
+            username='catalog', email='catalog@test.local', password_hash='-',
+        )).inserted_primary_key[0]
+        tracks = [Track(title=f'Track {n}', genre='test', user_id=user_id) for n in range(30)]
+        db.session.add_all(tracks)
+        db.session.flush()
+        db.session.add_all(
+            Track_Link(link_type=kind, link_url=f'https://{kind}.test/{track.id}', track_id=track.id, user_id=user_id)
+            for track in tracks for kind in ('youtube', 'spotify')
+        )
+        db.session.commit()
+        return tracks[0].id
+
+
+@pytest.mark.parametrize('path', [
+    '/api/tracks?per_page={}',
+    '/api/tracks?per_page={}&after=',
+    '/api/tracks?fields=id,title&include=links&per_page={}',
+    '/api/tracks/search?title=track&per_page={}',
+])
+def test_track_pages_run_the_same_statements_at_any_size(client, statements, catalog, path):
+    client.get(path.format(1))  # one-time work, e.g. detecting the full-text index
+    counts = []
+    for per_page in PAGE_SIZES:
+        statements.clear()
+        response = client.get(path.format(per_page))
+        assert response.status_code == 200
+        assert len(response.get_json()['data']) == per_page
+        assert all(len(track['links']) == 2 for track in response.get_json()['data'])
+        counts.append(len(statements))
+    assert counts == [counts[0]] * len(PAGE_SIZES)
+
+
+def test_track_detail_loads_its_links_with_one_statement(client, statements, catalog):
+    statements.clear()
+    response = client.get(f'/api/tracks/{catalog}')
+    assert response.status_code == 200
+    assert len(response.get_json()['links']) == 2
+    assert sum('track_links' in statement for statement in statements if 'table_versions' not in statement) == 1
+
+
+def test_projection_without_links_never_reads_track_links(client, statements, catalog):
+    statements.clear()
+    response = client.get('/api/tracks?fields=id,title&per_page=30')
+    assert response.status_code == 200
+    assert all(set(track) == {'id', 'title'} for track in response.get_json()['data'])
+    assert not any('FROM track_links' in statement for statement in statements)
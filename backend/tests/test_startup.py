@@ -0,0 +1,19 @@
+"""A fresh worker reaches its first response within the startup budget."""
+import os
+import statistics
+
+from app.perf import PHASES, measure_startup
+
+# Median milliseconds from interpreter start to the first response; set it for the machine running CI
+BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '1500'))
+RUNS = 3
+
+
+def test_median_time_to_first_request_is_within_budget(app, monkeypatch):
+    # The probe builds the app from the environment, as a gunicorn worker does
+    monkeypatch.setenv('DATABASE_URL', app.config['SQLALCHEMY_DATABASE_URI'])
+    monkeypatch.setenv('JWT_SECRET_KEY', app.config['JWT_SECRET_KEY'])
+    samples = [measure_startup('/api/tracks', os.path.dirname(app.root_path)) for _ in range(RUNS)]
+    assert [sample['status'] for sample in samples] == [200] * RUNS
+    median = statistics.median(sum(sample[phase] for phase in PHASES) for sample in samples) * 1000
+    assert median <= BUDGET_MS, f"Time to first request {median:.1f}ms is over the {BUDGET_MS:g}ms budget"